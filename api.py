@@ -0,0 +1,357 @@
+# api.py — Başsız (headless) HTTP API: ASGI (Starlette) + uvicorn
+#
+# Çalıştırma:
+#   python api.py [--config config.yaml] [--host 0.0.0.0] [--port 8080]
+#
+# Uç noktalar:
+#   POST /ask          {"question": "...", "show_sql": bool?, "rag": bool?}  → JSON cevap
+#   POST /ask/stream   aynı gövde → text/event-stream (düğüm ilerlemesi + nihai cevap)
+#   GET  /healthz      canlılık
+#   GET  /readyz       hazır mı (başlangıç tamamlandı, kapanış/drain yok)
+#   GET  /metrics      Prometheus metin formatı
+#
+# Tüm istekler TEK AgentRuntime'ı paylaşır (bir kez derlenmiş graf, read-only DB havuzu, LLM
+# istemcisi). Graf senkron olduğu için istekler max_concurrency boyutlu bir thread havuzunda koşar;
+# slot bekleyen istek sayısı max_queue ile, bekleme süresi queue_timeout_s ile sınırlıdır (aşılırsa
+# 503 + Retry-After). request_timeout_s aşılırsa 504 döner; arka plandaki çalışma bittiğinde slot
+# serbest kalır (eşzamanlılık sınırı zaman aşımlarında da korunur). Kapanışta (SIGTERM/SIGINT)
+# yeni istekler 503 alır, uçuştaki istekler drain_timeout_s kadar beklenir, sonra havuz kapatılır.
+# runtime.single_flight açıkken /ask'te aynı anda uçuşan aynı soru (normalize metin + show_sql/rag)
+# bir kez çalışır; tekrarlar slot almadan ilk çalıştırmanın sonucunu bekler ("coalesced": true).
+# Başlangıçta ısınma (warmup.py) arka planda koşar; /readyz ancak ısınma bittikten sonra 200 döner.
+import argparse, asyncio, json, logging, time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+import yaml
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from runtime import AgentRuntime
+from utils.logging import flush_logging, setup_logging_from_config
+from utils.metrics import CONTENT_TYPE, HTTP_INFLIGHT, HTTP_QUEUED, HTTP_REQUESTS, REGISTRY, setup_metrics
+from utils.singleflight import AsyncSingleFlight, question_key
+from utils.tracing import get_tracer
+from utils.types import AgentState
+from warmup import warm_up, warmup_config
+
+log = logging.getLogger("api")
+
+API_DEFAULTS = {
+    "host": "0.0.0.0",
+    "port": 8080,
+    "max_concurrency": 8,
+    "max_queue": 64,
+    "queue_timeout_s": 10,
+    "request_timeout_s": 60,
+    "drain_timeout_s": 30,
+}
+
+
+class Overloaded(Exception):
+    """Slot alınamadı (kuyruk dolu veya bekleme süresi aştı) → 503."""
+
+
+class AgentService:
+    """Paylaşılan runtime + eşzamanlılık sınırı + zaman aşımı + drain durumu."""
+
+    def __init__(self, cfg: Dict[str, Any], llm_service=None):
+        self.cfg = cfg
+        self.ac = {**API_DEFAULTS, **(cfg.get("api") or {})}
+        n = int(self.ac["max_concurrency"])
+        self.rt = AgentRuntime(cfg, llm_service=llm_service, pool_size=max(n, cfg["db"].get("pool_size", 4)))
+        self.pool = ThreadPoolExecutor(max_workers=n, thread_name_prefix="api")
+        self.slots = asyncio.Semaphore(n)
+        self.waiting = 0
+        self.inflight = 0
+        self.ready = False
+        self.warming = False
+        self.draining = False
+        self.flight = AsyncSingleFlight("api") if cfg["runtime"].get("single_flight", True) else None
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    # --- slot yönetimi -------------------------------------------------------------
+    async def acquire(self) -> None:
+        if self.draining:
+            raise Overloaded("kapanıyor")
+        if not self.slots.locked():
+            await self.slots.acquire()   # boş slot: beklemeden (kuyruğa sayılmaz)
+        else:
+            if self.waiting >= int(self.ac["max_queue"]):
+                raise Overloaded("kuyruk dolu")
+            self.waiting += 1
+            HTTP_QUEUED.inc()
+            try:
+                await asyncio.wait_for(self.slots.acquire(), timeout=float(self.ac["queue_timeout_s"]))
+            except asyncio.TimeoutError:
+                raise Overloaded("slot bekleme süresi aşıldı") from None
+            finally:
+                self.waiting -= 1
+                HTTP_QUEUED.dec()
+        self.inflight += 1
+        HTTP_INFLIGHT.inc()
+        self._idle.clear()
+
+    def release(self) -> None:
+        self.inflight -= 1
+        HTTP_INFLIGHT.dec()
+        self.slots.release()
+        if self.inflight == 0:
+            self._idle.set()
+
+    def _release_when_done(self, fut: "asyncio.Future") -> None:
+        # Zaman aşımında thread durdurulamaz; slot çalışma gerçekten bitince bırakılır
+        fut.add_done_callback(lambda _f: self.release())
+
+    # --- çalıştırma ----------------------------------------------------------------
+    async def ask(self, question: str, show_sql: Optional[bool], rag: Optional[bool]):
+        """→ (Answer, coalesced). Tekrarlanan uçuştaki soru slot almadan ilk çalıştırmayı bekler."""
+        if self.flight is None:
+            return await self._run(question, show_sql, rag), False
+        if self.draining:
+            raise Overloaded("kapanıyor")
+        return await self.flight.do(question_key(question, show_sql, rag), lambda: self._run(question, show_sql, rag))
+
+    async def _run(self, question: str, show_sql: Optional[bool], rag: Optional[bool]):
+        await self.acquire()
+        loop = asyncio.get_running_loop()
+        fut = loop.run_in_executor(self.pool, lambda: self.rt.ask(question, show_sql=show_sql, rag_enabled=rag))
+        try:
+            return await asyncio.wait_for(asyncio.shield(fut), timeout=float(self.ac["request_timeout_s"]))
+        finally:
+            self._release_when_done(fut)
+
+    async def warm_up(self) -> None:
+        """Isınmayı thread'de çalıştırır (event loop /healthz ve /readyz'ye cevap vermeye devam eder)."""
+        if warmup_config(self.cfg)["enabled"]:
+            self.warming = True
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, warm_up, self.rt)
+            except Exception as e:
+                log.exception("Warm-up hatası: %s", e)
+            finally:
+                self.warming = False
+        if not self.draining:
+            self.ready = True
+            log.info("API hazır (max_concurrency=%s, max_queue=%s)", self.ac["max_concurrency"], self.ac["max_queue"])
+
+    async def drain(self) -> None:
+        self.draining = True
+        self.ready = False
+        if self.inflight:
+            log.info("Kapanış: %d uçuştaki istek bekleniyor (en fazla %ss)", self.inflight, self.ac["drain_timeout_s"])
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout=float(self.ac["drain_timeout_s"]))
+            except asyncio.TimeoutError:
+                log.warning("Kapanış: %d istek drain süresinde bitmedi", self.inflight)
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.rt.close()
+
+
+def _answer_payload(st: AgentState, cost: Dict[str, float], ms: float, coalesced: bool = False) -> Dict[str, Any]:
+    return {
+        "trace_id": st.trace_id,
+        "question": st.question,
+        "intent": st.intent,
+        "answer": st.answer_text,
+        "sql": st.validated_sql,
+        "rows_preview": st.rows_preview,
+        "execution_stats": st.execution_stats,
+        "summary_path": st.summary_path,
+        "template": (st.template_match or {}).get("name") if (st.template_match or {}).get("used") else None,
+        "cost": cost,
+        "ms": round(ms, 1),
+        "coalesced": coalesced,
+    }
+
+
+def _json(obj: Any, status: int = 200, headers: Optional[Dict[str, str]] = None) -> Response:
+    body = json.dumps(obj, ensure_ascii=False, default=str)
+    return Response(body, status_code=status, media_type="application/json", headers=headers)
+
+
+async def _parse(request: Request):
+    try:
+        body = await request.json()
+    except Exception:
+        return None, _json({"error": "Geçersiz JSON gövdesi"}, 400)
+    q = (body or {}).get("question")
+    if not isinstance(q, str) or not q.strip():
+        return None, _json({"error": "'question' alanı gerekli"}, 400)
+    show_sql = body.get("show_sql")
+    rag = body.get("rag")
+    return (q.strip(), show_sql if isinstance(show_sql, bool) else None, rag if isinstance(rag, bool) else None), None
+
+
+def _overloaded(e: Overloaded) -> Response:
+    return _json({"error": f"Sunucu meşgul: {e}"}, 503, {"Retry-After": "1"})
+
+
+# --- uç noktalar -------------------------------------------------------------------
+async def ask(request: Request) -> Response:
+    svc: AgentService = request.app.state.svc
+    args, err = await _parse(request)
+    if err is not None:
+        HTTP_REQUESTS.inc(endpoint="/ask", code=str(err.status_code))
+        return err
+    try:
+        res, coalesced = await svc.ask(*args)
+        resp = _json(_answer_payload(res.state, res.cost, res.ms, coalesced))
+    except Overloaded as e:
+        resp = _overloaded(e)
+    except asyncio.TimeoutError:
+        resp = _json({"error": f"Zaman aşımı ({svc.ac['request_timeout_s']} s)"}, 504)
+    except Exception as e:
+        log.exception("/ask hatası: %s", e)
+        resp = _json({"error": f"{type(e).__name__}: {e}"}, 500)
+    HTTP_REQUESTS.inc(endpoint="/ask", code=str(resp.status_code))
+    return resp
+
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+async def ask_stream(request: Request) -> Response:
+    """
+    Server-Sent Events:
+      event: node    data: {"node": "...", "ms": düğüm başlangıcından beri}
+      event: answer  data: /ask ile aynı gövde
+      event: error   data: {"error": "..."}
+    """
+    svc: AgentService = request.app.state.svc
+    args, err = await _parse(request)
+    if err is not None:
+        HTTP_REQUESTS.inc(endpoint="/ask/stream", code=str(err.status_code))
+        return err
+    try:
+        await svc.acquire()
+    except Overloaded as e:
+        HTTP_REQUESTS.inc(endpoint="/ask/stream", code="503")
+        return _overloaded(e)
+
+    question, show_sql, rag = args
+    loop = asyncio.get_running_loop()
+    q: "asyncio.Queue" = asyncio.Queue()
+    cost = svc.rt.new_cost()
+    t0 = time.perf_counter()
+
+    def produce():
+        last = None
+        try:
+            for ev in svc.rt.stream(question, cost=cost, show_sql=show_sql, rag_enabled=rag):
+                node, last = next(iter(ev.items()))
+                loop.call_soon_threadsafe(q.put_nowait, ("node", node))
+            loop.call_soon_threadsafe(q.put_nowait, ("done", last))
+        except Exception as e:
+            loop.call_soon_threadsafe(q.put_nowait, ("error", e))
+
+    fut = loop.run_in_executor(svc.pool, produce)
+    svc._release_when_done(fut)
+    deadline = loop.time() + float(svc.ac["request_timeout_s"])
+
+    async def events():
+        code = "200"
+        try:
+            while True:
+                try:
+                    kind, payload = await asyncio.wait_for(q.get(), timeout=max(0.0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    code = "504"
+                    yield _sse("error", {"error": f"Zaman aşımı ({svc.ac['request_timeout_s']} s)"})
+                    return
+                ms = round((time.perf_counter() - t0) * 1000, 1)
+                if kind == "node":
+                    yield _sse("node", {"node": payload, "ms": ms})
+                elif kind == "done":
+                    st = AgentState(**payload) if isinstance(payload, dict) else payload
+                    yield _sse("answer", _answer_payload(st, cost.to_dict(), ms))
+                    return
+                else:
+                    code = "500"
+                    log.error("/ask/stream hatası: %s", payload)
+                    yield _sse("error", {"error": f"{type(payload).__name__}: {payload}"})
+                    return
+        finally:
+            HTTP_REQUESTS.inc(endpoint="/ask/stream", code=code)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+async def healthz(request: Request) -> Response:
+    return PlainTextResponse("ok")
+
+
+async def readyz(request: Request) -> Response:
+    svc: AgentService = request.app.state.svc
+    if svc.ready and not svc.draining:
+        return _json({"ready": True, "inflight": svc.inflight, "queued": svc.waiting})
+    return _json({"ready": False, "warming": svc.warming, "draining": svc.draining}, 503)
+
+
+async def metrics(request: Request) -> Response:
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+def create_app(cfg: Dict[str, Any], llm_service=None) -> Starlette:
+    """ASGI uygulaması; runtime lifespan başlangıcında kurulur, kapanışta drain edilir."""
+
+    @asynccontextmanager
+    async def lifespan(app: Starlette):
+        svc = AgentService(cfg, llm_service=llm_service)
+        app.state.svc = svc
+        # Isınma arka planda: sunucu dinlemeye başlar, /readyz ısınma bitene kadar 503 döner
+        warm = asyncio.create_task(svc.warm_up())
+        try:
+            yield
+        finally:
+            warm.cancel()
+            await svc.drain()
+            mc = cfg.get("metrics", {}) or {}
+            if mc.get("enabled") and mc.get("dump_path"):
+                try:
+                    REGISTRY.dump(mc["dump_path"])
+                except OSError as e:
+                    log.warning("Metrik dosyası yazılamadı: %s", e)
+            log.info("API kapandı")
+            flush_logging()
+
+    routes = [
+        Route("/ask", ask, methods=["POST"]),
+        Route("/ask/stream", ask_stream, methods=["POST"]),
+        Route("/healthz", healthz, methods=["GET"]),
+        Route("/readyz", readyz, methods=["GET"]),
+        Route("/metrics", metrics, methods=["GET"]),
+    ]
+    return Starlette(routes=routes, lifespan=lifespan)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Analist AI Ajanı — HTTP API")
+    ap.add_argument("--config", default="config.yaml")
+    ap.add_argument("--host", default=None)
+    ap.add_argument("--port", type=int, default=None)
+    args = ap.parse_args()
+
+    with open(args.config, "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f)
+    setup_logging_from_config(cfg)
+    setup_metrics(cfg, get_tracer(cfg))
+    ac = {**API_DEFAULTS, **(cfg.get("api") or {})}
+
+    import uvicorn
+    uvicorn.run(
+        create_app(cfg),
+        host=args.host or ac["host"],
+        port=args.port or int(ac["port"]),
+        log_config=None,                                   # loglar utils.logging hattından akar
+        timeout_graceful_shutdown=int(ac["drain_timeout_s"]),
+    )
+
+
+if __name__ == "__main__":
+    main()
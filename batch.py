@@ -0,0 +1,172 @@
+# batch.py — Toplu soru modu: JSONL soru dosyası → JSONL cevap dosyası (paralel, devam ettirilebilir)
+#
+# Kullanım:
+#   python main.py --batch questions.jsonl --out answers.jsonl --workers 8 [--llm-concurrency 4]
+#
+# Girdi satırları: {"id": ..., "question": "..."} (id yoksa satır numarası kullanılır; düz metin
+# satırları da kabul edilir). Config/DB havuzu/LLM/graf bir kez kurulur (runtime.AgentRuntime);
+# sorular `workers` thread'de koşar, LLM'e aynı anda en fazla `llm.max_concurrency` istek gider.
+#
+# Her sonuç bittiği anda çıktı dosyasına bir satır olarak eklenir (flush). Çökme/kesinti sonrası
+# aynı komut tekrar çalıştırılırsa çıktıda başarıyla tamamlanmış id'ler atlanır; hatayla biten
+# id'ler yeniden denenir (aynı id için son satır geçerlidir). Yarım kalmış son satır kesilir.
+import json, logging, os, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from runtime import AgentRuntime
+
+log = logging.getLogger("batch")
+
+
+def load_batch(path: str) -> List[Tuple[Any, str]]:
+    """JSONL → [(id, soru)]; boş satırlar atlanır, yinelenen id'lerden ilki alınır."""
+    items, seen = [], set()
+    with open(path, "r", encoding="utf-8") as f:
+        for i, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                rec = line
+            if isinstance(rec, dict):
+                qid, q = rec.get("id", i), rec.get("question")
+            else:
+                qid, q = i, str(rec)
+            if not isinstance(q, str) or not q.strip():
+                log.warning("Satır %d: 'question' yok, atlandı", i)
+                continue
+            if qid in seen:
+                log.warning("Satır %d: yinelenen id %r atlandı", i, qid)
+                continue
+            seen.add(qid)
+            items.append((qid, q.strip()))
+    return items
+
+
+def completed_ids(out_path: str) -> Set[Any]:
+    """
+    Çıktı dosyasında hatasız tamamlanmış id'ler. Çökme sırasında yarım yazılmış son satır
+    dosyadan kesilir (sonraki eklemeler bozuk satıra yapışmasın).
+    """
+    if not os.path.exists(out_path):
+        return set()
+    with open(out_path, "rb") as f:
+        data = f.read()
+    if data and not data.endswith(b"\n"):
+        keep = data.rfind(b"\n") + 1
+        log.warning("Çıktıdaki yarım son satır kesiliyor (%d bayt)", len(data) - keep)
+        with open(out_path, "r+b") as f:
+            f.truncate(keep)
+        data = data[:keep]
+    status: Dict[Any, bool] = {}
+    for line in data.decode("utf-8").splitlines():
+        try:
+            rec = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        status[rec.get("id")] = not rec.get("error")
+    return {qid for qid, ok in status.items() if ok}
+
+
+def _answer_record(qid: Any, question: str, rt: AgentRuntime) -> Dict[str, Any]:
+    try:
+        res = rt.ask(question)
+    except Exception as e:
+        log.exception("[%s] soru başarısız: %s", qid, e)
+        return {"id": qid, "question": question, "error": f"{type(e).__name__}: {e}"}
+    st = res.state
+    return {
+        "id": qid,
+        "question": question,
+        "trace_id": st.trace_id,
+        "intent": st.intent,
+        "answer": st.answer_text,
+        "sql": st.validated_sql,
+        "ok": bool((st.execution_stats or {}).get("ok")),
+        "rows_preview": st.rows_preview,
+        "template": (st.template_match or {}).get("name") if (st.template_match or {}).get("used") else None,
+        "cost": res.cost,
+        "ms": round(res.ms, 1),
+    }
+
+
+def _pct(xs: List[float], p: float) -> Optional[float]:
+    if not xs:
+        return None
+    xs = sorted(xs)
+    k = (len(xs) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(xs) - 1)
+    return round(xs[lo] + (xs[hi] - xs[lo]) * (k - lo), 1)
+
+
+def run_batch(rt: AgentRuntime, in_path: str, out_path: str, workers: int = 4, progress: bool = True) -> Dict[str, Any]:
+    """Soruları paralel çalıştırır, sonuçları bittikçe out_path'e ekler; bu koşunun özetini döndürür."""
+    items = load_batch(in_path)
+    done = completed_ids(out_path)
+    todo = [(qid, q) for qid, q in items if qid not in done]
+    log.info("Batch: %d soru, %d önceden tamamlanmış, %d çalıştırılacak (workers=%d)",
+             len(items), len(items) - len(todo), len(todo), workers)
+
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    lock = threading.Lock()
+    lat: List[float] = []
+    counts = {"ok": 0, "failed": 0, "error": 0, "template": 0}
+    usd = 0.0
+    step = max(1, len(todo) // 20)
+    t0 = time.perf_counter()
+
+    with open(out_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as ex:
+        futures = [ex.submit(_answer_record, qid, q, rt) for qid, q in todo]
+        try:
+            for n, fut in enumerate(as_completed(futures), 1):
+                rec = fut.result()
+                with lock:
+                    out.write(json.dumps(rec, ensure_ascii=False, default=str) + "\n")
+                    out.flush()
+                if rec.get("error"):
+                    counts["error"] += 1
+                else:
+                    counts["ok" if rec["ok"] else "failed"] += 1
+                    counts["template"] += rec["template"] is not None
+                    lat.append(rec["ms"])
+                    usd += rec["cost"].get("usd", 0.0)
+                if progress and (n % step == 0 or n == len(todo)):
+                    el = time.perf_counter() - t0
+                    print(f"[batch] {n}/{len(todo)}  {n / el:.2f} soru/s", file=sys.stderr, flush=True)
+        except KeyboardInterrupt:
+            # Bekleyenler iptal; yazılmış sonuçlar kalır → aynı komutla devam edilir
+            for f in futures:
+                f.cancel()
+            log.warning("Batch kesildi; tekrar çalıştırıldığında kaldığı yerden devam eder")
+            raise
+
+    wall = time.perf_counter() - t0
+    return {
+        "total": len(items),
+        "skipped": len(items) - len(todo),
+        "processed": len(todo),
+        **counts,
+        "wall_s": round(wall, 2),
+        "throughput_qps": round(len(todo) / wall, 2) if wall > 0 and todo else None,
+        "latency_ms": {"p50": _pct(lat, 50), "p95": _pct(lat, 95), "p99": _pct(lat, 99),
+                       "mean": round(sum(lat) / len(lat), 1) if lat else None},
+        "usd": round(usd, 6),
+        "workers": workers,
+        "llm_concurrency": getattr(rt.llm, "max_concurrency", None),
+    }
+
+
+def print_summary(s: Dict[str, Any], currency: str = "USD") -> None:
+    l = s["latency_ms"]
+    print("\n================= BATCH =================")
+    print(f"Soru: {s['total']} (atlanan {s['skipped']}, çalıştırılan {s['processed']})")
+    print(f"Sonuç: başarılı {s['ok']} | SQL başarısız {s['failed']} | hata {s['error']} | şablon {s['template']}")
+    print(f"Süre: {s['wall_s']} s | throughput {s['throughput_qps']} soru/s "
+          f"(workers={s['workers']}, LLM eşzamanlılık={s['llm_concurrency'] or 'sınırsız'})")
+    print(f"Gecikme: p50 {l['p50']} | p95 {l['p95']} | p99 {l['p99']} | ort. {l['mean']} ms")
+    print(f"Maliyet: {s['usd']} {currency}")
+    print("=========================================\n")
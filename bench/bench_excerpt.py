@@ -0,0 +1,76 @@
+# bench/bench_excerpt.py — Summarizer excerpt kodlamasının token kazancı
+#
+# Kullanım (repo kökünden):
+#   python bench/bench_excerpt.py [--budget 1200] [-v]
+#
+# Eval setindeki expected_sql sorgularını bundled DB'de çalıştırır (executor ile aynı
+# önizleme: ilk 50 satır) ve her sonuç için eski json.dumps kesitinin token tahminini
+# csv/tsv/columnar/sketch ve auto seçimiyle karşılaştırır. Token tahmini CostTracker ile
+# aynıdır (≈4 karakter/token).
+import argparse, json, os, sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import yaml
+from tools.db import connect_readonly, execute_preview
+from utils.cost import CostTracker
+from utils.excerpt import ENCODERS, encode_excerpt, encode_sketch
+
+est = CostTracker.est_tokens
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Summarizer excerpt token measurement")
+    ap.add_argument("--config", default=os.path.join(ROOT, "config.yaml"))
+    ap.add_argument("--eval", default=os.path.join(ROOT, "eval", "eval_questions.jsonl"))
+    ap.add_argument("--budget", type=int, default=1200, help="auto seçim için token bütçesi")
+    ap.add_argument("--preview-rows", type=int, default=50)
+    ap.add_argument("-v", "--verbose", action="store_true", help="soru bazında satır bas")
+    args = ap.parse_args()
+
+    with open(args.config, "r") as f:
+        cfg = yaml.safe_load(f)
+    db_path = cfg["db"]["path"]
+    if not os.path.isabs(db_path):
+        db_path = os.path.join(ROOT, db_path)
+    conn = connect_readonly(db_path)
+
+    names = list(ENCODERS) + ["sketch", "auto"]
+    totals = {n: 0 for n in names}
+    picks: dict[str, int] = {}
+    n_ok = 0
+    for line in open(args.eval, encoding="utf-8"):
+        if not line.strip():
+            continue
+        d = json.loads(line)
+        try:
+            out = execute_preview(conn, d["expected_sql"], preview_rows=args.preview_rows)
+        except Exception as e:
+            print(f"[!] #{d.get('id')} çalışmadı: {e}")
+            continue
+        rows = out["rows"]
+        if not rows:
+            continue
+        n_ok += 1
+        toks = {n: est(fn(rows)) for n, fn in ENCODERS.items()}
+        toks["sketch"] = est(encode_sketch(rows, out["truncated"]))
+        txt, desc = encode_excerpt(rows, budget_tokens=args.budget, max_rows=args.preview_rows, truncated=out["truncated"])
+        toks["auto"] = est(txt)
+        pick = desc.split(",")[0]
+        picks[pick] = picks.get(pick, 0) + 1
+        for n in names:
+            totals[n] += toks[n]
+        if args.verbose:
+            print(f"#{d.get('id'):>3} {len(rows):>3}x{len(rows[0])}  json={toks['json']:>5}  auto={toks['auto']:>5} ({desc})")
+
+    base = totals["json"] or 1
+    print(f"\n{n_ok} boş olmayan sonuç, bütçe={args.budget} token")
+    print(f"{'format':<10}{'token':>9}{'json’a göre':>14}")
+    for n in names:
+        print(f"{n:<10}{totals[n]:>9}{(1 - totals[n] / base) * 100:>13.1f}%")
+    print("auto seçimleri:", ", ".join(f"{k}={v}" for k, v in sorted(picks.items())))
+
+
+if __name__ == "__main__":
+    main()
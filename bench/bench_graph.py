@@ -0,0 +1,254 @@
+# bench/bench_graph.py — Uçtan uca graf yük testi (mock LLM ile, çevrimdışı ve tekrarlanabilir)
+#
+# Kullanım (herhangi bir dizinden):
+#   python bench/bench_graph.py                                   # bundled DB, eşzamanlılık 1,4,8
+#   python bench/bench_graph.py --db data/app.db --db data/app_x100.db --concurrency 1,8 --requests 200
+#   python bench/bench_graph.py --scale 100                      # bundled + ×100 (yoksa scale_db ile üretilir)
+#   python bench/bench_graph.py --save-baseline bench/baseline.json
+#   python bench/bench_graph.py --baseline bench/baseline.json     # regresyon karşılaştırması (çıkış kodu 1)
+#
+# Eval soruları derlenmiş graf üzerinden (runtime.AgentRuntime) thread havuzuyla koşturulur;
+# LLM, llm.mock ayarlarıyla utils.mock_llm'dir (--time-scale 0 → LLM beklemesi yok, saf graf
+# overhead'i). Her DB senaryosu ayrı bir alt süreçte koşar: başlangıç süresi ve pik RSS
+# senaryolar arasında karışmaz.
+#
+# Raporlanan: başlangıç (import + runtime kurulumu), ilk (soğuk) istek, eşzamanlılık başına
+# throughput ve istek p50/p95/p99, düğüm bazlı p50/p95/p99 (tracer span'leri), pik RSS.
+import argparse, json, os, resource, subprocess, sys, time
+
+T_START = time.perf_counter()
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def _pct(xs, p):
+    if not xs:
+        return None
+    xs = sorted(xs)
+    k = (len(xs) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(xs) - 1)
+    return round(xs[lo] + (xs[hi] - xs[lo]) * (k - lo), 3)
+
+
+def _dist(xs):
+    return {"p50": _pct(xs, 50), "p95": _pct(xs, 95), "p99": _pct(xs, 99), "n": len(xs)}
+
+
+def _peak_rss_mb() -> float:
+    # Linux: KB, macOS: byte
+    r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(r / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+# --- Alt süreç: tek DB senaryosu ------------------------------------------------
+def run_scenario(args) -> dict:
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    import yaml
+
+    with open(args.config, "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f)
+    levels = [int(c) for c in args.concurrency.split(",")]
+    db_path = args.db[0]
+    cfg["db"]["path"] = db_path
+    cfg["db"]["pool_size"] = max(levels)
+    cfg["llm"]["use_mock"] = True
+    cfg["llm"]["mock"] = {**(cfg["llm"].get("mock") or {}), "mode": "replay", "time_scale": args.time_scale}
+    cfg["tracing"] = {"enabled": True, "jsonl_path": None, "otel_path": None, "tracemalloc": False}
+    cfg["metrics"] = {"enabled": False}
+    cfg.setdefault("planner", {})["question_log"] = None
+    if args.no_rag:
+        cfg["rag"]["enabled"] = False
+    os.chdir(ROOT)   # config'teki göreli yollar (RAG/intent modeli, fixture) repo köküne göre
+
+    from runtime import AgentRuntime
+    from utils.tracing import get_tracer
+    t_import = time.perf_counter()
+    rt = AgentRuntime(cfg)
+    t_ready = time.perf_counter()
+
+    lock = threading.Lock()
+    node_ms: dict = {}
+
+    def on_trace(rec):
+        with lock:
+            for s in rec["spans"]:
+                node_ms.setdefault(s["name"], []).append(s["wall_ms"])
+
+    get_tracer(cfg).listeners.append(on_trace)
+
+    with open(args.eval, "r", encoding="utf-8") as f:
+        questions = [json.loads(l)["question"] for l in f if l.strip()]
+
+    # Soğuk ilk istek (lazy cache'ler: katalog, RAG indeksi, boyutlar ...)
+    first = rt.ask(questions[0])
+    out = {
+        "db": os.path.basename(db_path),
+        "db_bytes": os.path.getsize(db_path),
+        "startup_ms": {
+            "import": round((t_import - T_START) * 1000, 1),
+            "runtime": round((t_ready - t_import) * 1000, 1),
+            "total": round((t_ready - T_START) * 1000, 1),
+        },
+        "first_request_ms": round(first.ms, 1),
+        "runs": [],
+    }
+    for _ in range(args.warmup):
+        for q in questions:
+            rt.ask(q)
+
+    n = args.requests or len(questions) * 3
+    work = [questions[i % len(questions)] for i in range(n)]
+    for c in levels:
+        with lock:
+            node_ms.clear()
+        lat, errors = [], 0
+
+        def one(q):
+            try:
+                return rt.ask(q).ms
+            except Exception:
+                return None
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=c, thread_name_prefix="bench") as ex:
+            for ms in ex.map(one, work):
+                if ms is None:
+                    errors += 1
+                else:
+                    lat.append(ms)
+        wall = time.perf_counter() - t0
+        with lock:
+            nodes = {k: _dist(v) for k, v in sorted(node_ms.items())}
+        out["runs"].append({
+            "concurrency": c,
+            "requests": n,
+            "errors": errors,
+            "wall_s": round(wall, 3),
+            "throughput_rps": round(n / wall, 2) if wall else None,
+            "latency_ms": _dist(lat),
+            "nodes_ms": nodes,
+        })
+    out["llm"] = dict(rt.llm.stats) if hasattr(rt.llm, "stats") else {}
+    rt.close()
+    out["peak_rss_mb"] = _peak_rss_mb()
+    return out
+
+
+# --- Ana süreç: senaryoları koştur, raporla, karşılaştır -------------------------
+def _print_result(res: dict) -> None:
+    st = res["startup_ms"]
+    print(f"\n== {res['db']} ({res['db_bytes'] / 1e6:.1f} MB) ==")
+    print(f"başlangıç: import {st['import']} ms + runtime {st['runtime']} ms = {st['total']} ms | "
+          f"ilk istek: {res['first_request_ms']} ms | pik RSS: {res['peak_rss_mb']} MB")
+    for r in res["runs"]:
+        l = r["latency_ms"]
+        print(f"  c={r['concurrency']:<3} {r['throughput_rps']:>8} req/s | p50 {l['p50']} p95 {l['p95']} p99 {l['p99']} ms"
+              f" | hata {r['errors']}/{r['requests']}")
+        for name, d in r["nodes_ms"].items():
+            print(f"      {name:<10} p50 {d['p50']:>9} p95 {d['p95']:>9} p99 {d['p99']:>9} ms")
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """Throughput düşüşü veya p95 artışı tolerance'ı aşan (db, eşzamanlılık) çiftleri."""
+    regressions = []
+    base = {(r["db"], run["concurrency"]): run for r in baseline["results"] for run in r["runs"]}
+    for r in current["results"]:
+        for run in r["runs"]:
+            b = base.get((r["db"], run["concurrency"]))
+            if not b:
+                continue
+            tag = f"{r['db']} c={run['concurrency']}"
+            if b["throughput_rps"] and run["throughput_rps"] < b["throughput_rps"] * (1 - tolerance):
+                regressions.append(f"{tag}: throughput {b['throughput_rps']} → {run['throughput_rps']} req/s")
+            bp, cp = b["latency_ms"]["p95"], run["latency_ms"]["p95"]
+            if bp and cp and cp > bp * (1 + tolerance):
+                regressions.append(f"{tag}: p95 {bp} → {cp} ms")
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description="End-to-end graph load test (mock LLM)")
+    ap.add_argument("--config", default=os.path.join(ROOT, "config.yaml"))
+    ap.add_argument("--eval", default=os.path.join(ROOT, "eval", "eval_questions.jsonl"))
+    ap.add_argument("--db", action="append", help="DB yolu (tekrarlanabilir); varsayılan config'teki db.path")
+    ap.add_argument("--scale", type=int, action="append", default=[],
+                    help="bundled DB'nin N× büyütülmüş kopyasıyla da koştur (bench/scale_db.py; yoksa üretilir)")
+    ap.add_argument("--concurrency", default="1,4,8", help="virgülle ayrılmış eşzamanlılık seviyeleri")
+    ap.add_argument("--requests", type=int, default=0, help="seviye başına istek (0 → 3 × soru sayısı)")
+    ap.add_argument("--warmup", type=int, default=1, help="ölçüm öncesi tüm soruların kaç tur koşulacağı")
+    ap.add_argument("--time-scale", type=float, default=0.0, help="mock LLM gecikme çarpanı (0 → beklemesiz)")
+    ap.add_argument("--no-rag", action="store_true")
+    ap.add_argument("--out", default=None, help="sonuç JSON'u")
+    ap.add_argument("--save-baseline", default=None, help="sonucu baseline olarak kaydet")
+    ap.add_argument("--baseline", default=None, help="karşılaştırılacak baseline JSON")
+    ap.add_argument("--tolerance", type=float, default=0.15, help="regresyon eşiği (oran)")
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    for name in ("config", "eval", "out", "save_baseline", "baseline"):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+
+    if args.child:
+        json.dump(run_scenario(args), sys.stdout)
+        return
+
+    dbs = args.db
+    if not dbs:
+        import yaml
+        with open(args.config, "r", encoding="utf-8") as f:
+            dbs = [yaml.safe_load(f)["db"]["path"]]
+    dbs = [d if os.path.isabs(d) else os.path.join(ROOT, d) for d in dbs]
+    if args.scale:
+        from scale_db import scale, scaled_path
+        for factor in args.scale:
+            path = scaled_path(dbs[0], factor)
+            if not os.path.exists(path):
+                scale(dbs[0], path, factor)
+            dbs.append(path)
+
+    results = []
+    for db in dbs:
+        cmd = [sys.executable, os.path.abspath(__file__), "--child", "--db", db,
+               "--config", args.config, "--eval", args.eval, "--concurrency", args.concurrency,
+               "--requests", str(args.requests), "--warmup", str(args.warmup), "--time-scale", str(args.time_scale)]
+        if args.no_rag:
+            cmd.append("--no-rag")
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f"[!] {db}: senaryo başarısız\n{proc.stderr[-2000:]}", file=sys.stderr)
+            sys.exit(2)
+        res = json.loads(proc.stdout)
+        _print_result(res)
+        results.append(res)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "params": {"concurrency": args.concurrency, "requests": args.requests, "time_scale": args.time_scale,
+                   "rag": not args.no_rag},
+        "results": results,
+    }
+    for path in (args.out, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"\n[i] Kaydedildi: {path}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n[!] Regresyon (tolerans %{args.tolerance * 100:.0f}):")
+            for r in regressions:
+                print("  - " + r)
+            sys.exit(1)
+        print(f"\n[i] Baseline ile karşılaştırma: regresyon yok (tolerans %{args.tolerance * 100:.0f})")
+
+
+if __name__ == "__main__":
+    main()
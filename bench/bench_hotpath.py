@@ -0,0 +1,157 @@
+# bench/bench_hotpath.py — Planner + validator sıcak yol mikro-benchmark'ı
+#
+# Kullanım (repo kökünden):
+#   python bench/bench_hotpath.py --n 5000
+#
+# Eval sorularından (yazım hatası/gürültü varyasyonlarıyla) binlerce soru üretir ve
+#   - planner.run (intent/keyword/fuzzy eşleşme)
+#   - query_validator.static_check + column_check
+# için throughput ölçer. Karşılaştırma için eski (her çağrıda regex/difflib) yaklaşımın
+# referans implementasyonu da aynı veride koşturulur.
+import argparse, json, os, random, re, sys, time
+from difflib import get_close_matches
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import yaml
+from utils.types import AgentState
+from nodes import planner
+from nodes.query_validator import static_check, column_check
+from tools.db import connect_readonly, schema_catalog
+
+NOISE = ["merhaba", "selam nasılsın", "bugün hava nasıl", "bir şiir yaz", "tell me a joke", "test 123"]
+ALPHA = "abcçdefgğhıijklmnoöprsştuüvyz"
+
+
+def _typo(q: str, rng: random.Random) -> str:
+    words = q.split()
+    if not words:
+        return q
+    i = rng.randrange(len(words))
+    w = list(words[i])
+    if len(w) > 3:
+        j = rng.randrange(len(w))
+        if rng.random() < 0.5:
+            del w[j]
+        else:
+            w.insert(j, rng.choice(ALPHA))
+    words[i] = "".join(w)
+    return " ".join(words)
+
+
+def make_questions(eval_path: str, n: int, seed: int = 7) -> list[str]:
+    rng = random.Random(seed)
+    base = [json.loads(l)["question"] for l in open(eval_path, encoding="utf-8") if l.strip()]
+    out = []
+    for _ in range(n):
+        r = rng.random()
+        if r < 0.15:
+            out.append(rng.choice(NOISE))
+        elif r < 0.55:
+            out.append(_typo(rng.choice(base), rng))
+        else:
+            out.append(rng.choice(base))
+    return out
+
+
+# --- Eski yaklaşımın referansı (karşılaştırma için) ----------------------------
+def _legacy_mentions(q: str, schema_hint: str | None) -> bool:
+    ql = q.lower()
+    if any(tok in ql for tok in planner.DB_KEYWORDS):
+        return True
+    for t in re.findall(r"[a-z0-9ğüşöçıİĞÜŞÖÇ]+", ql):
+        if any(t in kw or kw in t for kw in planner.DB_KEYWORDS):
+            return True
+        if get_close_matches(t, planner.DB_KEYWORDS, n=1, cutoff=0.8):
+            return True
+    if schema_hint:
+        for line in schema_hint.lower().splitlines():
+            m = re.search(r"table\s+([a-z0-9_]+)", line)
+            if m and m.group(1) in ql:
+                return True
+    return False
+
+
+def _legacy_banned(sql: str, banned) -> str | None:
+    low = sql.lower()
+    for kw in banned:
+        if re.search(rf"\b{re.escape(kw.lower())}\b", low):
+            return kw
+    return None
+
+
+def _rate(n: int, dt: float) -> str:
+    return f"{n / dt:,.0f}/s ({dt * 1e6 / n:.1f} µs/op)"
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Planner/validator hot-path microbenchmark")
+    ap.add_argument("--config", default=os.path.join(ROOT, "config.yaml"))
+    ap.add_argument("--eval", default=os.path.join(ROOT, "eval", "eval_questions.jsonl"))
+    ap.add_argument("--n", type=int, default=5000, help="üretilecek soru sayısı")
+    args = ap.parse_args()
+
+    with open(args.config, "r") as f:
+        cfg = yaml.safe_load(f)
+    db_path = cfg["db"]["path"]
+    if not os.path.isabs(db_path):
+        db_path = os.path.join(ROOT, db_path)
+    conn = connect_readonly(db_path)
+    from nodes import schema_retriever
+    schema_doc = schema_retriever.run(conn, AgentState(question="-")).schema_doc
+
+    questions = make_questions(args.eval, args.n)
+    sqls = [json.loads(l)["expected_sql"] for l in open(args.eval, encoding="utf-8") if l.strip()]
+    sqls = (sqls * (args.n // len(sqls) + 1))[:args.n]
+    banned = cfg["security"]["banned_keywords"]
+    allowed = set(schema_catalog(conn))
+
+    print(f"Sorular: {len(questions)}  |  SQL: {len(sqls)}")
+
+    # Planner
+    t0 = time.perf_counter()
+    for q in questions:
+        planner.run(AgentState(question=q, schema_doc=schema_doc), rag_enabled_default=False)
+    dt = time.perf_counter() - t0
+    print(f"planner.run                 : {_rate(len(questions), dt)}")
+
+    t0 = time.perf_counter()
+    new_hits = [planner._mentions_db_semantics(q.lower(), schema_doc) for q in questions]
+    dt_new = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    old_hits = [_legacy_mentions(q, schema_doc) for q in questions]
+    dt_old = time.perf_counter() - t0
+    print(f"_mentions_db_semantics      : {_rate(len(questions), dt_new)}")
+    print(f"  legacy (difflib/regex)    : {_rate(len(questions), dt_old)}  → x{dt_old / dt_new:.1f}")
+    if new_hits != old_hits:
+        print(f"  [!] {sum(a != b for a, b in zip(new_hits, old_hits))} karar farkı")
+
+    # Validator
+    t0 = time.perf_counter()
+    for s in sqls:
+        static_check(s, banned, True, allowed)
+    dt = time.perf_counter() - t0
+    print(f"static_check                : {_rate(len(sqls), dt)}")
+
+    t0 = time.perf_counter()
+    for s in sqls:
+        _legacy_banned(s, banned)
+    dt_old = time.perf_counter() - t0
+    from utils.sql_utils import contains_banned
+    t0 = time.perf_counter()
+    for s in sqls:
+        contains_banned(s, banned)
+    dt_new = time.perf_counter() - t0
+    print(f"banned keywords             : {_rate(len(sqls), dt_new)}")
+    print(f"  legacy (regex/keyword)    : {_rate(len(sqls), dt_old)}  → x{dt_old / dt_new:.1f}")
+
+    t0 = time.perf_counter()
+    for s in sqls:
+        column_check(s, schema_catalog(conn))
+    dt = time.perf_counter() - t0
+    print(f"column_check (+catalog)     : {_rate(len(sqls), dt)}")
+
+
+if __name__ == "__main__":
+    main()
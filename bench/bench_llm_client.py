@@ -0,0 +1,158 @@
+# bench/bench_llm_client.py — Çok uç noktalı LLM istemcisinin yerel stand-in sunucularla denenmesi
+#
+# Kullanım (herhangi bir dizinden):
+#   python bench/bench_llm_client.py                              # fast + slow + flaky + down, hedge açık/kapalı
+#   python bench/bench_llm_client.py --replicas fast,fast,slow --requests 300 --concurrency 16
+#   python bench/bench_llm_client.py --replicas fast,flaky --error-rate 0.5 --no-compare
+#
+# Her replika ayrı bir utils.mock_llm.serve sunucusudur (OpenAI-compatible, ağ yok):
+#   fast  → time_scale = --fast-scale       slow  → time_scale = --slow-scale (kuyruk gecikmesi)
+#   flaky → fast + --error-rate oranında 503    down  → dinlemeyen port (bağlantı reddi)
+# İstekler utils.llm_pool.MultiEndpointLLM üzerinden eşzamanlı gönderilir; istek p50/p95/p99,
+# hata sayısı, replika başına dağılım, hedge sayıları ve devre kesici durumları raporlanır.
+# Varsayılan olarak aynı yük hedge açık ve kapalı iki kez koşturulur.
+import argparse, json, logging, os, socket, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.llm_pool import MultiEndpointLLM
+from utils.metrics import LLM_ENDPOINT_REQUESTS, LLM_HEDGES
+from utils.mock_llm import MockLLMService, serve
+
+
+def _pct(xs, p):
+    if not xs:
+        return None
+    xs = sorted(xs)
+    k = (len(xs) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(xs) - 1)
+    return round(xs[lo] + (xs[hi] - xs[lo]) * (k - lo), 1)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_replicas(kinds, args):
+    """kinds → [(tür, base_url)]; sunucular daemon thread'lerde çalışır."""
+    out, servers = [], []
+    hints = os.path.join(ROOT, "eval", "eval_questions.jsonl")
+    for i, kind in enumerate(kinds):
+        if kind == "down":
+            out.append((kind, f"http://127.0.0.1:{_free_port()}/v1"))
+            continue
+        scale = args.slow_scale if kind == "slow" else args.fast_scale
+        mock = MockLLMService(sql_hints=hints, base_latency_ms=150, prefill_tok_s=4000, decode_tok_s=40,
+                              jitter=0.3, seed=i, time_scale=scale)
+        srv = serve(mock, port=0, error_rate=args.error_rate if kind == "flaky" else 0.0, block=False)
+        servers.append(srv)
+        out.append((kind, f"http://127.0.0.1:{srv.server_address[1]}/v1"))
+    return out, servers
+
+
+def run_load(replicas, args, hedge: bool) -> dict:
+    from nodes.query_generator import SYSTEM_PROMPT_TMPL
+    with open(os.path.join(ROOT, "eval", "eval_questions.jsonl"), "r", encoding="utf-8") as f:
+        questions = [json.loads(l)["question"] for l in f if l.strip()]
+    system = SYSTEM_PROMPT_TMPL.format(allowed_tables="", max_limit=1000)
+    client = MultiEndpointLLM(
+        [{"base_url": url} for _, url in replicas],
+        model_name="mock",
+        max_tokens=256,
+        deadline_s=args.deadline,
+        attempt_timeout_s=args.deadline,
+        hedge=hedge,
+        hedge_delay_s=args.hedge_delay,
+        breaker_cooldown_s=args.cooldown,
+    )
+    before = {url: {o: LLM_ENDPOINT_REQUESTS.value(endpoint=url, outcome=o) for o in ("ok", "error")} for _, url in replicas}
+    h0 = {r: LLM_HEDGES.value(result=r) for r in ("sent", "won")}
+    lat, errors = [], {}
+    lock = threading.Lock()
+
+    def one(i):
+        t0 = time.perf_counter()
+        try:
+            client.get_text(system, f"QUESTION:\n{questions[i % len(questions)]}")
+            with lock:
+                lat.append((time.perf_counter() - t0) * 1000)
+        except Exception as e:
+            with lock:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as ex:
+        list(ex.map(one, range(args.requests)))
+    wall = time.perf_counter() - t0
+    per = {}
+    for kind, url in replicas:
+        per[f"{kind}@{url.split(':')[-1].split('/')[0]}"] = {
+            o: int(LLM_ENDPOINT_REQUESTS.value(endpoint=url, outcome=o) - before[url][o]) for o in ("ok", "error")
+        }
+    res = {
+        "hedge": hedge,
+        "requests": args.requests,
+        "ok": len(lat),
+        "errors": errors,
+        "wall_s": round(wall, 2),
+        "throughput_rps": round(args.requests / wall, 1),
+        "latency_ms": {"p50": _pct(lat, 50), "p95": _pct(lat, 95), "p99": _pct(lat, 99), "max": round(max(lat), 1) if lat else None},
+        "hedges": {r: int(LLM_HEDGES.value(result=r) - h0[r]) for r in ("sent", "won")},
+        "hedge_delay_ms": round(client.hedge_delay() * 1000, 1),
+        "per_endpoint": per,
+        "breakers": {b["base_url"].split(":")[-1].split("/")[0]: b["breaker"] for b in client.status()},
+    }
+    client.close()
+    return res
+
+
+def _print(res: dict) -> None:
+    l = res["latency_ms"]
+    print(f"\n== hedge {'AÇIK' if res['hedge'] else 'KAPALI'} ==")
+    print(f"  {res['ok']}/{res['requests']} başarılı | hata {res['errors'] or '-'} | {res['throughput_rps']} req/s")
+    print(f"  gecikme p50 {l['p50']} | p95 {l['p95']} | p99 {l['p99']} | max {l['max']} ms")
+    print(f"  hedge: gönderilen {res['hedges']['sent']}, kazanan {res['hedges']['won']} (gecikme {res['hedge_delay_ms']} ms)")
+    for name, c in res["per_endpoint"].items():
+        port = name.split("@")[1]
+        print(f"    {name:<14} ok {c['ok']:>5}  hata {c['error']:>5}  devre {res['breakers'].get(port)}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Multi-endpoint LLM client vs. local stand-in servers")
+    ap.add_argument("--replicas", default="fast,slow,flaky,down", help="virgülle: fast | slow | flaky | down")
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--fast-scale", type=float, default=0.1, help="fast/flaky replika gecikme çarpanı (mock: 150 ms + 40 tok/s)")
+    ap.add_argument("--slow-scale", type=float, default=1.0, help="slow replika gecikme çarpanı")
+    ap.add_argument("--error-rate", type=float, default=0.3, help="flaky replikanın 503 oranı")
+    ap.add_argument("--deadline", type=float, default=10.0, help="istek başına süre bütçesi (s)")
+    ap.add_argument("--hedge-delay", type=float, default=0.2, help="p95 örneği birikene kadarki hedge gecikmesi (s)")
+    ap.add_argument("--cooldown", type=float, default=5.0, help="devre açık kalma süresi (s)")
+    ap.add_argument("--no-compare", action="store_true", help="yalnızca hedge açık koş")
+    ap.add_argument("--out", default=None, help="sonuç JSON'u")
+    ap.add_argument("--verbose", action="store_true", help="yeniden deneme/devre uyarılarını göster")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.WARNING if args.verbose else logging.ERROR,
+                        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s")
+
+    replicas, servers = start_replicas([k.strip() for k in args.replicas.split(",") if k.strip()], args)
+    print("Replikalar: " + ", ".join(f"{k} {u}" for k, u in replicas))
+    results = [run_load(replicas, args, hedge=True)]
+    if not args.no_compare:
+        results.append(run_load(replicas, args, hedge=False))
+    for r in results:
+        _print(r)
+    for s in servers:
+        s.shutdown()
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
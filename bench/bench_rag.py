@@ -0,0 +1,154 @@
+# bench/bench_rag.py — RAG arama hızının sentetik büyük korpusta ölçülmesi
+#
+# Kullanım (herhangi bir dizinden):
+#   python bench/bench_rag.py                         # 100k belge, 500 soru
+#   python bench/bench_rag.py --docs 20000 --queries 200 --dim 384 --out rag_bench.json
+#
+# İki bölüm:
+#   tfidf → şema dökümanı biçiminde sentetik satırlar ("Table: ... | Columns: ...") üzerinde
+#           eski yol (cosine_similarity + tam argsort, soru başına) vs. argpartition (soru başına)
+#           vs. query_batch (tek seyrek matris çarpımı). Sonuçların eski yolla aynı olduğu doğrulanır.
+#   dense → kümelenmiş sentetik normalize vektörler (embedding modeli indirmeden): float64 + argsort
+#           vs. float32 DenseIndex tam arama vs. IVF (nprobe taraması); IVF recall@k ve bellek.
+import argparse, json, os, sys, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+from tools.rag import DenseIndex, _TFIDFRAG, _normalize
+
+_ENT = ["customer", "order", "product", "invoice", "payment", "shipment", "supplier", "employee",
+        "store", "region", "campaign", "return", "ticket", "account", "contract", "warehouse"]
+_COL = ["id", "name", "date", "amount", "status", "city", "country", "price", "quantity", "total",
+        "created_at", "updated_at", "category", "segment", "channel", "discount", "tax", "email"]
+_TR = ["müşteri", "sipariş", "ürün", "fatura", "ödeme", "sevkiyat", "tedarikçi", "çalışan",
+       "mağaza", "bölge", "kampanya", "iade", "talep", "hesap", "sözleşme", "depo"]
+
+
+def synth_docs(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    docs = []
+    for i in range(n):
+        e = rng.integers(len(_ENT))
+        cols = ", ".join(f"{_ENT[e]}_{c}" for c in rng.choice(_COL, size=rng.integers(3, 8), replace=False))
+        docs.append(f"Table: {_ENT[e]}_{i} ({_TR[e]} {i % 97}) | Columns: {cols}")
+    return docs
+
+
+def synth_questions(n: int, seed: int = 1):
+    rng = np.random.default_rng(seed)
+    out = []
+    for _ in range(n):
+        e = rng.integers(len(_ENT))
+        c = rng.choice(_COL, size=2, replace=False)
+        out.append(f"{_TR[e]} başına toplam {_ENT[e]} {c[0]} ve {c[1]} {rng.integers(97)}?")
+    return out
+
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    res = fn()
+    return res, (time.perf_counter() - t0) * 1000
+
+
+def bench_tfidf(docs, questions, top_k):
+    from sklearn.metrics.pairwise import cosine_similarity
+    rag, build_ms = _timed(lambda: _TFIDFRAG(docs))
+
+    def legacy():
+        out = []
+        for q in questions:
+            sims = cosine_similarity(rag.vectorizer.transform([_normalize(q)]), rag.X).ravel()
+            idx = np.argsort(-sims)[:top_k]
+            out.append([(float(sims[i]), docs[i]) for i in idx if sims[i] >= 0.0])
+        return out
+
+    old, legacy_ms = _timed(legacy)
+    _, single_ms = _timed(lambda: [rag.query(q, top_k, 0.0) for q in questions])
+    new, batch_ms = _timed(lambda: rag.query_batch(questions, top_k, 0.0))
+    # Skor eşitliklerinde sıra farklı olabilir → skor dizileri karşılaştırılır
+    same = all(np.allclose([s for s, _ in a], [s for s, _ in b], atol=1e-5) for a, b in zip(old, new))
+    n = len(questions)
+    return {
+        "build_ms": round(build_ms, 1),
+        "legacy_per_query_ms": round(legacy_ms / n, 3),
+        "argpartition_per_query_ms": round(single_ms / n, 3),
+        "query_batch_per_query_ms": round(batch_ms / n, 3),
+        "matches_legacy": bool(same),
+        "matrix_mb": round((rag.X.data.nbytes + rag.X.indices.nbytes + rag.X.indptr.nbytes) / 1e6, 1),
+    }
+
+
+def synth_vectors(n, dim, clusters, seed=0):
+    rng = np.random.default_rng(seed)
+    C = rng.standard_normal((clusters, dim)).astype(np.float32)
+    X = C[rng.integers(clusters, size=n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    X /= np.linalg.norm(X, axis=1, keepdims=True)
+    return X
+
+
+def bench_dense(n, nq, dim, top_k, nprobe):
+    X = synth_vectors(n, dim, clusters=max(16, n // 500))
+    rng = np.random.default_rng(7)
+    Q = X[rng.choice(n, size=nq, replace=False)] + 0.3 * rng.standard_normal((nq, dim)).astype(np.float32)
+    Q /= np.linalg.norm(Q, axis=1, keepdims=True)
+
+    X64 = X.astype(np.float64)
+    legacy, legacy_ms = _timed(lambda: [np.argsort(-(X64 @ q))[:top_k] for q in Q.astype(np.float64)])
+    exact, _ = _timed(lambda: DenseIndex(X, ivf={"min_docs": 0}))
+    exact_res, exact_ms = _timed(lambda: exact.search(Q, top_k, -1.0))
+    ivf, ivf_build_ms = _timed(lambda: DenseIndex(X, ivf={"min_docs": 1, "nprobe": nprobe}))
+    ivf_res, ivf_ms = _timed(lambda: ivf.search(Q, top_k, -1.0))
+
+    truth = [set(int(i) for i in row) for row in legacy]
+    recall = lambda res: float(np.mean([len(t & {i for i, _ in r}) / top_k for t, r in zip(truth, res)]))
+    return {
+        "dim": dim,
+        "float64_argsort_per_query_ms": round(legacy_ms / nq, 3),
+        "float32_exact_batch_per_query_ms": round(exact_ms / nq, 3),
+        "exact_recall": round(recall(exact_res), 4),
+        "ivf_build_ms": round(ivf_build_ms, 1),
+        "ivf_nlist": len(ivf.lists),
+        "ivf_nprobe": nprobe,
+        "ivf_per_query_ms": round(ivf_ms / nq, 3),
+        "ivf_recall": round(recall(ivf_res), 4),
+        "memory_mb": {"float64": round(X64.nbytes / 1e6, 1), "float32": round(exact.X.nbytes / 1e6, 1)},
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="RAG retrieval on a synthetic corpus")
+    ap.add_argument("--docs", type=int, default=100_000)
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--top-k", type=int, default=5)
+    ap.add_argument("--dim", type=int, default=384, help="dense vektör boyutu (MiniLM = 384)")
+    ap.add_argument("--nprobe", type=int, default=8)
+    ap.add_argument("--skip-dense", action="store_true")
+    ap.add_argument("--out", default=None, help="sonuç JSON'u")
+    args = ap.parse_args()
+
+    docs, questions = synth_docs(args.docs), synth_questions(args.queries)
+    res = {"docs": args.docs, "queries": args.queries, "top_k": args.top_k,
+           "tfidf": bench_tfidf(docs, questions, args.top_k)}
+    t = res["tfidf"]
+    print(f"== TF-IDF ({args.docs} belge, {args.queries} soru, kurulum {t['build_ms']:.0f} ms, {t['matrix_mb']} MB) ==")
+    print(f"  eski (cosine_similarity + argsort): {t['legacy_per_query_ms']} ms/soru")
+    print(f"  argpartition (query)              : {t['argpartition_per_query_ms']} ms/soru")
+    print(f"  query_batch                       : {t['query_batch_per_query_ms']} ms/soru")
+    print(f"  eski yolla aynı sonuç             : {t['matches_legacy']}")
+    if not args.skip_dense:
+        res["dense"] = d = bench_dense(args.docs, args.queries, args.dim, args.top_k, args.nprobe)
+        print(f"== Dense ({args.dim} boyut; bellek float64 {d['memory_mb']['float64']} MB → float32 {d['memory_mb']['float32']} MB) ==")
+        print(f"  float64 + argsort (soru başına)   : {d['float64_argsort_per_query_ms']} ms/soru")
+        print(f"  float32 tam arama (batch)         : {d['float32_exact_batch_per_query_ms']} ms/soru (recall {d['exact_recall']})")
+        print(f"  IVF nlist={d['ivf_nlist']} nprobe={d['ivf_nprobe']}          : {d['ivf_per_query_ms']} ms/soru "
+              f"(recall@{args.top_k} {d['ivf_recall']}, kurulum {d['ivf_build_ms']:.0f} ms)")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(res, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
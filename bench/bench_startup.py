@@ -0,0 +1,127 @@
+# bench/bench_startup.py — Başlangıç süresi ve import maliyeti raporu
+#
+# Kullanım (herhangi bir dizinden):
+#   python bench/bench_startup.py                         # import dökümü + tek seferlik soru (RAG'siz)
+#   python bench/bench_startup.py --top 30 --repeat 5 --question "Kaç kullanıcı var?"
+#   python bench/bench_startup.py --module graph          # yalnızca belirli modülün import ağacı
+#
+# 1) `python -X importtime -c "import <module>"` çıktısını ayrıştırır: kümülatif süreye göre en
+#    pahalı importlar ve üst seviye paket bazında öz (self) süre toplamları.
+# 2) Temiz alt süreçlerde main'in tek seferlik yolunu (import → AgentRuntime → ilk cevap, mock LLM)
+#    ölçer ve ağır modüllerden (torch, sklearn, sentence_transformers, langchain_openai ...)
+#    hangilerinin yüklendiğini raporlar. --strict ile RAG'e uğramayan bir soruda ağır modül
+#    yüklenirse çıkış kodu 1 olur.
+import argparse, json, os, statistics, subprocess, sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY = ("torch", "sentence_transformers", "transformers", "sklearn", "scipy", "numpy", "langchain_openai", "openai")
+
+# Alt süreçte koşan tek seferlik yol (main -q ile aynı adımlar; LLM mock, dosya izleri kapalı)
+ONE_SHOT = r"""
+import time; T0 = time.perf_counter()
+import json, os, sys
+sys.path.insert(0, {root!r}); os.chdir({root!r})
+import yaml
+from runtime import AgentRuntime
+t_import = time.perf_counter()
+with open({config!r}, "r", encoding="utf-8") as f:
+    cfg = yaml.safe_load(f)
+cfg["llm"]["use_mock"] = True
+cfg["llm"]["mock"] = {{**(cfg["llm"].get("mock") or {{}}), "mode": "replay", "time_scale": 0}}
+cfg["tracing"] = {{"enabled": True, "jsonl_path": None, "otel_path": None}}
+rt = AgentRuntime(cfg)
+t_ready = time.perf_counter()
+res = rt.ask({question!r})
+t_done = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (t_import - T0) * 1000,
+    "runtime_ms": (t_ready - t_import) * 1000,
+    "first_answer_ms": (t_done - t_ready) * 1000,
+    "total_ms": (t_done - T0) * 1000,
+    "use_rag": res.state.use_rag,
+    "intent": res.state.intent,
+    "heavy_loaded": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def importtime(module: str):
+    """-X importtime çıktısı → [(self_us, cum_us, derinlik, modül)]"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+    out = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2 + 1   # "| main" → 1, "|   runtime" → 2
+        out.append((int(self_us), int(cum_us), depth, name.strip()))
+    return out
+
+
+def report_imports(module: str, top: int) -> dict:
+    rows = importtime(module)
+    total = max((r[1] for r in rows if r[3] == module), default=sum(r[0] for r in rows))
+    by_pkg = defaultdict(int)
+    for s, _, _, name in rows:
+        by_pkg[name.split(".")[0]] += s
+
+    print(f"== import {module}: {total / 1000:.0f} ms ({len(rows)} modül) ==")
+    print("\nKümülatif süreye göre (üst seviye zincir, derinlik ≤ 3):")
+    for s, c, d, name in sorted((r for r in rows if r[2] <= 3), key=lambda r: -r[1])[:top]:
+        print(f"  {c / 1000:8.1f} ms  {'  ' * (d - 1)}{name}")
+    print("\nPaket bazında öz süre:")
+    pkgs = sorted(by_pkg.items(), key=lambda kv: -kv[1])[:top]
+    for pkg, s in pkgs:
+        print(f"  {s / 1000:8.1f} ms  {pkg}")
+    return {"module": module, "total_ms": round(total / 1000, 1),
+            "packages_ms": {p: round(s / 1000, 1) for p, s in pkgs}}
+
+
+def one_shot(question: str, config: str, repeat: int) -> dict:
+    code = ONE_SHOT.format(root=ROOT, config=config, question=question, heavy=HEAVY)
+    runs = []
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr[-2000:])
+        runs.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    med = {k: round(statistics.median(r[k] for r in runs), 1)
+           for k in ("import_ms", "runtime_ms", "first_answer_ms", "total_ms")}
+    last = runs[-1]
+    print(f"\n== Tek seferlik soru ({repeat}× medyan): {question!r} ==")
+    print(f"  import {med['import_ms']} ms + runtime {med['runtime_ms']} ms + ilk cevap {med['first_answer_ms']} ms"
+          f" = {med['total_ms']} ms")
+    print(f"  intent={last['intent']} use_rag={last['use_rag']} | yüklenen ağır modüller: {last['heavy_loaded'] or '-'}")
+    return {"question": question, **med, "use_rag": last["use_rag"], "heavy_loaded": last["heavy_loaded"]}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Startup / import-time report")
+    ap.add_argument("--config", default=os.path.join(ROOT, "config.yaml"))
+    ap.add_argument("--module", default="main", help="import ağacı incelenecek modül")
+    ap.add_argument("--question", default="Kaç kullanıcı var?")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--top", type=int, default=20)
+    ap.add_argument("--strict", action="store_true", help="RAG'siz soruda ağır modül yüklenirse çıkış kodu 1")
+    ap.add_argument("--out", default=None, help="sonuç JSON'u")
+    args = ap.parse_args()
+    config = os.path.abspath(args.config)
+
+    res = {"imports": report_imports(args.module, args.top), "one_shot": one_shot(args.question, config, args.repeat)}
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(res, f, ensure_ascii=False, indent=2)
+    if args.strict and not res["one_shot"]["use_rag"] and res["one_shot"]["heavy_loaded"]:
+        print(f"\n[!] RAG kullanılmadığı halde yüklendi: {res['one_shot']['heavy_loaded']}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# bench/check_repair.py — Onarım sayacının uçtan uca kontrolü (ağ/LLM yok)
+#
+# Kullanım (herhangi bir dizinden):
+#   python bench/check_repair.py
+#
+# Senaryolu bir LLM ile grafı çalıştırır:
+#   tek onarım → ilk SQL reddedilir (bilinmeyen kolon), ikincisi geçer:
+#                state.repair_attempts, iz kaydı (JSONL + OTLP özniteliği) ve
+#                analist_repair_iterations histogramı 1 göstermeli
+#   hep hatalı → runtime.max_repairs aşılınca GraphRecursionError yerine açıklamalı yanıt
+# Beklenen dışında bir sonuçta çıkış kodu 1.
+import json, os, shutil, sys, tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import yaml
+
+QUESTION = "Kullanıcıların adlarını ve yaşlarını listele"
+BAD = "SELECT nme, age FROM user"
+GOOD = "SELECT name, age FROM user"
+
+
+class ScriptedLLM:
+    """SQL üretici çağrılarına sırayla verilen SQL'leri (sonuncuyu tekrar ederek) döndürür."""
+
+    def __init__(self, sqls):
+        self.sqls = list(sqls)
+        self.calls = 0
+
+    def get_text(self, system: str, user: str, **kwargs) -> str:
+        if "SQL generator" in system:
+            sql = self.sqls[min(self.calls, len(self.sqls) - 1)]
+            self.calls += 1
+            return sql
+        if "SQL validator" in system:
+            return "OK"
+        return "Kısa Yanıt: kontrol"
+
+
+def _runtime(cfg, llm):
+    from runtime import AgentRuntime
+    return AgentRuntime(cfg, llm_service=llm)
+
+
+def main() -> int:
+    with open("config.yaml", "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f)
+    tmp = tempfile.mkdtemp(prefix="check_repair_")
+    cfg["tracing"] = {"enabled": True, "jsonl_path": os.path.join(tmp, "traces.jsonl"),
+                      "otel_path": os.path.join(tmp, "spans.otlp.jsonl"), "tracemalloc": False}
+    cfg["metrics"] = {"enabled": True}
+    cfg.setdefault("planner", {})["question_log"] = None
+    cfg.setdefault("templates", {})["enabled"] = False
+    cfg["rag"]["enabled"] = False
+
+    from utils.metrics import REPAIR_ITERATIONS, setup_metrics
+    from utils.tracing import get_tracer
+    setup_metrics(cfg, get_tracer(cfg))
+
+    failures = []
+    rt = _runtime(cfg, ScriptedLLM([BAD, GOOD]))
+    ans = rt.ask(QUESTION)
+    with open(cfg["tracing"]["jsonl_path"], "r", encoding="utf-8") as f:
+        rec = json.loads(f.readlines()[-1])
+    with open(cfg["tracing"]["otel_path"], "r", encoding="utf-8") as f:
+        otlp = json.loads(f.readlines()[-1])
+    attrs = {a["key"]: a["value"] for rs in otlp["resourceSpans"] for ss in rs["scopeSpans"]
+             for sp in ss["spans"] for a in sp.get("attributes", [])}
+    hist = next(v for _, v in REPAIR_ITERATIONS._values.items())
+    qvals = sum(1 for s in rec["spans"] if s["name"] == "qval")
+    got = {
+        "state.repair_attempts": ans.state.repair_attempts,
+        "trace.repair_attempts": rec["repair_attempts"],
+        "otlp analist.repair_attempts": next(iter(attrs.get("analist.repair_attempts", {}).values()), None),
+        "histogram sum": hist[1],
+        "qval spans - 1": qvals - 1,
+    }
+    print("tek onarım:")
+    for k, v in got.items():
+        print(f"  {k:<30} {v}")
+        if v is None or int(v) != 1:
+            failures.append(k)
+    if not ans.state.validated_sql:
+        failures.append("validated_sql")
+
+    max_repairs = cfg["runtime"]["max_repairs"]
+    rt = _runtime(cfg, ScriptedLLM([BAD]))
+    try:
+        ans = rt.ask(QUESTION)
+        print(f"hep hatalı: repair_attempts={ans.state.repair_attempts} (max_repairs={max_repairs})")
+        print(f"  {ans.state.answer_text}")
+        if ans.state.repair_attempts != max_repairs + 1 or "onarım denemeleri aşıldı" not in (ans.state.answer_text or ""):
+            failures.append("max_repairs")
+    except Exception as e:
+        print(f"hep hatalı: {type(e).__name__}: {e}")
+        failures.append("max_repairs")
+
+    shutil.rmtree(tmp, ignore_errors=True)
+    print("OK" if not failures else f"FAIL: {', '.join(failures)}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,344 @@
+# bench/scale_db.py — Analitik şema için sentetik veri büyütücü
+#
+# Kullanım (herhangi bir dizinden):
+#   python bench/scale_db.py --scale 10 100 1000        # data/app_x10.db, app_x100.db, app_x1000.db
+#   python bench/scale_db.py --scale 100 --src data/app.db --out /tmp/big.db --force
+#
+# Kaynak DB birebir kopyalanır (şema, indeksler, mevcut satırlar) ve üzerine sentetik satırlar
+# eklenir; tablolar/anahtarlar şemadan okunur (PRAGMA table_info / foreign_key_list / index_list):
+#   - boyut tabloları (dışa FK'sı yok, UNIQUE ad kolonu var: unit, llm_providers) sabit kalır
+#     (--scale-dims ile √ölçek kadar büyür)
+#   - varlık tabloları (user, chat_session) ölçek × satıra çıkar; FK'lar çarpık (Zipf benzeri)
+#     dağılımla mevcut + yeni ebeveynlerden seçilir
+#   - ilişki tabloları (PK'sı tamamen FK'lardan oluşan: message_into, use_llm_service) her yeni
+#     "sürücü" ebeveyn (ör. chat_session) için kaynaktaki fan-out dağılımından örneklenen sayıda
+#     satır alır (katılımcı/servis sayısı gerçekçi kalır)
+# Kolon değerleri: message_date → büyüyen trend + hafta içi/gün içi yoğunluk, age → iş gücü
+# yaşı (kesik normal), num_of_mess → log-normal (uzun kuyruk); diğerleri kaynaktaki
+# değerlerden örnekleme. Eklemeler tablo başına tek transaction içinde executemany ile yapılır;
+# ikincil indeksler yükleme sonrası yeniden kurulur ve ANALYZE çalıştırılır.
+import argparse, bisect, math, os, random, sqlite3, sys, time, uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BATCH = 20_000
+TS_FMT = "%Y-%m-%d %H:%M:%S"
+
+# Gün içi saat ağırlıkları (mesai saatlerinde tepe, gece düşük)
+HOUR_W = [0.2, 0.1, 0.1, 0.1, 0.1, 0.2, 0.4, 0.8, 1.5, 2.2, 2.6, 2.5, 1.6, 2.0, 2.4, 2.3, 2.0, 1.4, 0.9, 0.7, 0.6, 0.5, 0.4, 0.3]
+# Haftanın günü ağırlıkları (Pzt..Paz)
+WEEKDAY_W = [1.0, 1.05, 1.05, 1.0, 0.9, 0.35, 0.25]
+
+
+def _q(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+# --- Şema okuma ----------------------------------------------------------------
+class Table:
+    def __init__(self, conn: sqlite3.Connection, name: str):
+        self.name = name
+        info = conn.execute(f"PRAGMA table_info({_q(name)});").fetchall()
+        self.cols = [r[1] for r in info]
+        self.types = {r[1]: (r[2] or "").upper() for r in info}
+        self.defaults = {r[1]: r[4] for r in info}
+        self.pk = [r[1] for r in sorted(info, key=lambda r: r[5]) if r[5]]
+        self.fks = {r[3]: (r[2], r[4]) for r in conn.execute(f"PRAGMA foreign_key_list({_q(name)});")}
+        self.unique = set()
+        for idx in conn.execute(f"PRAGMA index_list({_q(name)});").fetchall():
+            if idx[2] and idx[3] == "u":
+                cols = [r[2] for r in conn.execute(f"PRAGMA index_info({_q(idx[1])});")]
+                if len(cols) == 1:
+                    self.unique.add(cols[0])
+        self.rows = conn.execute(f"SELECT COUNT(*) FROM {_q(name)};").fetchone()[0]
+        if self.pk and all(c in self.fks for c in self.pk) and len(self.pk) >= 2:
+            self.role = "assoc"
+        elif not self.fks and (self.unique - set(self.pk)):
+            self.role = "dim"
+        else:
+            self.role = "entity"
+
+    def __repr__(self):
+        return f"{self.name}({self.role}, {self.rows})"
+
+
+def _topo(tables: Dict[str, Table]) -> List[str]:
+    order, seen = [], set()
+
+    def visit(t):
+        if t in seen:
+            return
+        seen.add(t)
+        for parent, _ in tables[t].fks.values():
+            if parent in tables and parent != t:
+                visit(parent)
+        order.append(t)
+
+    for t in sorted(tables):
+        visit(t)
+    return order
+
+
+# --- Değer modelleri -------------------------------------------------------------
+def _values(conn, t: Table, col: str) -> List[Any]:
+    return [r[0] for r in conn.execute(f"SELECT {_q(col)} FROM {_q(t.name)} WHERE {_q(col)} IS NOT NULL;")]
+
+
+def _date_model(vals: List[str], rng: random.Random) -> Callable[[], str]:
+    """Kaynak tarih aralığında: zamanla artan hacim + hafta içi/gün içi yoğunluk."""
+    parsed = sorted(datetime.strptime(v[:19], TS_FMT) for v in vals)
+    d0, d1 = parsed[0].date(), parsed[-1].date()
+    days = [d0 + timedelta(days=i) for i in range((d1 - d0).days + 1)]
+    n = max(1, len(days) - 1)
+    cum_days = _cum([(1.0 + i / n) * WEEKDAY_W[d.weekday()] for i, d in enumerate(days)])
+    cum_hours = _cum(HOUR_W)
+
+    def gen():
+        d = days[_pick(cum_days, rng)]
+        h = _pick(cum_hours, rng)
+        return f"{d.isoformat()} {h:02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d}"
+    return gen
+
+
+def _age_model(vals: List[int], rng: random.Random) -> Callable[[], int]:
+    """İş gücü yaşı: N(38, 10), kaynaktaki [min, max] aralığına kesik."""
+    lo, hi = min(vals), max(vals)
+
+    def gen():
+        while True:
+            x = int(round(rng.gauss(38, 10)))
+            if lo <= x <= hi:
+                return x
+    return gen
+
+
+def _lognormal_model(vals: List[int], rng: random.Random, sigma: float = 0.8) -> Callable[[], int]:
+    """Uzun kuyruklu sayım: medyanı kaynakla aynı log-normal, alt sınır kaynak min'i (≥1)."""
+    med = sorted(vals)[len(vals) // 2] or 1
+    lo = max(1, min(vals))
+    mu = math.log(med)
+
+    def gen():
+        return max(lo, int(round(rng.lognormvariate(mu, sigma))))
+    return gen
+
+
+def _empirical(vals: List[Any], rng: random.Random) -> Callable[[], Any]:
+    return (lambda: rng.choice(vals)) if vals else (lambda: None)
+
+
+# Kolon adı → model (kaynak değerleriyle kurulur)
+COLUMN_MODELS: Dict[str, Callable[[List[Any], random.Random], Callable[[], Any]]] = {
+    "message_date": _date_model,
+    "age": _age_model,
+    "num_of_mess": _lognormal_model,
+}
+
+
+def _column_gen(conn, t: Table, col: str, rng: random.Random) -> Callable[[], Any]:
+    vals = _values(conn, t, col)
+    model = COLUMN_MODELS.get(col.lower())
+    if model and vals:
+        return model(vals, rng)
+    typ = t.types[col]
+    if ("DATE" in typ or "TIME" in typ) and t.defaults.get(col) is None and vals:
+        return _date_model(vals, rng)
+    return _empirical(vals, rng)
+
+
+def _cum(weights: List[float]) -> List[float]:
+    out, acc = [], 0.0
+    for w in weights:
+        acc += w
+        out.append(acc)
+    return out
+
+
+def _pick(cum: List[float], rng: random.Random) -> int:
+    return bisect.bisect_left(cum, rng.random() * cum[-1])
+
+
+class KeyPool:
+    """Ebeveyn anahtarları + Zipf benzeri seçim ağırlıkları (bazı birimler/kullanıcılar daha yoğun)."""
+
+    def __init__(self, keys: List[Any], skew: float, rng: random.Random):
+        self.keys = list(keys)
+        rng.shuffle(self.keys)
+        self.cum = _cum([1.0 / (i + 1) ** skew for i in range(len(self.keys))])
+        self.rng = rng
+
+    def pick(self) -> Any:
+        return self.keys[_pick(self.cum, self.rng)]
+
+
+# --- Büyütme ---------------------------------------------------------------------
+def _new_key(t: Table, col: str, rng: random.Random, counter: List[int]) -> Any:
+    if "INT" in t.types[col]:
+        counter[0] += 1
+        return counter[0]
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _insert(dst: sqlite3.Connection, t: Table, cols: List[str], rows) -> int:
+    sql = f"INSERT INTO {_q(t.name)} ({', '.join(map(_q, cols))}) VALUES ({', '.join('?' * len(cols))})"
+    n, batch = 0, []
+    for r in rows:
+        batch.append(r)
+        if len(batch) >= BATCH:
+            dst.executemany(sql, batch)
+            n += len(batch)
+            batch.clear()
+    if batch:
+        dst.executemany(sql, batch)
+        n += len(batch)
+    return n
+
+
+def scale(src_path: str, out_path: str, factor: int, seed: int = 42, skew: float = 0.7,
+          scale_dims: bool = False, force: bool = False, log=print) -> Dict[str, int]:
+    """src_path'in factor× büyütülmüş kopyasını out_path'e yazar; tablo → nihai satır sayısı döner."""
+    if factor < 1:
+        raise ValueError("factor >= 1 olmalı")
+    if os.path.exists(out_path):
+        if not force:
+            raise FileExistsError(f"{out_path} zaten var (--force ile üzerine yaz)")
+        os.remove(out_path)
+    rng = random.Random(seed)
+    t0 = time.perf_counter()
+
+    src = sqlite3.connect(f"file:{src_path}?mode=ro", uri=True)
+    dst = sqlite3.connect(out_path, isolation_level=None)
+    src.backup(dst)
+    dst.execute("PRAGMA journal_mode=OFF;")
+    dst.execute("PRAGMA synchronous=OFF;")
+    dst.execute("PRAGMA cache_size=-200000;")
+
+    names = [r[0] for r in src.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';")]
+    tables = {n: Table(src, n) for n in names}
+    log(f"[scale] {os.path.basename(src_path)} → {out_path} ×{factor}: {sorted(tables.values(), key=lambda t: t.name)}")
+
+    # İkincil indeksleri yükleme süresince kaldır
+    indexes = src.execute("SELECT name, sql FROM sqlite_master WHERE type='index' AND sql IS NOT NULL;").fetchall()
+    for name, _ in indexes:
+        dst.execute(f"DROP INDEX {_q(name)};")
+
+    keys: Dict[str, List[Any]] = {}
+    new_keys: Dict[str, List[Any]] = {}
+    for name in _topo(tables):
+        t = tables[name]
+        pkcol = t.pk[0] if len(t.pk) == 1 else None
+        if pkcol:
+            keys[name] = _values(src, t, pkcol)
+        if t.role == "dim":
+            target = int(round(t.rows * math.sqrt(factor))) if scale_dims else t.rows
+        else:
+            target = t.rows * factor
+        n_new = max(0, target - t.rows)
+        if n_new == 0 or t.rows == 0:
+            new_keys[name] = []
+            continue
+
+        gens = {c: _column_gen(src, t, c, rng) for c in t.cols if c not in t.fks and c not in t.pk}
+        pools = {c: KeyPool(keys[p], skew, rng) for c, (p, _) in t.fks.items() if keys.get(p)}
+        dst.execute("BEGIN;")
+        if t.role == "assoc":
+            n = _insert(dst, t, t.cols, _assoc_rows(src, t, tables, keys, new_keys, pools, gens, rng))
+        else:
+            counter = [max((k for k in keys.get(name, []) if isinstance(k, int)), default=0)]
+            fresh: List[Any] = []
+
+            def rows():
+                for i in range(n_new):
+                    r = []
+                    for c in t.cols:
+                        if c == pkcol and c not in t.fks:
+                            v = _new_key(t, c, rng, counter)
+                            fresh.append(v)
+                        elif c in pools:
+                            v = pools[c].pick()
+                        elif c in t.unique:
+                            v = f"{gens[c]()} #{i + 1}"
+                        else:
+                            v = gens[c]()
+                        r.append(v)
+                    yield r
+            n = _insert(dst, t, t.cols, rows())
+            new_keys[name] = fresh
+            if pkcol:
+                keys[name] = keys[name] + fresh
+        dst.execute("COMMIT;")
+        log(f"[scale]   {name:<16} +{n:>9,} satır")
+
+    for name, sql in indexes:
+        dst.execute(sql)
+    dst.execute("ANALYZE;")
+    counts = {n: dst.execute(f"SELECT COUNT(*) FROM {_q(n)};").fetchone()[0] for n in names}
+    bad = dst.execute("PRAGMA foreign_key_check;").fetchall()
+    dst.close()
+    src.close()
+    log(f"[scale] tamam: {counts} | {os.path.getsize(out_path) / 1e6:.1f} MB | {time.perf_counter() - t0:.1f} s"
+        + (f" | [!] {len(bad)} FK ihlali" if bad else ""))
+    return counts
+
+
+def _assoc_rows(src, t: Table, tables, keys, new_keys, pools, gens, rng):
+    """
+    İlişki tablosu: sürücü ebeveynin (en büyük varlık tablosu) her YENİ anahtarı için kaynaktaki
+    fan-out dağılımından (hiç satırı olmayanlar dahil) k örneklenir; diğer FK'lar çarpık
+    dağılımla, grup içinde tekrarsız seçilir.
+    """
+    fk_cols = [c for c in t.pk if c in t.fks]
+    entity_fks = [c for c in fk_cols if tables[t.fks[c][0]].role == "entity"]
+    driver = max(entity_fks or fk_cols, key=lambda c: tables[t.fks[c][0]].rows)
+    parent = t.fks[driver][0]
+    fan = Counter(r[0] for r in src.execute(
+        f"SELECT COUNT(*) FROM {_q(t.name)} GROUP BY {_q(driver)};"))
+    fan[0] += max(0, tables[parent].rows - sum(fan.values()))
+    ks = sorted(fan)
+    cum = _cum([fan[k] for k in ks])
+    others = [c for c in fk_cols if c != driver]
+    for dkey in new_keys.get(parent, []):
+        k = ks[_pick(cum, rng)]
+        seen = set()
+        for _ in range(k * 4):
+            if len(seen) >= k:
+                break
+            combo = tuple(pools[c].pick() for c in others)
+            if combo in seen:
+                continue
+            seen.add(combo)
+            vals = dict(zip(others, combo))
+            vals[driver] = dkey
+            yield [vals[c] if c in vals else gens[c]() for c in t.cols]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="FK-aware synthetic data scaler")
+    ap.add_argument("--src", default=os.path.join(ROOT, "data", "app.db"))
+    ap.add_argument("--scale", type=int, nargs="+", default=[10], help="ölçek çarpanları (ör. 10 100 1000)")
+    ap.add_argument("--out", default=None, help="çıktı yolu (tek ölçekte); varsayılan data/app_x<N>.db")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--skew", type=float, default=0.7, help="FK seçim çarpıklığı (0 → düzgün)")
+    ap.add_argument("--scale-dims", action="store_true", help="boyut tablolarını da √ölçek kadar büyüt")
+    ap.add_argument("--force", action="store_true", help="var olan çıktının üzerine yaz")
+    args = ap.parse_args()
+    if args.out and len(args.scale) > 1:
+        ap.error("--out yalnızca tek bir --scale ile kullanılabilir")
+    for f in args.scale:
+        out = args.out or scaled_path(args.src, f)
+        try:
+            scale(args.src, out, f, args.seed, args.skew, args.scale_dims, args.force)
+        except FileExistsError as e:
+            print(f"[scale] atlandı: {e}", file=sys.stderr)
+
+
+def scaled_path(src_path: str, factor: int) -> str:
+    base, ext = os.path.splitext(src_path)
+    return f"{base}_x{factor}{ext or '.db'}"
+
+
+if __name__ == "__main__":
+    main()
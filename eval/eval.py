@@ -1,32 +1,226 @@
-import json, subprocess
-
-EVAL_FILE = "/home/nagme/Desktop/analist-agent/data/eval_questions.jsonl"
-
-def run_eval():
-    total, correct = 0, 0
-    with open(EVAL_FILE, "r") as f:
-        for line in f:
-            sample = json.loads(line)
-            q = sample["question"]
-            exp_sql = sample["expected_sql"].strip().lower()
-
-            # pipeline'ı CLI ile çalıştır
-            result = subprocess.run(
-                ["python", "main.py", "-q", q],
-                capture_output=True, text=True
-            )
-
-            output = result.stdout.lower()
-            ok = exp_sql.split()[0] in output and "select" in output
-            total += 1
-            if ok:
-                correct += 1
-                status = "+"
-            else:
-                status = "-"
-            print(f"[{status}] {q}\n  Expected: {exp_sql}\n")
-
-    print(f"\nToplam {correct}/{total} doğru ({100*correct/total:.1f}%).")
+# eval/eval.py — Süreç içi değerlendirme koşucusu
+#
+# Kullanım (herhangi bir dizinden):
+#   python eval/eval.py                       # eval/eval_questions.jsonl, config.yaml
+#   python eval/eval.py --workers 4 --limit 10 --out logs/eval_run.jsonl
+#
+# Pipeline BİR KEZ kurulur (AgentRuntime: graf + DB havuzu + LLM istemcisi) ve sorular
+# süreç içinde, isteğe bağlı bir thread havuzuyla koşturulur (soru başına alt süreç yok).
+# Doğruluk, beklenen ve üretilen SQL'lerin AYNI veritabanında çalıştırılıp sonuç
+# kümelerinin karşılaştırılmasıyla ölçülür:
+#   - exact  : satırlar (sıra bağımsız çoklu küme, float'lar 4 haneye yuvarlanmış) birebir aynı
+#   - relaxed: yalnızca sayısal kolonlar karşılaştırılır (postprocess ID → ad çevirisi veya
+#              ek etiket kolonu nedeniyle metin kolonları farklı olabilir)
+import argparse, json, os, sys, time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import yaml
+
+# Karşılaştırma için çekilecek en fazla satır
+MAX_ROWS = 10_000
+
+
+def load_questions(path: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        samples = [json.loads(l) for l in f if l.strip()]
+    return samples[:limit] if limit else samples
+
+
+def _norm(v: Any) -> Any:
+    if isinstance(v, float):
+        v = round(v, 4)
+        return int(v) if v.is_integer() else v
+    return v
+
+
+def _row_key(row: Tuple) -> Tuple:
+    # Kolon adları/sırası farklı olabilir: hücreler tip+değer ile sıralanır
+    return tuple(sorted((_norm(v) for v in row), key=lambda x: (type(x).__name__, str(x))))
+
+
+def _numeric_key(row: Tuple) -> Tuple:
+    return tuple(sorted(_norm(v) for v in row if isinstance(v, (int, float)) and not isinstance(v, bool)))
+
+
+def fetch(conn, sql: str) -> Tuple[Optional[List[Tuple]], Optional[str]]:
+    """SQL'i çalıştırır → (satırlar, hata)."""
+    try:
+        cur = conn.execute(sql)
+        return [tuple(r) for r in cur.fetchmany(MAX_ROWS)], None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+def compare(expected: Optional[List[Tuple]], predicted: Optional[List[Tuple]]) -> Tuple[bool, bool]:
+    """(exact, relaxed) eşleşme."""
+    if expected is None or predicted is None:
+        return False, False
+    exact = Counter(map(_row_key, expected)) == Counter(map(_row_key, predicted))
+    relaxed = exact or (
+        len(expected) == len(predicted)
+        and any(_numeric_key(r) for r in expected)
+        and Counter(map(_numeric_key, expected)) == Counter(map(_numeric_key, predicted))
+    )
+    return exact, relaxed
+
+
+def evaluate_one(rt, sample: Dict[str, Any]) -> Dict[str, Any]:
+    """Tek soruyu çalıştırır; beklenen/üretilen SQL sonuçlarını karşılaştırır."""
+    q, exp_sql = sample["question"], sample["expected_sql"]
+    rec: Dict[str, Any] = {"id": sample.get("id"), "question": q, "expected_sql": exp_sql}
+    try:
+        res = rt.ask(q)
+    except Exception as e:
+        rec.update(predicted_sql=None, error=f"{type(e).__name__}: {e}", exact=False, relaxed=False,
+                   latency_ms=None, tokens_in=0, tokens_out=0)
+        return rec
+    st = res.state
+    pred_sql = st.validated_sql or (st.candidate_sql[-1] if st.candidate_sql else None)
+    with rt.connection() as conn:
+        expected, exp_err = fetch(conn, exp_sql)
+        predicted, pred_err = fetch(conn, pred_sql) if pred_sql else (None, "SQL üretilmedi")
+    exact, relaxed = compare(expected, predicted)
+    rec.update(
+        predicted_sql=pred_sql,
+        intent=st.intent,
+        template=(st.template_match or {}).get("name") if (st.template_match or {}).get("used") else None,
+        summary_path=st.summary_path,
+        exact=exact,
+        relaxed=relaxed,
+        expected_rows=None if expected is None else len(expected),
+        predicted_rows=None if predicted is None else len(predicted),
+        error=pred_err or (f"expected: {exp_err}" if exp_err else None),
+        latency_ms=round(res.ms, 1),
+        tokens_in=res.cost["input_tokens"],
+        tokens_out=res.cost["output_tokens"],
+        trace_id=st.trace_id,
+    )
+    return rec
+
+
+def _pct(xs: List[float], p: float) -> Optional[float]:
+    if not xs:
+        return None
+    xs = sorted(xs)
+    return round(xs[min(len(xs) - 1, int(round(p / 100 * (len(xs) - 1))))], 1)
+
+
+def summarize(results: List[Dict[str, Any]], wall_s: float) -> Dict[str, Any]:
+    n = len(results)
+    lat = [r["latency_ms"] for r in results if r.get("latency_ms") is not None]
+    return {
+        "n": n,
+        "exact": sum(r["exact"] for r in results),
+        "relaxed": sum(r["relaxed"] for r in results),
+        "exact_acc": round(sum(r["exact"] for r in results) / n, 3) if n else 0.0,
+        "relaxed_acc": round(sum(r["relaxed"] for r in results) / n, 3) if n else 0.0,
+        "p50_ms": _pct(lat, 50),
+        "p95_ms": _pct(lat, 95),
+        "tokens_in": sum(r["tokens_in"] for r in results),
+        "tokens_out": sum(r["tokens_out"] for r in results),
+        "wall_s": round(wall_s, 2),
+    }
+
+
+def run_eval(
+    questions_path: str,
+    cfg: Dict[str, Any],
+    workers: int = 1,
+    limit: Optional[int] = None,
+    out_path: Optional[str] = None,
+    llm_service=None,
+    on_result=None,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Soruları paylaşılan runtime üzerinde koşturur.
+    Döndürür: (soru başına kayıtlar [girdi sırasıyla], özet)
+    """
+    from runtime import AgentRuntime
+
+    samples = load_questions(questions_path, limit)
+    rt = AgentRuntime(cfg, llm_service=llm_service, pool_size=max(workers, cfg["db"].get("pool_size", 4)))
+    t0 = time.perf_counter()
+    try:
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="eval") as ex:
+                results = []
+                for rec in ex.map(lambda s: evaluate_one(rt, s), samples):
+                    results.append(rec)
+                    if on_result:
+                        on_result(rec)
+        else:
+            results = []
+            for s in samples:
+                rec = evaluate_one(rt, s)
+                results.append(rec)
+                if on_result:
+                    on_result(rec)
+    finally:
+        rt.close()
+    summary = summarize(results, time.perf_counter() - t0)
+    if out_path:
+        os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+        with open(out_path, "w", encoding="utf-8") as f:
+            for r in results:
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+            f.write(json.dumps({"summary": summary}, ensure_ascii=False) + "\n")
+    return results, summary
+
+
+def load_config(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f)
+
+
+def build_arg_parser(description: str) -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(description=description)
+    ap.add_argument("--questions", default=os.path.join(ROOT, "eval", "eval_questions.jsonl"))
+    ap.add_argument("--config", default=os.path.join(ROOT, "config.yaml"))
+    ap.add_argument("--workers", type=int, default=1, help="eşzamanlı soru sayısı (thread)")
+    ap.add_argument("--limit", type=int, default=None, help="ilk N soruyu koştur")
+    ap.add_argument("--out", default=None, help="soru başına sonuçların yazılacağı JSONL")
+    return ap
+
+
+def prepare(args) -> Dict[str, Any]:
+    """Yolları mutlaklaştırır ve config'teki göreli yolların (DB, RAG, log) çözülmesi için repo köküne geçer."""
+    for name in ("questions", "config", "out"):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+    cfg = load_config(args.config)
+    os.chdir(ROOT)
+    from utils.logging import setup_logging_from_config
+    setup_logging_from_config({**cfg, "logging": {**(cfg.get("logging") or {}), "console": False}})
+    return cfg
+
+
+def main():
+    args = build_arg_parser("Analist agent — süreç içi eval").parse_args()
+    cfg = prepare(args)
+
+    def show(r):
+        mark = "+" if r["exact"] else ("~" if r["relaxed"] else "-")
+        lat = f"{r['latency_ms']:.0f} ms" if r.get("latency_ms") is not None else "-"
+        print(f"[{mark}] #{r['id']} {r['question']}  ({lat}, tok {r['tokens_in']}/{r['tokens_out']})")
+        if not r["relaxed"]:
+            print(f"    Expected : {r['expected_sql']}")
+            print(f"    Predicted: {r.get('predicted_sql') or 'N/A'}")
+            if r.get("error"):
+                print(f"    Hata     : {r['error']}")
+
+    _, s = run_eval(args.questions, cfg, args.workers, args.limit, args.out, on_result=show)
+    print(
+        f"\nToplam {s['exact']}/{s['n']} birebir ({100 * s['exact_acc']:.1f}%), "
+        f"{s['relaxed']}/{s['n']} gevşek ({100 * s['relaxed_acc']:.1f}%) | "
+        f"p50={s['p50_ms']} ms p95={s['p95_ms']} ms | tokens in={s['tokens_in']} out={s['tokens_out']} | "
+        f"{s['wall_s']} s"
+    )
+
 
 if __name__ == "__main__":
-    run_eval()
+    main()
@@ -1,8 +1,17 @@
-import json, subprocess
+# eval/eval_report.py — Eval sonuçlarını tablo + metrik raporu olarak yazar
+#
+# Kullanım:
+#   python eval/eval_report.py --workers 4 --report eval/eval_report.csv
+#
+# Soruları eval.py'deki süreç içi koşucu ile çalıştırır (alt süreç / stdout ayrıştırma yok);
+# doğruluk sonuç kümesi karşılaştırmasına dayanır.
+import os
 from tabulate import tabulate
 
-EVAL_FILE = "data/eval_questions.jsonl"
-REPORT_FILE = "eval_report.csv"
+from eval import ROOT, build_arg_parser, prepare, run_eval
+
+REPORT_FILE = os.path.join(ROOT, "eval", "eval_report.csv")
+
 
 def classify_error(expected, predicted):
     if not predicted:
@@ -17,53 +26,59 @@ def classify_error(expected, predicted):
         return "Aggregation Error"
     return "Other/Wrong"
 
-def run_eval():
+
+def _error_type(r):
+    if r["relaxed"]:
+        return "-"
+    err = r.get("error") or ""
+    if r.get("predicted_sql") and err and not err.startswith("expected:"):
+        return "Execution Error"
+    return classify_error(r["expected_sql"], r.get("predicted_sql") or "")
+
+
+def main():
+    ap = build_arg_parser("Analist agent — eval raporu")
+    ap.add_argument("--report", default=REPORT_FILE, help="rapor dosyası")
+    args = ap.parse_args()
+    args.report = os.path.abspath(args.report)
+    cfg = prepare(args)
+
+    results, s = run_eval(args.questions, cfg, args.workers, args.limit, args.out)
+
     rows = []
-    y_true, y_pred = [], []
-
-    with open(EVAL_FILE, "r") as f:
-        for line in f:
-            sample = json.loads(line)
-            q, exp_sql = sample["question"], sample["expected_sql"].lower()
-
-            result = subprocess.run(
-                ["python", "main.py", "-q", q],
-                capture_output=True, text=True
-            )
-            out = result.stdout.lower()
-
-            pred_sql = None
-            if "select" in out:
-                pred_sql = "select " + out.split("select", 1)[1].split("\n", 1)[0]
-
-            ok = pred_sql and exp_sql.split()[0] in pred_sql
-            y_true.append(1)
-            y_pred.append(1 if ok else 0)
-
-            status = "+" if ok else "-"
-            error_type = "-" if ok else classify_error(exp_sql, pred_sql or "")
-            rows.append([sample["id"], q, exp_sql[:45]+"...", (pred_sql or "N/A")[:45]+"...", status, error_type])
-
-    # metrikler
-    total = len(y_true)
-    correct = sum(y_pred)
+    for r in results:
+        status = "+" if r["exact"] else ("~" if r["relaxed"] else "-")
+        rows.append([
+            r["id"], r["question"],
+            r["expected_sql"][:45] + "...", (r.get("predicted_sql") or "N/A")[:45] + "...",
+            status, _error_type(r),
+            r["latency_ms"] if r.get("latency_ms") is not None else "-",
+            f"{r['tokens_in']}/{r['tokens_out']}",
+        ])
+
+    # Her soru için "doğru" etiket beklenir; tahmin = sonuç kümesi eşleşmesi (gevşek)
+    total, correct = s["n"], s["relaxed"]
     accuracy = correct / total if total else 0.0
-    precision = correct / (sum(y_pred) if sum(y_pred) > 0 else 1)
-    recall = correct / (sum(y_true) if sum(y_true) > 0 else 1)
-    f1 = 2 * precision * recall / (precision + recall) if (precision+recall) > 0 else 0.0
+    precision = correct / (correct if correct > 0 else 1)
+    recall = correct / (total if total > 0 else 1)
+    f1 = 2 * precision * recall / (precision + recall) if (precision + recall) > 0 else 0.0
 
     metrics_text = f"""
 Evaluation Metrics:
-- Accuracy : {accuracy:.2f}
-- Precision: {precision:.2f}
-- Recall   : {recall:.2f}
-- F1 Score : {f1:.2f}
+- Exact match   : {s['exact_acc']:.2f}
+- Accuracy      : {accuracy:.2f}
+- Precision     : {precision:.2f}
+- Recall        : {recall:.2f}
+- F1 Score      : {f1:.2f}
+- Latency p50/95: {s['p50_ms']} / {s['p95_ms']} ms
+- Tokens in/out : {s['tokens_in']} / {s['tokens_out']}
+- Wall time     : {s['wall_s']} s
 """
 
     table_text = tabulate(
         rows,
-        headers=["ID","Question","Expected","Predicted","Result","Error Type"],
-        tablefmt="github"
+        headers=["ID", "Question", "Expected", "Predicted", "Result", "Error Type", "ms", "Tokens"],
+        tablefmt="github",
     )
 
     full_report = table_text + "\n" + metrics_text
@@ -72,10 +87,11 @@ Evaluation Metrics:
     print(full_report)
 
     # dosyaya yaz
-    with open(REPORT_FILE, "w") as f:
+    with open(args.report, "w") as f:
         f.write(full_report)
 
-    print(f"\n[i] Rapor kaydedildi: {REPORT_FILE}")
+    print(f"\n[i] Rapor kaydedildi: {args.report}")
+
 
 if __name__ == "__main__":
-    run_eval()
+    main()
@@ -2,42 +2,73 @@ from langgraph.graph import StateGraph, START, END
 # from utils import llm  # (Kullanılmıyor; istersen tekrar aç)
 from utils.types import AgentState
 from utils.cost import CostTracker
+from tools.intent import load_classifier
+from utils.tracing import get_tracer
 
 from nodes import (
     planner,
     schema_retriever,
+    template_matcher,
     query_generator,
     query_validator,
     sql_executor,
     postprocessor,
     summarizer,
     guardian,
+    value_linker,
 )
 
-def build_graph(conn, cfg, cost: CostTracker, llm_service):
+def _rt(config, key, default):
+    # İstek başına bağımlılıklar LangGraph config["configurable"] ile gelir (cost, conn, show_sql, rag_enabled)
+    return ((config or {}).get("configurable") or {}).get(key, default)
+
+
+def build_graph(conn, cfg, cost: CostTracker | None = None, llm_service=None):
+    """
+    Grafı BİR KEZ derler; istek başına değişenler invoke config'inden okunur:
+        graph.invoke(state, config={"configurable": {"cost": CostTracker(), "conn": conn2,
+                                                    "show_sql": True, "rag_enabled": False}})
+    Verilmeyenler için build_graph argümanları / cfg varsayılanları kullanılır.
+    """
     # LangGraph grafını AgentState durum tipi ile başlat
     g = StateGraph(AgentState)
 
+    # Her düğüm tracer ile sarılır (süre/CPU/bellek/LLM/SQLite adımı/cache; trace_id bazında)
+    tracer = get_tracer(cfg)
+
+    def add_node(name, fn):
+        g.add_node(name, tracer.wrap(name, fn) if tracer else fn)
+
     # --- Nodes (düğümler) ---
-    # planner: intent sınıflandırma + varsayılan RAG kullanım bayrağı
-    g.add_node("planner", lambda s: planner.run(s, rag_enabled_default=cfg["rag"]["enabled"]))
+    # planner: intent sınıflandırma + RAG/critic kararı (yerel model varsa onunla, yoksa kurallarla)
+    planner_cfg = cfg.get("planner", {})
+    intent_clf = load_classifier(planner_cfg.get("model_path"))
+    add_node(
+        "planner",
+        lambda s, config: planner.run(
+            s,
+            rag_enabled_default=_rt(config, "rag_enabled", cfg["rag"]["enabled"]),
+            classifier=intent_clf,
+            min_confidence=planner_cfg.get("min_confidence", 0.75),
+        ),
+    )
 
     # schema: DB şemasını/metadata'yı çekip state'e yazar (örn. s.schema_doc)
-    g.add_node("schema", lambda s: schema_retriever.run(conn, s))
+    add_node("schema", lambda s, config: schema_retriever.run(_rt(config, "conn", conn), s))
 
     # RAG node (basit, schema_doc'tan in-memory indeks kurar)
-    from tools.rag import SimpleRAG
-    rag_engine = None  # lazy init: ilk ihtiyaçta kurulur
+    rag_engine = None  # lazy init: ilk ihtiyaçta kurulur (süreç genelinde paylaşılan indeks; warm-up önceden kurabilir)
 
-    def rag_node(s: AgentState):
+    def rag_node(s: AgentState, config=None):
         nonlocal rag_engine
         # Kullanıcı/Planner RAG'i kapattıysa direkt geç
         if not s.use_rag:
             return s
         # İlk kez ihtiyaç varsa ve schema_doc hazırsa belge listesi kur
         if rag_engine is None and getattr(s, "schema_doc", None):
-            docs = s.schema_doc.splitlines()
-            rag_engine = SimpleRAG(docs)
+            # sklearn/sentence_transformers yalnızca RAG ilk kez gerektiğinde yüklenir
+            from tools.rag import shared_rag
+            rag_engine = shared_rag(s.schema_doc.splitlines(), ivf=cfg["rag"].get("ivf"))
         # RAG motoru varsa query çalıştır
         if rag_engine:
             res = rag_engine.query(
@@ -49,14 +80,34 @@ def build_graph(conn, cfg, cost: CostTracker, llm_service):
             s.rag_snippets = [d for _, d in res]
         return s
 
-    g.add_node("rag", rag_node)
+    add_node("rag", rag_node)
+
+    # values: sorudaki değerleri FTS5 değer indeksiyle tam literallere eşle (qgen prompt ipucu)
+    from tools.values import value_config
+    value_cfg = value_config(cfg)
+    if value_cfg["enabled"]:
+        add_node("values", lambda s, config: value_linker.run(_rt(config, "conn", conn), s, value_cfg))
+
+    # tmpl: sık soru kalıpları için LLM'siz deterministik SQL (güven eşiği altında LLM yoluna düşer)
+    tmpl_cfg = cfg.get("templates", {})
+    use_templates = tmpl_cfg.get("enabled", True)
+    if use_templates:
+        add_node(
+            "tmpl",
+            lambda s, config: template_matcher.run(
+                _rt(config, "conn", conn),
+                s,
+                max_limit=cfg["security"]["max_limit"],
+                min_confidence=tmpl_cfg.get("min_confidence", 0.8),
+            ),
+        )
 
     # qgen: LLM ile yalnızca SELECT odaklı SQL üretimi
-    g.add_node(
+    add_node(
         "qgen",
-        lambda s: query_generator.run(
+        lambda s, config: query_generator.run(
             s,
-            cost,
+            _rt(config, "cost", cost),
             llm_service,
             max_limit=cfg["security"]["max_limit"],
         ),
@@ -72,31 +123,49 @@ def build_graph(conn, cfg, cost: CostTracker, llm_service):
         "use_llm_service",
     ]
 
-    g.add_node(
+    # qval: doğrulama + onarım sayacı (sayaç düğümde artar; koşullu kenar fonksiyonundaki
+    # state değişiklikleri LangGraph'ta kalıcı olmaz)
+    add_node(
         "qval",
-        lambda s: query_validator.run(
-            conn,
-            s,
-            banned_keywords=cfg["security"]["banned_keywords"],
-            enforce_select_only=True,
-            allow_multiple=False,
-            max_limit=cfg["security"]["max_limit"],
-            llm_service=llm_service,
-            cost=cost,
-            allowed_tables=ALLOWED_TABLES,
+        lambda s, config: query_validator.count_repair(
+            query_validator.run(
+                _rt(config, "conn", conn),
+                s,
+                banned_keywords=cfg["security"]["banned_keywords"],
+                enforce_select_only=True,
+                allow_multiple=False,
+                max_limit=cfg["security"]["max_limit"],
+                llm_service=llm_service,
+                cost=_rt(config, "cost", cost),
+                allowed_tables=ALLOWED_TABLES,
+            ),
+            cfg["runtime"]["max_repairs"],
         ),
     )
 
-    # exec: güvenli yürütme (parametreli, timeout/progress)
-    g.add_node("exec", lambda s: sql_executor.run(conn, s))
+    # exec: güvenli yürütme (parametreli, timeout/progress); desteklenen agregatlar rollup'tan okunur
+    from tools.rollups import rollup_config
+    rollup_cfg = rollup_config(cfg)
+    add_node("exec", lambda s, config: sql_executor.run(_rt(config, "conn", conn), s, rollup_cfg=rollup_cfg))
     # post: tip/format/locale düzeltmeleri
-    g.add_node("post", lambda s: postprocessor.run(s, conn))
+    add_node("post", lambda s, config: postprocessor.run(s, _rt(config, "conn", conn)))
     # sum: nihai kısa analist özeti + opsiyonel SQL
-    g.add_node("sum", lambda s: summarizer.run(s, cost, cfg["runtime"]["show_sql_in_answer"], llm_service))
+    sum_cfg = cfg.get("summarizer", {})
+    add_node(
+        "sum",
+        lambda s, config: summarizer.run(
+            s,
+            _rt(config, "cost", cost),
+            _rt(config, "show_sql", cfg["runtime"]["show_sql_in_answer"]),
+            llm_service,
+            excerpt_format=sum_cfg.get("excerpt_format", "auto"),
+            excerpt_budget_tokens=sum_cfg.get("excerpt_budget_tokens", 1200),
+        ),
+    )
     # guard: nihai güvenlik/PII/satır sayısı vb. kontrol
-    g.add_node("guard", lambda s: guardian.run(s))
-    # telemetry: burada sadece state'i ileri taşır (telemetry sink dışarıda)
-    g.add_node("telemetry", lambda s: s)
+    add_node("guard", lambda s, config: guardian.run(s))
+    # telemetry: izi kapatıp JSONL/OTLP dosyalarına yazar (tracing kapalıysa state'i aynen geçirir)
+    g.add_node("telemetry", tracer.finish if tracer else (lambda s: s))
 
     # --- Edges (kenarlar/akış) ---
     g.add_edge(START, "planner")
@@ -106,34 +175,39 @@ def build_graph(conn, cfg, cost: CostTracker, llm_service):
         if s.intent == "non_sql":
             if not getattr(s, "answer_text", None):
                 s.answer_text = "Bu soru veritabanıyla ilgili değil."
-            return "end"  # END'e koşullu dal
+            return "end"  # telemetry üzerinden END'e koşullu dal
         return "schema"   # sql_query → schema
 
-    # Koşullu kenarlar: "end" sembolik dalını gerçek END'e map et
-    g.add_conditional_edges("planner", after_planner, {"schema": "schema", "end": END})
+    # Koşullu kenarlar: "end" sembolik dalı telemetry'ye gider (iz non_sql yanıtta da kapanır)
+    g.add_conditional_edges("planner", after_planner, {"schema": "schema", "end": "telemetry"})
+
+    # Şema → [Şablon →] RAG → QGen → QVal hattı; şablon tuttuysa doğrudan QVal
+    if use_templates:
+        g.add_edge("schema", "tmpl")
 
-    # Şema → RAG → QGen → QVal hattı
-    g.add_edge("schema", "rag")
-    g.add_edge("rag", "qgen")
+        def after_tmpl(s: AgentState) -> str:
+            return "qval" if (s.template_match or {}).get("used") else "rag"
+
+        g.add_conditional_edges("tmpl", after_tmpl, {"qval": "qval", "rag": "rag"})
+    else:
+        g.add_edge("schema", "rag")
+    if value_cfg["enabled"]:
+        g.add_edge("rag", "values")
+        g.add_edge("values", "qgen")
+    else:
+        g.add_edge("rag", "qgen")
     g.add_edge("qgen", "qval")
 
-    # qval sonrası: geçer/onar/özet
+    # qval sonrası: geçer/onar/vazgeç
     def is_valid(s: AgentState) -> str:
-        vr = s.validation_report or {}
-        if vr.get("ok"):
+        if (s.validation_report or {}).get("ok"):
             return "exec"  # doğrulama geçti → çalıştır
-        # geçmediyse onarım denemesi sayacını artır
-        s.repair_attempts = getattr(s, "repair_attempts", 0) + 1
         if s.repair_attempts > cfg["runtime"]["max_repairs"]:
-            # onarım sınırı aşıldıysa kısa açıklama ile özet düğümüne git
-            s.answer_text = (
-                f"SQL doğrulaması başarısız oldu: {vr.get('reason', 'bilinmeyen')} "
-                f"(onarım denemeleri aşıldı)."
-            )
-            return "sum"
+            # onarım sınırı aşıldı: açıklama qval'de answer_text'e yazıldı; özetleyici onu ezmesin
+            return "fail"
         return "qgen"  # tekrar üret (onarım döngüsü)
 
-    g.add_conditional_edges("qval", is_valid, {"exec": "exec", "qgen": "qgen", "sum": "sum"})
+    g.add_conditional_edges("qval", is_valid, {"exec": "exec", "qgen": "qgen", "fail": "guard"})
 
     # Yürütme sonrası ardışık akış
     g.add_edge("exec", "post")
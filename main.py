@@ -1,11 +1,11 @@
 # main.py — Uygulama giriş noktası: CLI/REPL, konfig yükleme, LLM/DB başlatma, graf çalıştırma
-import argparse, yaml, logging, sys, time
-from utils.logging import setup_logging          # JSON log/format kurulumunu yapan yardımcı
+import argparse, yaml, logging, sys, json, os
+from utils.logging import setup_logging_from_config  # Kuyruk tabanlı JSON-lines log kurulumu
 from utils.types import AgentState               # Grafın durum/State tipini taşıyan sınıf (pydantic/dataclass)
-from utils.cost import CostTracker               # LLM token maliyetlerini ölçen sayaç
-from tools.db import connect_readonly            # SQLite'a read-only ve timeout/progress ile bağlan
-from graph import build_graph                    # LangGraph düğümlerini bağlayan derleyici
-from utils.llm import LLMService                 # OpenAI-compatible LLM istemcisi
+from runtime import AgentRuntime                 # Config + DB havuzu + LLM + bir kez derlenmiş graf
+from utils.tracing import get_tracer             # Düğüm bazlı span'ler (JSONL/OTLP)
+from utils.metrics import REGISTRY, setup_metrics  # Prometheus metin formatlı metrikler
+from warmup import warm_up, warmup_config        # Başlangıç ısınması (katalog, RAG, DB sayfaları, LLM)
 
 # Kullanıcıya REPL modunda görünen kısa yardım/komutlar
 BANNER = """
@@ -14,49 +14,63 @@ Komutlar:
   :q, :quit, :exit   -> çıkış
   :sql               -> özetlerde SQL göster/gizle toggle
   :rag               -> RAG açık/kapalı toggle (sadece bu oturum için)
+  :metrics           -> süreç metriklerini (Prometheus metin formatı) yazdır
 """
 
-def run_once(question: str, cfg, conn, llm, show_sql_override=None, rag_override=None):
+def _log_question(cfg, st: AgentState):
+    """Planner kararlarını JSONL'e ekler (intent modelinin yeniden eğitimi için)."""
+    path = cfg.get("planner", {}).get("question_log")
+    if not path:
+        return
+    rec = {
+        "question": st.question,
+        "intent": st.intent,
+        "use_rag": st.use_rag,
+        "use_critic": st.use_critic,
+        "p_sql": st.intent_confidence,
+        "sql": st.validated_sql,
+        "ok": bool((st.execution_stats or {}).get("ok")),
+        "template": (st.template_match or {}).get("name") if (st.template_match or {}).get("used") else None,
+        "summary_path": st.summary_path,
+    }
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    except OSError as e:
+        logging.getLogger("analist_agent").warning("Soru logu yazılamadı: %s", e)
+
+def _dump_metrics(cfg):
+    """metrics.dump_path verildiyse metrikleri dosyaya (textfile collector formatında) yazar."""
+    mc = cfg.get("metrics", {})
+    if mc.get("enabled") and mc.get("dump_path"):
+        try:
+            REGISTRY.dump(mc["dump_path"])
+        except OSError as e:
+            logging.getLogger("analist_agent").warning("Metrik dosyası yazılamadı: %s", e)
+
+def run_once(rt: AgentRuntime, question: str, show_sql_override=None, rag_override=None):
     """
     Tek bir kullanıcı sorusunu uçtan uca işler:
-      - CostTracker başlatır (token/maliyet ölçümü)
-      - Opsiyonel oturumluk override'ları uygular (SQL gösterimi, RAG)
-      - Başlangıç AgentState oluşturur
-      - Grafı build_graph ile derler ve invoke eder
+      - Paylaşılan runtime üzerinden (graf/DB havuzu/LLM bir kez kurulu) soruyu çalıştırır
+      - Opsiyonel oturumluk override'ları (SQL gösterimi, RAG) istek config'i ile geçirir;
+        paylaşılan cfg'ye dokunulmaz
       - Toplam süre ve maliyeti loglar; cevabı stdout'a yazar
-      - Geçici override'ları eski haline çevirir
     """
-    # Her soru çağrısında yeni bir maliyet sayacı (input/output token ve $) başlat
-    cost = CostTracker(cfg["llm"]["price_per_1k_input"], cfg["llm"]["price_per_1k_output"])
-
-    # --- Oturuma özel geçici override'lar: config'i RAM'de anlık değiştir ---
-    if show_sql_override is not None:
-        cfg_rt_show = cfg["runtime"]["show_sql_in_answer"]  # eski değeri sakla (geri almak için)
-        cfg["runtime"]["show_sql_in_answer"] = show_sql_override
-    if rag_override is not None:
-        cfg_rag = cfg["rag"]["enabled"]                     # eski değeri sakla (geri almak için)
-        cfg["rag"]["enabled"] = rag_override
-
-    # Başlangıç durumunu yalnızca kullanıcı sorusuyla oluştur (diğer alanlar düğümlerce doldurulur)
-    state = AgentState(question=question)
-    # Grafı DB bağlantısı, config, cost tracker ve LLM servisi ile derle (bağımlılık enjeksiyonu)
-    graph = build_graph(conn, cfg, cost, llm)
-
-    # --- Çalıştır ve süreyi ölç ---
-    t0 = time.time()
-    out = graph.invoke(
-        state,
-        config={"recursion_limit": cfg["runtime"].get("recursion_limit", 50)}  # LangGraph derinlik koruması (sonsuz döngüleri engeller)
-    )
-    # Çıktıyı Type/State'e dök (tip/doğrulama için; eksik/yanlış alanlar erken yakalanır)
-    final_state = AgentState(**out)
-    dt = time.time() - t0
+    cfg = rt.cfg
+    # Çalıştır: her istek kendi CostTracker'ı ve havuzdan aldığı bağlantıyla koşar
+    res = rt.ask(question, show_sql=show_sql_override, rag_enabled=rag_override)
+    final_state = res.state
+
+    _log_question(cfg, final_state)
+    _dump_metrics(cfg)
 
     # Maliyet özetini al ve bilgi logu bas (logger adı: analist_agent)
-    final_cost = cost.to_dict()
+    final_cost = res.cost
     logging.getLogger("analist_agent").info(
-        "Süre=%.1f ms | Tokens in=%d out=%d | Cost=%s %s",
-        dt*1000, final_cost["input_tokens"], final_cost["output_tokens"],
+        "[%s] Süre=%.1f ms | Tokens in=%d out=%d | Cost=%s %s",
+        final_state.trace_id, res.ms,
+        final_cost["input_tokens"], final_cost["output_tokens"],
         final_cost["usd"], cfg["llm"]["currency"]
     )
 
@@ -65,52 +79,69 @@ def run_once(question: str, cfg, conn, llm, show_sql_override=None, rag_override
     print(final_state.answer_text or "(cevap yok)")
     print("=========================================\n")
 
-    # --- Override'ları geri al: config'i eski haline döndür ---
-    if show_sql_override is not None:
-        cfg["runtime"]["show_sql_in_answer"] = cfg_rt_show
-    if rag_override is not None:
-        cfg["rag"]["enabled"] = cfg_rag
-
 def main():
     """CLI akışı: argümanları al, log+config yükle, LLM ve DB başlat, tek seferlik veya REPL çalıştır."""
     # Basit CLI: config yolu ve tek seferlik soru opsiyonu
     parser = argparse.ArgumentParser(description="Analist AI Ajanı (Interactive)")
     parser.add_argument("--config", default="config.yaml")
     parser.add_argument("--question", "-q", help="Tek seferlik soru (REPL yerine)")
+    # Toplu mod: JSONL sorular → JSONL cevaplar (paralel, kaldığı yerden devam eder; bkz. batch.py)
+    parser.add_argument("--batch", metavar="IN.jsonl", help="Toplu soru dosyası ({\"id\", \"question\"} satırları)")
+    parser.add_argument("--out", metavar="OUT.jsonl", help="Toplu mod çıktı dosyası (sonuçlar bittikçe eklenir)")
+    parser.add_argument("--workers", type=int, default=4, help="Toplu modda paralel soru sayısı")
+    parser.add_argument("--llm-concurrency", type=int, default=None,
+                        help="Toplu modda aynı anda en fazla LLM çağrısı (varsayılan: llm.max_concurrency, yoksa workers)")
+    parser.add_argument("--no-warmup", action="store_true", help="Başlangıç ısınmasını atla (warmup.enabled'ı ezer)")
     args = parser.parse_args()
-
-    # Log altyapısını kur ve başlangıç logu at (JSON format, seviyeler, handler'lar)
-    logger = setup_logging()
-    logger.info("Uygulama başlıyor…")
+    if args.batch and not args.out:
+        parser.error("--batch için --out gerekli")
 
     # YAML config'i yükle (safe_load: güvenli YAML parse)
     with open(args.config, "r") as f:
         cfg = yaml.safe_load(f)
 
-    # LLM servisini OpenAI-compatible parametrelerle hazırla (vLLM/Ollama/LM Studio gibi)
-    llm = LLMService(
-        model_name=cfg["llm"]["model_name"],
-        max_tokens=cfg["llm"]["max_tokens"],
-        temperature=cfg["llm"]["temperature"],
-        base_url=cfg["llm"]["base_url"],
-        api_key=cfg["llm"]["api_key"],
-    )
+    # Log altyapısını kur ve başlangıç logu at (QueueHandler → JSON lines + konsol, döndürmeli dosya)
+    logger = setup_logging_from_config(cfg)
+    logger.info("Uygulama başlıyor…")
 
-    # SQLite'a read-only, timeout ve progress handler limitiyle bağlan
+    # Metrik kaydı: biten izler metriklere işlenir; port verildiyse /metrics uç noktası açılır
+    setup_metrics(cfg, get_tracer(cfg))
+
+    # Paylaşılan runtime: LLM istemcisi (OpenAI-compatible), read-only DB havuzu
+    # (timeout/progress handler'lı) ve bir kez derlenen graf
+    if args.batch:
+        # LLM eşzamanlılığı sınırlı; DB havuzu her worker'a bir bağlantı verecek boyutta
+        cfg["llm"]["max_concurrency"] = args.llm_concurrency or cfg["llm"].get("max_concurrency") or args.workers
     try:
-        conn = connect_readonly(
-            cfg["db"]["path"],
-            timeout_ms=cfg["db"]["timeout_ms"],
-            max_instructions=cfg["db"]["max_instructions"]
-        )
+        rt = AgentRuntime(cfg, pool_size=args.workers if args.batch else None)
     except Exception as e:
-        # Bağlantı hatası olursa exception logla ve süreçten çık
-        logger.exception("DB bağlantı hatası: %s", e)
+        # Kurulum hatası olursa exception logla ve süreçten çık
+        logger.exception("Başlatma hatası: %s", e)
         sys.exit(1)
 
+    # Isınma: REPL ve toplu modda ilk soru soğuk başlangıç maliyeti ödemesin
+    # (tek seferlik -q'da ısınma yalnızca aynı maliyeti öne taşır, atlanır)
+    if not args.question and not args.no_warmup and warmup_config(cfg)["enabled"]:
+        warm_up(rt)
+    logger.info("Hazır.")
+
+    # --- Toplu mod: soruları paralel çalıştır, özet yazdır ve çık ---
+    if args.batch:
+        from batch import print_summary, run_batch
+        try:
+            summary = run_batch(rt, args.batch, args.out, workers=args.workers)
+        except KeyboardInterrupt:
+            print("\nKesildi; aynı komutla kaldığı yerden devam edebilirsiniz.")
+            sys.exit(130)
+        finally:
+            _dump_metrics(cfg)
+            rt.close()
+        print_summary(summary, cfg["llm"]["currency"])
+        return
+
     # --- Tek seferlik mod: -q verildiyse REPL açmadan çalıştır ve çık ---
     if args.question:
-        run_once(args.question, cfg, conn, llm)
+        run_once(rt, args.question)
         return
 
     # --- REPL modu: kullanıcıdan sürekli soru al ---
@@ -135,6 +166,9 @@ def main():
             show_sql_override = (not (show_sql_override if show_sql_override is not None else cfg["runtime"]["show_sql_in_answer"]))
             print(f"[i] SQL gösterimi: {'AÇIK' if show_sql_override else 'KAPALI'}")
             continue
+        if q == ":metrics":
+            print(REGISTRY.render())
+            continue
         if q == ":rag":
             # RAG kullanımını oturumluk toggle et (config'e dokunmadan)
             rag_override = (not (rag_override if rag_override is not None else cfg["rag"]["enabled"]))
@@ -143,10 +177,10 @@ def main():
 
         # Soru çalıştır ve hataları hem logla hem kullanıcıya kısa mesajla göster
         try:
-            run_once(q, cfg, conn, llm, show_sql_override=show_sql_override, rag_override=rag_override)
+            run_once(rt, q, show_sql_override=show_sql_override, rag_override=rag_override)
         except Exception as e:
             logger.exception("Çalışma sırasında hata: %s", e)
-            print(f"[HATA] {e}\n(Lütfen logs/run.log dosyasına bakın.)")
+            print(f"[HATA] {e}\n(Lütfen {cfg['runtime'].get('log_dir', 'logs')}/run.jsonl dosyasına bakın.)")
 
 if __name__ == "__main__":
     main()  # Modül doğrudan çalıştırıldığında CLI girişini başlat
\ No newline at end of file
@@ -1,7 +1,8 @@
 # nodes/planner.py
 import logging
 import re
-from difflib import get_close_matches  # Küçük yazım hataları için fuzzy eşleşme
+from difflib import SequenceMatcher  # Küçük yazım hataları için fuzzy eşleşme
+from functools import lru_cache
 from utils.types import AgentState
 
 log = logging.getLogger("planner")
@@ -32,10 +33,75 @@ NON_SQL_EDU = [
     "how to install", "what is sql injection", "how does it work"
 ]
 
+# RAG tetikleyicileri: ilişki/arama/doğru kolon seçimi gerektiren ifadeler
+RAG_TRIGGERS = [
+    "hangi", "nerede", "unit", "birim", "kolon", "column", "join",
+    "ilişki", "relationship", "dağılım", "distribution"
+]
+
 # Çıkış kısayolları (REPL için)
 EXIT_TOKENS = {"q", ":q", ":quit", "quit", "exit", ":exit"}
 
 
+# --- Önceden derlenmiş eşleştiriciler (import anında bir kez kurulur) -------
+def _alternation(words) -> re.Pattern:
+    """Kelime listesini tek bir alternation regex'e derler (uzunlar önce)."""
+    return re.compile("|".join(re.escape(w) for w in sorted(set(words), key=len, reverse=True)))
+
+_DB_KW_RE = _alternation(DB_KEYWORDS)      # "kw in metin" kontrolü tek geçişte
+_NOISE_RE = _alternation(NON_SQL_NOISE)
+_EDU_RE = _alternation(NON_SQL_EDU)
+# "token in kw" kontrolü: anahtar kelimelerin tüm alt dizgileri (küçük bir küme)
+_DB_KW_SUBSTRINGS = frozenset(
+    kw[i:j] for kw in DB_KEYWORDS for i in range(len(kw)) for j in range(i + 1, len(kw) + 1)
+)
+_TOKEN_RE = re.compile(r"[a-z0-9ğüşöçıİĞÜŞÖÇ]+")
+_TABLE_PREF_RE = re.compile(r"\bsadece tablo\b|\btablo olarak\b|\btable\b")
+_ANALYST_PREF_RE = re.compile(r"\byorumla\b|\banaliz et\b|\byorum\b")
+
+
+class _TrigramIndex:
+    """
+    Fuzzy anahtar kelime araması için trigram indeksi.
+    difflib.get_close_matches tüm listeyi tarar; burada önce ortak trigramı olan
+    ve uzunluğu eşiği teorik olarak geçebilen adaylar seçilir, sonra yalnızca
+    onlar için SequenceMatcher oranı hesaplanır (get_close_matches ile aynı ölçüt).
+    """
+    def __init__(self, words):
+        self.words = list(dict.fromkeys(words))
+        self.index: dict[str, set[int]] = {}
+        for i, w in enumerate(self.words):
+            for g in self._grams(w):
+                self.index.setdefault(g, set()).add(i)
+
+    @staticmethod
+    def _grams(w: str) -> set[str]:
+        p = f"  {w} "
+        return {p[i:i + 3] for i in range(len(p) - 2)}
+
+    def best(self, token: str, cutoff: float = 0.8) -> str | None:
+        cands: set[int] = set()
+        for g in self._grams(token):
+            cands |= self.index.get(g, set())
+        best, best_r = None, cutoff
+        lt = len(token)
+        sm = SequenceMatcher()
+        sm.set_seq2(token)
+        for i in cands:
+            w = self.words[i]
+            # ratio <= 2*min/(toplam) üst sınırı: eşiği geçemeyecekleri hiç hesaplama
+            if 2.0 * min(lt, len(w)) / (lt + len(w)) < cutoff:
+                continue
+            sm.set_seq1(w)
+            if sm.real_quick_ratio() >= best_r and sm.quick_ratio() >= best_r:
+                r = sm.ratio()
+                if r >= best_r:
+                    best, best_r = w, r
+        return best
+
+_DB_KW_INDEX = _TrigramIndex(DB_KEYWORDS)
+
+
 # --- Yardımcı fonksiyonlar ---------------------------------------------------
 def _alpha_ratio(s: str) -> float:
     """Metindeki harf oranı: çok düşükse gürültü/noise olabilir."""
@@ -44,23 +110,34 @@ def _alpha_ratio(s: str) -> float:
 
 def _tokenize(q: str) -> list[str]:
     """Basit tokenizasyon (TR karakterleri dahil)."""
-    return re.findall(r"[a-z0-9ğüşöçıİĞÜŞÖÇ]+", q.lower())
+    return _TOKEN_RE.findall(q.lower())
+
+@lru_cache(maxsize=8192)
+def _token_is_keyword(t: str) -> bool:
+    """Tek token için karar; token başına bir kez hesaplanır (sorular arası tekrar çok)."""
+    # Doğrudan kapsama (ör. 'unit', 'user', 'hangi', 'dağılım' vs.)
+    if t in _DB_KW_SUBSTRINGS or _DB_KW_RE.search(t):
+        return True
+    # Fuzzy: benzerlik %80+ ise eşleşmiş say
+    return _DB_KW_INDEX.best(t, cutoff=0.8) is not None
 
 def _has_fuzzy_keyword(q: str) -> bool:
     """
     Soru metnindeki token'ları DB_KEYWORDS ile karşılaştır.
     - Birebir içerme kontrolü
-    - Küçük yazım hataları için fuzzy eşleşme (difflib)
+    - Küçük yazım hataları için fuzzy eşleşme (trigram indeksi + SequenceMatcher)
     """
-    toks = _tokenize(q)
-    for t in toks:
-        # Doğrudan kapsama (ör. 'unit', 'user', 'hangi', 'dağılım' vs.)
-        if any(t in kw or kw in t for kw in DB_KEYWORDS):
-            return True
-        # Fuzzy: benzerlik %80+ ise eşleşmiş say
-        if get_close_matches(t, DB_KEYWORDS, n=1, cutoff=0.8):
-            return True
-    return False
+    return any(_token_is_keyword(t) for t in _tokenize(q))
+
+@lru_cache(maxsize=16)
+def _schema_table_re(schema_hint: str) -> re.Pattern | None:
+    """Şema ipucundaki 'TABLE ad' isimlerini tek regex'e derler (şema metni başına bir kez)."""
+    names = []
+    for line in schema_hint.lower().splitlines():
+        m = re.search(r"table\s+([a-z0-9_]+)", line)
+        if m:
+            names.append(m.group(1))
+    return _alternation(names) if names else None
 
 def _looks_like_noise(q: str) -> bool:
     """Çıkış/çok kısa/çok az harf/sohbet/edu türü içerikleri 'noise' say."""
@@ -71,9 +148,9 @@ def _looks_like_noise(q: str) -> bool:
         return True
     if _alpha_ratio(ql) < 0.3:
         return True
-    if any(tok in ql for tok in NON_SQL_NOISE):
+    if _NOISE_RE.search(ql):
         return True
-    if any(tok in ql for tok in NON_SQL_EDU):
+    if _EDU_RE.search(ql):
         return True
     return False
 
@@ -86,90 +163,105 @@ def _mentions_db_semantics(q: str, schema_hint: str | None = None) -> bool:
     """
     ql = q.lower()
     # 1) Doğrudan anahtar kelime yakalama
-    if any(tok in ql for tok in DB_KEYWORDS):
+    if _DB_KW_RE.search(ql):
         return True
     # 2) Fuzzy anahtar kelime (kulanıcı → kullanıcı gibi)
     if _has_fuzzy_keyword(ql):
         return True
     # 3) Şema ipucundan tablo adı yakalama (varsa)
     if schema_hint:
-        for line in schema_hint.lower().splitlines():
-            m = re.search(r"table\s+([a-z0-9_]+)", line)
-            if m and m.group(1) in ql:
-                return True
+        pat = _schema_table_re(schema_hint)
+        if pat is not None and pat.search(ql):
+            return True
     return False
 
 
 # --- Ana giriş (planner.run) -------------------------------------------------
-def run(state: AgentState, rag_enabled_default: bool = True) -> AgentState:
+def _route_non_sql(state: AgentState, answer: str, why: str) -> AgentState:
+    state.intent = "non_sql"
+    state.answer_text = answer
+    state.plan = ["end"]
+    state.use_rag = False
+    log.info("Intent=non_sql (%s).", why)
+    return state
+
+def run(
+    state: AgentState,
+    rag_enabled_default: bool = True,
+    classifier=None,
+    min_confidence: float = 0.75,
+) -> AgentState:
     """
     Soru → intent belirleme + basit plan oluşturma.
     - 'sql_query' veya 'non_sql'
-    - RAG kullanım kararı (tetikleyicilerle)
+    - RAG kullanım kararı (model veya tetikleyicilerle)
+    - LLM-critic gerekli mi? (model yoksa her zaman evet)
+    classifier (tools.intent.IntentClassifier) verilmişse ve kararından eminse
+    (olasılık >= min_confidence) kural listeleri atlanır; emin değilse kurallara düşülür.
     """
     q = state.question or ""
     ql = q.strip().lower()
 
-    # 0) Önce DB semantiğine bakalım (varsa noise filtresini esneteceğiz)
-    has_db_sem = _mentions_db_semantics(ql, state.schema_doc)
+    # Yerel sınıflandırıcı tahmini (LLM çağrısı yok; ~onlarca µs)
+    pred = None
+    if classifier is not None and ql not in EXIT_TOKENS:
+        try:
+            pred = classifier.predict(ql)
+            state.intent_confidence = round(pred["is_sql"], 3)
+        except Exception as e:
+            log.warning("Intent modeli tahmini başarısız: %s", e)
+
+    if pred is not None and pred["is_sql"] <= 1.0 - min_confidence:
+        return _route_non_sql(state, "Bu soru veritabanıyla ilgili değil.", f"model p_sql={pred['is_sql']:.2f}")
+
+    if pred is not None and pred["is_sql"] >= min_confidence:
+        has_db_sem = True
+    else:
+        # 0) Önce DB semantiğine bakalım (varsa noise filtresini esneteceğiz)
+        has_db_sem = _mentions_db_semantics(ql, state.schema_doc)
 
     # 1) Çıkış/noise kontrolü (yalnızca DB semantiği YOKSA uygula)
     if not has_db_sem and _looks_like_noise(ql):
-        state.intent = "non_sql"
         if ql in EXIT_TOKENS:
-            state.answer_text = "Çıkış komutu algılandı."
-        else:
-            state.answer_text = "Bu soru veritabanıyla ilgili değil."
-        state.plan = ["end"]
-        state.use_rag = False
-        log.info("Intent=non_sql (noise/exit).")
-        return state
+            return _route_non_sql(state, "Çıkış komutu algılandı.", "noise/exit")
+        return _route_non_sql(state, "Bu soru veritabanıyla ilgili değil.", "noise/exit")
 
     # 2) DB semantiği yoksa non_sql
     if not has_db_sem:
-        state.intent = "non_sql"
-        state.answer_text = "Bu soru veritabanıyla ilgili değil."
-        state.plan = ["end"]
-        state.use_rag = False
-        log.info("Intent=non_sql (no db semantics).")
-        return state
-    state.use_rag = rag_enabled_default
+        return _route_non_sql(state, "Bu soru veritabanıyla ilgili değil.", "no db semantics")
     state.output_pref = "analyst"  # "table_only" / "bullets_only" vb. de olabilir
 
     # Kullanıcı “sadece tablo” isterse override et
-    if re.search(r"\bsadece tablo\b|\btablo olarak\b|\btable\b", q):
+    if _TABLE_PREF_RE.search(q):
         state.output_pref = "table_only"
-    elif re.search(r"\byorumla\b|\banaliz et\b|\byorum\b", q):
+    elif _ANALYST_PREF_RE.search(q):
         state.output_pref = "analyst"
 
-    # intent tespitin neyse onu koru (sql_query / non_sql)
-    state.intent = state.intent or "sql_query"
-
-
     # 3) Normal durumda: sql_query
     state.intent = "sql_query"
 
-    # RAG tetikleyicileri: ilişki/arama/doğru kolon seçimi gerektiren ifadeler
-    rag_triggers = [
-        "hangi", "nerede", "unit", "birim", "kolon", "column", "join",
-        "ilişki", "relationship", "dağılım", "distribution"
-    ]
-    state.use_rag = rag_enabled_default and any(t in ql for t in rag_triggers)
-    state.use_rag = rag_enabled_default
-    state.output_pref = "analyst"  # "table_only" / "bullets_only" vb. de olabilir
-
+    # RAG + critic kararı: model soruyu güvenle SQL saydıysa onun tahmini, değilse (yönlendirme
+    # kurallara düştüyse) tetikleyici kuralları. Critic yalnızca model ihtiyaç olmadığından EMİNSE
+    # atlanır (güvenli taraf).
+    if pred is not None and pred["is_sql"] >= min_confidence:
+        state.use_rag = rag_enabled_default and pred["use_rag"] >= 0.5
+        state.use_critic = pred["use_critic"] >= 1.0 - min_confidence
+    else:
+        state.use_rag = rag_enabled_default and any(t in ql for t in RAG_TRIGGERS)
+        state.use_critic = True
 
     # 4) Planı yaz
     state.plan = [
         "fetch_schema",
         "use_rag" if state.use_rag else "no_rag",
         "generate_sql",
-        "validate_sql",
+        "validate_sql" if state.use_critic else "validate_sql_no_critic",
         "execute_sql",
         "postprocess",
         "summarize",
         "guardian",
         "telemetry",
     ]
-    log.info("Intent=sql_query, use_rag=%s, plan=%s", state.use_rag, state.plan)
-    return state
\ No newline at end of file
+    log.info("Intent=sql_query, use_rag=%s, use_critic=%s, p_sql=%s, plan=%s",
+             state.use_rag, state.use_critic, state.intent_confidence, state.plan)
+    return state
@@ -3,6 +3,7 @@ import logging
 from utils.llm import call_llm_text
 from utils.types import AgentState
 from utils.cost import CostTracker
+from utils.sql_utils import enforce_outer_limit
 
 log = logging.getLogger("qgen")
 
@@ -59,14 +60,21 @@ def _clean_sql(txt: str) -> str:
     return sql
 
 
-def _is_pure_aggregate(sql_lower: str) -> bool:
+def prompt_prefix(schema_doc: str, max_limit: int = 1000, allowed_tables: list[str] | None = None) -> tuple[str, str]:
     """
-    Çok kaba bir sezgi: select ifadesinde aggregate fonksiyon var ve
-    group by/yinelenen satır üretmiyor, ayrıca limit yok → 'pure aggregate' kabul edilebilir.
-    (Tam doğruluk için parser gerekir; validator zaten ikinci savunma hattı.)
+    İstekten bağımsız sabit önek: (system prompt, user prompt'un soruya kadarki kısmı).
+    Aynı şema için her istekte byte-byte aynıdır (sunucu tarafı prefix cache; warm-up prefill).
     """
-    has_agg = any(fn in sql_lower for fn in ("count(", "avg(", "sum(", "min(", "max("))
-    return has_agg and " group by " not in sql_lower
+    system_prompt = SYSTEM_PROMPT_TMPL.format(
+        allowed_tables=", ".join(allowed_tables or []),  # boşsa yine de formatta boş gösteririz
+        max_limit=max_limit,
+    )
+    user_prefix = f"""SCHEMA (SQLite):
+{schema_doc}
+
+QUESTION:
+"""
+    return system_prompt, user_prefix
 
 
 def run(
@@ -84,23 +92,26 @@ def run(
         state.validation_report = {"ok": False, "reason": "No schema"}
         return state
 
-    allowed_tables = allowed_tables or []  # boşsa yine de formatta boş gösteririz
-    allowed_tables_str = ", ".join(allowed_tables)
-
-    system_prompt = SYSTEM_PROMPT_TMPL.format(
-        allowed_tables=allowed_tables_str,
-        max_limit=max_limit,
-    )
-
-    user_prompt = f"""SCHEMA (SQLite):
-{state.schema_doc}
-
-QUESTION:
-{state.question}
+    system_prompt, user_prefix = prompt_prefix(state.schema_doc, max_limit, allowed_tables)
+    user_prompt = user_prefix + f"""{state.question}
 
 HINTS:
 - If the question refers to entities like units or users, join to fetch their names (e.g., unit_name, user.name) instead of IDs.
 - For weekday: SELECT strftime('%w', message_date) AS weekday, COUNT(*) FROM chat_session GROUP BY weekday ORDER BY weekday;
+"""
+    if state.value_hints:
+        # Değer indeksinin bulduğu aday literaller: yazım tahmin edilmesin, ama sahte eşleşme filtreye dönüşmesin
+        user_prompt += ("- Candidate values from the database (use only if relevant to the question, then verbatim): "
+                        + "; ".join(state.value_hints) + ".\n")
+
+    # Onarım turu: reddedilen adayı ve kesin gerekçeyi (örn. kolon önerisi) geri besle
+    prev = state.validation_report or {}
+    if state.candidate_sql and prev and not prev.get("ok"):
+        user_prompt += f"""
+PREVIOUS ATTEMPT (rejected by validator):
+{state.candidate_sql[-1]}
+REASON: {prev.get("reason", "unknown")}
+Fix exactly this problem in the new SQL.
 """
 
     # --- LLM çağrısı ---
@@ -111,12 +122,9 @@ HINTS:
     if not sql.lower().startswith(("select", "with")):
         sql = "SELECT 1 AS dummy"
 
-    # LIMIT kuralı
-    sql_l = sql.lower()
-    if not _is_pure_aggregate(sql_l):
-        # 'with' ile başlayanlarda dış SELECT'te limit olup olmadığını kaba şekilde kontrol ederiz
-        if " limit " not in sql_l:
-            sql = f"{sql} LIMIT {max_limit}"
+    # LIMIT kuralı: dış sorguda yoksa ekle, varsa max_limit'e kırp (saf agregatlar hariç).
+    # Token derinliğine bakıldığı için alt sorgu/CTE LIMIT'leri dış sınırı bastırmaz.
+    sql = enforce_outer_limit(sql, max_limit)
 
     # normalize (tek trailing ';' kaldırılmıştı)
     state.candidate_sql = [sql.strip()]
@@ -2,8 +2,11 @@
 import logging
 import re
 import sqlite3
+from difflib import get_close_matches
 from utils.types import AgentState
 from utils.llm import call_llm_text
+from utils.sql_utils import tokenize_sql, contains_banned
+from tools.db import schema_catalog
 
 log = logging.getLogger("validator")
 
@@ -83,10 +86,10 @@ def static_check(
     if enforce_select_only and not (low.startswith("select") or low.startswith("with")):
         return False, "Only SELECT (or WITH..SELECT) statements are allowed"
 
-    # 2) Banned keywords (tam kelime)
-    for kw in banned_keywords:
-        if re.search(rf"\b{re.escape(kw.lower())}\b", low):
-            return False, f"Banned keyword detected: {kw}"
+    # 2) Banned keywords (tam kelime; önceden derlenmiş tek regex)
+    kw = contains_banned(low, banned_keywords)
+    if kw:
+        return False, f"Banned keyword detected: {kw}"
 
     # 3) İzinli tablo beyaz listesi (CTE'leri hariç)
     used_tables = _extract_table_names(original)
@@ -102,6 +105,229 @@ def static_check(
 
     return True, warn
 
+# -----------------------------
+# Kolon varlık kontrolü (şema kataloğuna karşı)
+# -----------------------------
+# SELECT grameri içinde kolon adı olamayacak anahtar kelimeler
+_SQL_KEYWORDS = frozenset("""
+select from where group by having order limit offset as on using join inner left right full
+outer cross natural union all intersect except distinct with recursive and or not is null
+in exists between like glob regexp match escape case when then else end cast asc desc nulls
+first last collate nocase rtrim binary true false current_date current_time current_timestamp
+over partition window filter rows range groups preceding following unbounded current row
+exclude ties others no values indexed
+""".split())
+
+
+def _parse_sources(toks) -> tuple[dict, set, set, set]:
+    """
+    Token listesinden kaynakları çıkarır.
+    Döndürür:
+      sources   : {alias/tablo adı → gerçek tablo adı | None (CTE/alt sorgu/tablo fonksiyonu)}
+      ctes      : WITH ile tanımlanan adlar
+      aliases   : AS (veya örtük) ile tanımlanan çıktı adları
+      consumed  : kaynak/alias tanımı olarak tüketilen token indeksleri (kolon sayılmaz)
+    """
+    sources: dict[str, str | None] = {}
+    ctes: set[str] = set()
+    aliases: set[str] = set()
+    consumed: set[int] = set()
+    n = len(toks)
+
+    def is_name(i):
+        return i < n and toks[i].kind in ("id", "qid") and (toks[i].kind == "qid" or toks[i].name not in _SQL_KEYWORDS)
+
+    def skip_parens(i):
+        # toks[i] == '(' → eşleşen ')' sonrasını döndür
+        d = toks[i].depth
+        i += 1
+        while i < n and not (toks[i].text == ")" and toks[i].depth == d):
+            i += 1
+        return i + 1
+
+    # CTE adları: WITH [RECURSIVE] ad [(kolonlar)] AS ( ... ) [, ad AS (...)]
+    for i, t in enumerate(toks):
+        if t.kind == "id" and t.name == "with":
+            j = i + 1
+            if j < n and toks[j].name == "recursive":
+                j += 1
+            while is_name(j):
+                ctes.add(toks[j].name)
+                consumed.add(j)
+                j += 1
+                if j < n and toks[j].text == "(":
+                    j = skip_parens(j)
+                if j < n and toks[j].name == "as":
+                    j += 1
+                if j < n and toks[j].name in ("not", "materialized"):
+                    j += 1 if toks[j].name == "materialized" else 2
+                if j < n and toks[j].text == "(":
+                    j = skip_parens(j)
+                if j < n and toks[j].text == ",":
+                    j += 1
+                    continue
+                break
+
+    i = 0
+    while i < n:
+        t = toks[i]
+        if t.kind == "id" and t.name in ("from", "join"):
+            j = i + 1
+            while j < n:
+                if toks[j].text == "(":
+                    # Alt sorgu: kolonları türetilmiş, çözümlenemez
+                    j = skip_parens(j)
+                    real = None
+                elif toks[j].kind in ("id", "qid"):
+                    consumed.add(j)
+                    real = toks[j].name
+                    if j + 2 < n and toks[j + 1].text == "." and toks[j + 2].kind in ("id", "qid"):
+                        consumed.add(j + 2)
+                        j += 2
+                        real = toks[j].name
+                    j += 1
+                    if j < n and toks[j].text == "(":
+                        # Tablo değerli fonksiyon (json_each vb.)
+                        j = skip_parens(j)
+                        real = None
+                    elif real in ctes:
+                        real = None
+                else:
+                    break
+                alias = real
+                if j < n and toks[j].name == "as":
+                    j += 1
+                if is_name(j):
+                    alias = toks[j].name
+                    consumed.add(j)
+                    j += 1
+                if alias is not None:
+                    sources[alias] = real
+                if real is not None:
+                    sources.setdefault(real, real)
+                elif alias is None:
+                    sources[f"#derived{j}"] = None
+                # FROM a, b listesi
+                if t.name == "from" and j < n and toks[j].text == ",":
+                    j += 1
+                    continue
+                break
+            i = j
+            continue
+        i += 1
+
+    # Adlandırılmış pencereler: WINDOW w AS (...) [, w2 AS (...)] → "OVER w" kolon değil
+    for i, t in enumerate(toks):
+        if t.kind == "id" and t.name == "window":
+            j = i + 1
+            while is_name(j) and j + 1 < n and toks[j + 1].name == "as":
+                aliases.add(toks[j].name)
+                consumed.add(j)
+                j += 2
+                if j < n and toks[j].text == "(":
+                    j = skip_parens(j)
+                if j < n and toks[j].text == ",":
+                    j += 1
+                    continue
+                break
+
+    # Çıktı alias'ları: "AS ad" veya örtük "ifade ad"
+    for i, t in enumerate(toks):
+        if i in consumed or not is_name(i) or i == 0:
+            continue
+        prev = toks[i - 1]
+        if prev.kind == "id" and prev.name == "as":
+            aliases.add(t.name)
+            consumed.add(i)
+        elif (prev.text == ")" or prev.kind in ("qid", "num", "str") or is_name(i - 1)
+              or (prev.kind == "id" and prev.name == "end")) \
+                and not (i + 1 < n and toks[i + 1].text in ("(", ".")):
+            aliases.add(t.name)
+            consumed.add(i)
+    return sources, ctes, aliases, consumed
+
+
+def column_check(sql: str, catalog: dict[str, list[str]]) -> tuple[bool, str]:
+    """
+    SQL'deki her kolon referansını şema kataloğuna karşı çözer:
+      - 'alias.kolon' → alias'ın işaret ettiği tablonun kolonlarında aranır
+      - yalın 'kolon' → FROM/JOIN'deki tabloların birleşiminde aranır
+      - CTE/alt sorgu kaynakları türetilmiş sayılır; belirsiz yalın adlar atlanır
+    Bulunamayanlar için yakın eşleşme önerisi (difflib) ve kolonun hangi
+    tabloda olduğu ipucu döner. EXPLAIN/LLM-critic'e gitmeden hatayı yakalar.
+    """
+    if not catalog:
+        return True, ""
+    toks = tokenize_sql(sql)
+    sources, ctes, aliases, consumed = _parse_sources(toks)
+    base_tables = {t for t in sources.values() if t is not None and t in catalog}
+    has_derived = any(t is None for t in sources.values())
+    n = len(toks)
+    errors: list[str] = []
+    seen: set[str] = set()
+
+    def hint(col: str, tables) -> str:
+        cands = sorted({c for tb in tables for c in catalog.get(tb, [])})
+        close = get_close_matches(col, cands, n=3, cutoff=0.6)
+        elsewhere = sorted(tb for tb, cols in catalog.items() if col in cols and tb not in tables)
+        parts = []
+        if close:
+            parts.append("did you mean: " + ", ".join(close))
+        if elsewhere:
+            parts.append("column exists in: " + ", ".join(elsewhere) + " (JOIN needed)")
+        return f" ({'; '.join(parts)})" if parts else ""
+
+    i = 0
+    while i < n:
+        t = toks[i]
+        if i in consumed or t.kind not in ("id", "qid") or (t.kind == "id" and t.name in _SQL_KEYWORDS):
+            i += 1
+            continue
+        nxt = toks[i + 1].text if i + 1 < n else ""
+        if nxt == "(":
+            # Fonksiyon çağrısı
+            i += 1
+            continue
+        if nxt == "." and i + 2 < n:
+            qual, col_tok = t.name, toks[i + 2]
+            i += 3
+            if col_tok.text == "*" or col_tok.kind not in ("id", "qid"):
+                continue
+            col = col_tok.name
+            if qual in sources:
+                table = sources[qual]
+                if table is None or table not in catalog or col in catalog[table]:
+                    continue
+                key = f"{qual}.{col}"
+                if key not in seen:
+                    seen.add(key)
+                    errors.append(f"Unknown column '{key}' (table '{table}'){hint(col, [table])}")
+            elif qual not in ctes and qual not in aliases:
+                key = f"{qual}."
+                if key not in seen:
+                    seen.add(key)
+                    known = ", ".join(sorted(k for k in sources if not k.startswith("#"))) or "-"
+                    errors.append(f"Unknown table/alias '{qual}' in '{qual}.{col}' (in FROM: {known})")
+            continue
+        i += 1
+        col = t.name
+        if col in aliases or col in sources or col in ctes or col in seen:
+            continue
+        if any(col in catalog[tb] for tb in base_tables):
+            continue
+        if has_derived or not base_tables:
+            # Türetilmiş kaynaktan gelebilir ya da FROM yok: karar verme
+            continue
+        if t.kind == "qid":
+            # Çözülemeyen "..." SQLite'ta metin literaline düşer (WHERE name = "Ali"): karar EXPLAIN'in
+            continue
+        seen.add(col)
+        errors.append(f"Unknown column '{col}' in {', '.join(sorted(base_tables))}{hint(col, base_tables)}")
+
+    if errors:
+        return False, "; ".join(errors)
+    return True, ""
+
 # -----------------------------
 # EXPLAIN kontrolü
 # -----------------------------
@@ -111,9 +337,8 @@ def explain_check(conn: sqlite3.Connection, sql: str) -> tuple[bool, str]:
         q = sql.strip()
         if q.endswith(";"):
             q = q[:-1]
-        cur = conn.cursor()
-        cur.execute("EXPLAIN QUERY PLAN " + q)
-        plan = cur.fetchall()
+        # conn.execute: ReadOnlyConnection sorgu saatini sıfırlar (cursor().execute sıfırlamaz)
+        plan = conn.execute("EXPLAIN QUERY PLAN " + q).fetchall()
         if not plan:
             return False, "Empty EXPLAIN plan"
         if any("SCAN" in str(p).upper() for p in plan):
@@ -146,6 +371,23 @@ Answer strictly 'OK' or 'FAIL: <short reason>'.
 # -----------------------------
 # Üst seviye akış
 # -----------------------------
+def count_repair(state: AgentState, max_repairs: int) -> AgentState:
+    """
+    Doğrulama geçmediyse onarım sayacını artırır (qval düğümünde; graf yönlendiricisi yalnızca okur).
+    Sınır aşıldıysa kullanıcıya gidecek kısa açıklamayı yazar.
+    """
+    vr = state.validation_report or {}
+    if vr.get("ok"):
+        return state
+    state.repair_attempts = (state.repair_attempts or 0) + 1
+    if state.repair_attempts > max_repairs:
+        state.answer_text = (
+            f"SQL doğrulaması başarısız oldu: {vr.get('reason', 'bilinmeyen')} "
+            f"(onarım denemeleri aşıldı)."
+        )
+    return state
+
+
 def run(
     conn: sqlite3.Connection,
     state: AgentState,
@@ -159,8 +401,9 @@ def run(
 ) -> AgentState:
     """
     1) static_check (SELECT/WITH-only, banned, whitelist, çoklu statement)
-    2) EXPLAIN
-    3) semantic_check (varsa)
+    2) column_check (şema kataloğuna karşı kolon/alias çözümü)
+    3) EXPLAIN
+    4) semantic_check (varsa)
     """
     sql = state.candidate_sql[-1] if state.candidate_sql else ""
     if not sql:
@@ -178,7 +421,19 @@ def run(
     if reason:
         log.info("static_check warning: %s | sql='%s'", reason, sql)
 
-    # 2) EXPLAIN
+    # 2) Kolon varlık kontrolü (cache'li katalog; EXPLAIN/LLM'den önce)
+    try:
+        catalog = schema_catalog(conn)
+    except Exception as e:
+        log.warning("Şema kataloğu okunamadı: %s", e)
+        catalog = {}
+    ok, reason = column_check(sql, catalog)
+    if not ok:
+        log.warning("column_check FAIL: %s | sql='%s'", reason, sql)
+        state.validation_report = {"ok": False, "reason": reason}
+        return state
+
+    # 3) EXPLAIN
     ok, reason = explain_check(conn, sql)
     if not ok:
         log.warning("EXPLAIN FAIL: %s | sql='%s'", reason, sql)
@@ -187,8 +442,9 @@ def run(
     if reason:
         log.info("EXPLAIN warning: %s", reason)
 
-    # 3) LLM-critic (opsiyonel)
-    if llm_service:
+    # 4) LLM-critic (opsiyonel; planner gereksiz bulduysa veya SQL deterministik şablondan geldiyse atlanır)
+    from_template = (state.template_match or {}).get("sql") == sql
+    if llm_service and state.use_critic and not from_template:
         ok, reason = semantic_check(state, llm_service, cost)
         if not ok:
             log.warning("semantic_check FAIL: %s | sql='%s'", reason, sql)
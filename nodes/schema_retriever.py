@@ -1,5 +1,8 @@
 import logging
 import sqlite3
+import threading
+from tools.db import db_key
+from utils.tracing import record_cache
 from utils.types import AgentState
 
 log = logging.getLogger("schema")
@@ -13,7 +16,28 @@ COLUMN_DESCRIPTIONS = {
     "unit.unit_name": "name of the organizational unit",
 }
 
+# (db yolu, schema_version) → şema dökümanı; süreç genelinde (oturumlar/istekler arası) paylaşılır
+_DOC_CACHE: dict = {}
+_DOC_LOCK = threading.Lock()
+
 def run(conn: sqlite3.Connection, state: AgentState) -> AgentState:
+    state.schema_doc = schema_doc(conn)
+    return state
+
+def schema_doc(conn: sqlite3.Connection) -> str:
+    """Cache'li şema dökümanı (şema değişmedikçe süreçte bir kez üretilir)."""
+    key = (db_key(conn), conn.execute("PRAGMA schema_version;").fetchone()[0])
+    doc = _DOC_CACHE.get(key)
+    record_cache("schema_doc", doc is not None)
+    if doc is None:
+        with _DOC_LOCK:
+            doc = _DOC_CACHE.get(key)
+            if doc is None:
+                doc = _DOC_CACHE[key] = build_schema_doc(conn)
+                log.info("Şema dökümanı hazır (%d karakter).", len(doc))
+    return doc
+
+def build_schema_doc(conn: sqlite3.Connection) -> str:
     # DB bağlantısından cursor aç
     cur = conn.cursor()
 
@@ -38,8 +62,4 @@ def run(conn: sqlite3.Connection, state: AgentState) -> AgentState:
         schema_lines.append(f"- {col} → {desc}")
 
     # 4) Şemayı tek string olarak birleştir
-    schema_doc = "\n".join(schema_lines)
-    state.schema_doc = schema_doc
-
-    log.info("Şema dökümanı hazır (%d karakter).", len(schema_doc))
-    return state
\ No newline at end of file
+    return "\n".join(schema_lines)
\ No newline at end of file
@@ -1,15 +1,32 @@
 import logging, time
+from typing import Any, Dict, Optional
 from utils.types import AgentState
+from utils.metrics import ROLLUP_QUERIES
 from tools.db import execute_preview
+from tools import rollups
 
 # Yürütücü düğüm için logger
 log = logging.getLogger("exec")
 
-def run(conn, state: AgentState, preview_rows: int=50) -> AgentState:
+def _execute(conn, sql: str, preview_rows: int, rollup_cfg: Optional[Dict[str, Any]]):
+    # Güncel bir rollup sorguyu yanıtlayabiliyorsa yeniden yazılmış hali çalışır; hata olursa taban sorgu
+    rw = rollups.plan(conn, sql, rollup_cfg) if rollup_cfg and rollup_cfg.get("enabled") else None
+    if rw is not None:
+        try:
+            out = execute_preview(conn, rw[1], preview_rows=preview_rows)
+            ROLLUP_QUERIES.inc(rollup=rw[0], outcome="hit")
+            return out, rw
+        except Exception as e:
+            ROLLUP_QUERIES.inc(rollup=rw[0], outcome="error")
+            log.warning("Rollup sorgusu başarısız (%s), taban sorgu çalıştırılıyor: %s", rw[0], e)
+    return execute_preview(conn, sql, preview_rows=preview_rows), None
+
+def run(conn, state: AgentState, preview_rows: int=50, rollup_cfg: Optional[Dict[str, Any]] = None) -> AgentState:
     """
     Doğrulanmış SQL'i (state.validated_sql) çalıştırır ve örnek (preview) satırları döndürür.
     - Başarılıysa: state.rows_preview ve state.execution_stats doldurulur.
     - Hata varsa: state.execution_stats ok=False ve reason alanıyla set edilir.
+    - rollup_cfg verildiyse desteklenen agregatlar ön-agregat tablolardan okunur (tools/rollups.py).
     """
     # 1) Önkoşul: validated_sql gelmemişse yürütmeye kalkma
     if not state.validated_sql:
@@ -19,7 +36,7 @@ def run(conn, state: AgentState, preview_rows: int=50) -> AgentState:
     t0 = time.time()  # süre ölçümü başlangıcı
     try:
         # 2) Güvenli yürütme: execute_preview sonuç sözlüğü döndürür
-        out = execute_preview(conn, state.validated_sql, preview_rows=preview_rows)
+        out, rw = _execute(conn, state.validated_sql, preview_rows, rollup_cfg)
 
         # 3) Süreyi hesapla ve state'e yaz
         dt = time.time() - t0
@@ -27,8 +44,12 @@ def run(conn, state: AgentState, preview_rows: int=50) -> AgentState:
         state.execution_stats = {
             "ok": True,
             "ms": int(dt*1000),           # milisaniye cinsinden süre
-            "rowcount": out["rowcount"]   # toplam etkilenen/okunan satır sayısı
+            "rowcount": out["rowcount"],  # toplam etkilenen/okunan satır sayısı
+            "truncated": out["truncated"],  # preview_rows'tan fazla satır vardı (kesildi)
         }
+        if rw is not None:
+            state.execution_stats["rollup"] = rw[0]           # yanıtlayan ön-agregat tablo
+            state.execution_stats["rewritten_sql"] = rw[1]    # gerçekte çalışan SQL
 
         # 4) Bilgi logu (operasyonel telemetri)
         log.info("Sorgu çalıştı: %d satır (%.1f ms).", out["rowcount"], dt*1000)
@@ -1,12 +1,12 @@
 # nodes/summarizer.py
 import logging
-import json
 import re
 from typing import List, Dict, Any, Optional
 
 from utils.types import AgentState
 from utils.cost import CostTracker
 from utils.llm import call_llm_text
+from utils.excerpt import encode_excerpt
 
 log = logging.getLogger("sum")
 
@@ -110,44 +110,105 @@ def _format_sections(text: str) -> str:
     return "\n".join(out)
 
 
-def _prettify_singleton_table(rows, question: str | None):
+def _fmt_num(x: float):
+    return int(x) if float(x).is_integer() else round(x, 2)
+
+
+def _stats_block(rows: List[Dict[str, Any]]) -> str:
     """
-    Tek satır & tek kolonluk sonuçları daha okunaklı hale getirir.
-    Döndürür: (kisa_yanit_str, markdown_table_str)
+    Deterministik istatistikler: genel toplam, ortalama, max/min (grup kolonu varsa).
+    Sayısal metrik bulunamazsa boş string döner.
     """
-    if not rows or len(rows) != 1:
-        return None, None
-    cols = list(rows[0].keys())
-    vals = list(rows[0].values())
-    if len(cols) != 1:
-        return None, None
+    if not rows:
+        return ""
+    gcol, mcol = _find_group_and_metric_cols(rows)
+    if not mcol:
+        return ""
+    vals = []
+    for r in rows:
+        try:
+            if r.get(mcol) is not None:
+                vals.append(float(r[mcol]))
+        except Exception:
+            pass
+    if not vals:
+        return ""
+    total = sum(vals)
+    avg = total / len(vals)
+    if gcol:
+        sorted_rows = sorted(rows, key=lambda r: float(r.get(mcol) or 0), reverse=True)
+        top_g, top_v = sorted_rows[0][gcol], sorted_rows[0][mcol]
+        low_g, low_v = sorted_rows[-1][gcol], sorted_rows[-1][mcol]
+        return (
+            "### 📊 Hesaplanan İstatistikler\n"
+            f"- Toplam: **{_fmt_num(total)}**\n"
+            f"- Ortalama (grup başına): **{round(avg, 2)}**\n"
+            f"- En yüksek: **{top_g} ({top_v})**\n"
+            f"- En düşük: **{low_g} ({low_v})**"
+        )
+    return (
+        f"\n\n**Hesaplanan İstatistikler**\n"
+        f"- Toplam: **{_fmt_num(total)}**\n"
+        f"- Ortalama: **{round(avg, 2)}**"
+    )
 
-    raw_col = cols[0]
-    val = vals[0]
-    q = (question or "").lower()
 
-    # Kolon adını sadeleştir (COUNT/AVG/SUM/DISTINCT vb.)
-    col_clean = raw_col
-    m = re.search(r"(?:count|avg|sum|min|max)\s*\(\s*(?:distinct\s+)?(.+?)\s*\)", raw_col, flags=re.I)
-    if m:
-        col_clean = m.group(1)
-    if "." in col_clean:
-        col_clean = col_clean.split(".")[-1]
-    col_clean = col_clean.strip().strip('"').strip("'")
-
-    # Soruya göre başlık
-    if "unit" in q or "organizasyon" in q:
-        header = "Unit Sayısı"
-        short = f"Toplam unit sayısı = {val}"
-    elif "user" in q or "kullanıcı" in q:
-        header = "Kullanıcı Sayısı"
-        short = f"Toplam kullanıcı sayısı = {val}"
-    else:
-        header = col_clean or raw_col
-        short = f"{header} = {val}"
+# ---------------------------
+# Deterministik (LLM'siz) render'lar
+# ---------------------------
+MAX_TABLE_ROWS = 50   # LLM excerpt'i ile aynı sınır
+
+
+def _render_singleton(rows: List[Dict[str, Any]]) -> str:
+    """Tek satır & tek kolon: kısa yanıt + tek hücrelik tablo."""
+    col, val = next(iter(rows[0].items()))
+    return f"Kısa Yanıt: {col} = {val}\n\n| {col} |\n|---|\n| {val} |"
+
 
-    table = f"| {header} |\n|---|\n| {val} |"
-    return short, table
+def _render_table(rows: List[Dict[str, Any]], rowcount: Optional[int] = None) -> str:
+    """Sadece tablo: satırları yerelde Markdown tabloya dizer."""
+    txt = _mk_markdown_table(rows, top_n=MAX_TABLE_ROWS)
+    shown = min(len(rows), MAX_TABLE_ROWS)
+    total = max(rowcount or 0, len(rows))
+    if total > shown:
+        txt += f"\n\n_İlk {shown} satır gösteriliyor._"
+    return txt
+
+
+def _render_bullets(rows: List[Dict[str, Any]]) -> str:
+    """Madde madde metrikler: grup → metrik (veya satır alanları) + hesaplanan istatistikler."""
+    gcol, mcol = _find_group_and_metric_cols(rows)
+    lines = []
+    for r in rows[:MAX_TABLE_ROWS]:
+        if gcol and mcol and gcol != mcol:
+            lines.append(f"- {r.get(gcol)}: {r.get(mcol)}")
+        else:
+            lines.append("- " + ", ".join(f"{k}: {v}" for k, v in r.items()))
+    stats = _stats_block(rows).strip()
+    if stats:
+        lines += ["", stats]
+    return "\n".join(lines)
+
+
+def _deterministic_path(rows: List[Dict[str, Any]], mode: str, listing_intent: bool, insufficient: bool) -> Optional[str]:
+    """
+    LLM çağrısından ÖNCE: deterministik render yeterli mi?
+      - empty        : listeleme niyeti + 0 satır
+      - insufficient : veri yetersiz (0 satır, anlamsız tekil değer)
+      - singleton    : 1 satır × 1 kolon (her modda; LLM metni zaten ezilirdi)
+      - table_only   : kullanıcı yalnızca tablo istedi
+      - bullets_only : kullanıcı yalnızca metrik maddeleri istedi
+    Anlatı/yorum gerekiyorsa None (→ LLM).
+    """
+    if not rows and listing_intent:
+        return "empty"
+    if insufficient:
+        return "insufficient"
+    if len(rows) == 1 and len(rows[0]) == 1:
+        return "singleton"
+    if mode in ("table_only", "bullets_only"):
+        return mode
+    return None
 
 
 def _extract_metric_candidates(rows: List[Dict[str, Any]]) -> list[str]:
@@ -233,57 +294,81 @@ def _is_data_insufficient(rows: List[Dict[str, Any]] | None, question: Optional[
 # Ana fonksiyon
 # ---------------------------
 
-def run(state: AgentState, cost: CostTracker, show_sql: bool, llm_service) -> AgentState:
+def _with_sql(txt: str, state: AgentState, show_sql: bool) -> str:
+    if show_sql and state.validated_sql:
+        txt += "\n\nKullanılan SQL:\n" + state.validated_sql
+    return txt
+
+
+def run(
+    state: AgentState,
+    cost: CostTracker,
+    show_sql: bool,
+    llm_service,
+    excerpt_format: str = "auto",
+    excerpt_budget_tokens: int = 1200,
+) -> AgentState:
     rows = state.rows_preview or []
     listing_intent = _is_listing_intent(state.question, state.validated_sql)
 
     insufficient, reason = _is_data_insufficient(rows, state.question)
 
-    # ÖZEL DURUM: Listeleme niyeti varsa ve hiç satır yoksa → "boş sonuç"
-    if not rows and listing_intent:
+    # Kullanıcı talimatından çıktı modunu belirle (planner tercihi önceliklidir)
+    mode = _detect_user_instruction(state.question or "")
+    pref = getattr(state, "output_pref", None)
+    if pref in ("table_only", "bullets_only"):
+        mode = pref
+
+    # LLM'e gitmeden önce: deterministik render yeterli mi?
+    path = _deterministic_path(rows, mode, listing_intent, insufficient)
+    state.summary_path = path or "llm"
+
+    if path == "empty":
         answer = (
             "EŞLEŞME BULUNAMADI\n"
             "- Sorgu koşullarına uyan kayıt bulunamadı. "
             "Filtre koşullarını kontrol etmeyi veya aralığı genişletmeyi deneyin."
         )
-        if show_sql and state.validated_sql:
-            answer += "\n\nKullanılan SQL:\n" + state.validated_sql
-        state.answer_text = answer
+        state.answer_text = _with_sql(answer, state, show_sql)
         log.info("Özet: listeleme niyeti, boş sonuç.")
         return state
 
-    # Genel kural: yetersizse 'YETERSİZ KANIT'
-    if insufficient:
+    if path == "insufficient":
         answer = (
             "YETERSİZ KANIT\n"
             f"- Gerekçe: {reason}\n"
             "- Öneri: Soru kapsamını netleştirin ya da tarih/filtre aralığını genişletin. "
             "Gerekirse alternatif bir toplulaştırma (ör. haftalık/aylık) deneyebiliriz."
         )
-        if show_sql and state.validated_sql:
-            answer += "\n\nKullanılan SQL:\n" + state.validated_sql
-        state.answer_text = answer
+        state.answer_text = _with_sql(answer, state, show_sql)
         log.info("Özet: yetersiz veri nedeniyle cevap verilmedi.")
         return state
 
-    # LLM'e küçük bir kesit ver (ilk 50 satır)
-    data_excerpt = json.dumps(rows[:50], ensure_ascii=False)
-
-    # Kullanıcı talimatından çıktı modunu belirle
-    # summarizer.run içinde:
-    mode = _detect_user_instruction(state.question or "")
-    pref = getattr(state, "output_pref", None)
-    if pref == "analyst" and mode == "default":
-        mode = "default"
-    elif pref == "table_only":
-        mode = "table_only"
-    elif pref == "bullets_only":
-        mode = "bullets_only"
-
+    if path:
+        rowcount = (state.execution_stats or {}).get("rowcount")
+        if path == "singleton":
+            txt = _render_singleton(rows)
+        elif path == "table_only":
+            txt = _render_table(rows, rowcount)
+        else:
+            txt = _render_bullets(rows)
+        state.answer_text = _with_sql(txt, state, show_sql)
+        log.info("Özet hazır (path=%s, LLM çağrısı yok).", path)
+        return state
 
     log.info("Summarizer mode: %s", mode)
 
-    # Mod'a göre system prompt
+    # LLM'e küçük bir kesit ver: token bütçesine sığan en kompakt gösterim (csv/columnar/sketch)
+    data_excerpt, excerpt_desc = encode_excerpt(
+        rows,
+        fmt=excerpt_format,
+        budget_tokens=excerpt_budget_tokens,
+        max_rows=MAX_TABLE_ROWS,
+        truncated=bool((state.execution_stats or {}).get("truncated")),
+    )
+    log.info("Excerpt: %s (~%d token).", excerpt_desc, CostTracker.est_tokens(data_excerpt))
+
+    # Mod'a göre system prompt (table_only / bullets_only deterministik render'a gider)
     if mode == "commentary":
         system_prompt = (
             "Sen kıdemli bir veri analistisın (Turkish only).\n"
@@ -300,22 +385,6 @@ def run(state: AgentState, cost: CostTracker, show_sql: bool, llm_service) -> Ag
             "SADECE verilen veri excerpt’ünü kullan. ÇIKTI: TEK cümlelik kısa yanıt.\n"
             "Uydurma yapma; ID yerine insan-okur alanları tercih et; istatistiksel güven iddiası kurma."
         )
-    elif mode == "table_only":
-        system_prompt = (
-            "Sen kıdemli bir veri analistisın (Turkish only).\n"
-            "SADECE verilen veri excerpt’ünü kullan.\n"
-            "ÇIKTI: Markdown tablo olarak yaz. Tablo düzgün formatlı olsun:\n"
-            " - Başlık satırı (| col1 | col2 |)\n"
-            " - Altına ayraç (|---|---|)\n"
-            " - Altına veriler\n"
-            "Ekstra yorum ekleme, sadece tablo yaz."
-        )
-    elif mode == "bullets_only":
-        system_prompt = (
-            "Sen kıdemli bir veri analistisın (Turkish only).\n"
-            "SADECE verilen veri excerpt’ünü kullan. ÇIKTI: Sadece madde madde metrikler yaz.\n"
-            "Her maddede alan adı ve değerleri ver; yorum/başlık ekleme."
-        )
     else:
         system_prompt = (
             "Sen kıdemli bir veri analistisın (Turkish only). "
@@ -344,7 +413,7 @@ def run(state: AgentState, cost: CostTracker, show_sql: bool, llm_service) -> Ag
     # User prompt
     user_prompt = (
         f"SORU:\n{state.question}\n\n"
-        f"VERI_EXCERPT (ilk 50 satır):\n{data_excerpt}\n\n"
+        f"VERI_EXCERPT ({excerpt_desc}):\n{data_excerpt}\n\n"
         f"EK_BILGI:\n{extras}\n\n"
         f"CIKTI_MODU: {mode}"
     )
@@ -354,67 +423,19 @@ def run(state: AgentState, cost: CostTracker, show_sql: bool, llm_service) -> Ag
 
     # ---- Deterministic istatistikler: genel toplam, ortalama, max/min ----
     try:
-        if rows:
-            gcol, mcol = _find_group_and_metric_cols(rows)
-            if mcol:
-                vals = []
-                for r in rows:
-                    try:
-                        if r.get(mcol) is not None:
-                            vals.append(float(r[mcol]))
-                    except Exception:
-                        pass
-                if vals:
-                    total = sum(vals)
-                    avg = total / len(vals)
-                    if gcol:
-                        sorted_rows = sorted(rows, key=lambda r: float(r.get(mcol) or 0), reverse=True)
-                        top_g, top_v = sorted_rows[0][gcol], sorted_rows[0][mcol]
-                        low_g, low_v = sorted_rows[-1][gcol], sorted_rows[-1][mcol]
-                        stats_text = (
-                        "### 📊 Hesaplanan İstatistikler\n"
-                        f"- Toplam: **{int(total) if float(total).is_integer() else round(total,2)}**\n"
-                        f"- Ortalama (grup başına): **{round(avg,2)}**\n"
-                        f"- En yüksek: **{top_g} ({top_v})**\n"
-                        f"- En düşük: **{low_g} ({low_v})**"
-)   
-                    else:
-                        stats_text = (
-                            f"\n\n**Hesaplanan İstatistikler**\n"
-                            f"- Toplam: **{int(total) if float(total).is_integer() else round(total, 2)}**\n"
-                            f"- Ortalama: **{round(avg, 2)}**"
-                        )
-                    # Her zaman 2 satır boşlukla ayır, Markdown başlığı gibi hizala
-                    txt = (txt or "").strip()
-                    if txt:
-                        txt += "\n\n---\n\n"   # ayırıcı çizgi
-                    txt += stats_text
-
+        stats_text = _stats_block(rows)
+        if stats_text:
+            # Her zaman 2 satır boşlukla ayır, Markdown başlığı gibi hizala
+            txt = (txt or "").strip()
+            if txt:
+                txt += "\n\n---\n\n"   # ayırıcı çizgi
+            txt += stats_text
     except Exception as _e:
         log.warning("Özet postprocess istatistikleri atlandı: %s", _e)
 
     # --- Postprocess: başlıklara göre yeniden formatla ---
     txt = _format_sections(txt or "")
 
-    # --- Postprocess: Tek kolon & tek satır sonucu güzelleştir ---
-    short2, table2 = _prettify_singleton_table(rows, state.question)
-    if short2 and table2:
-        # Kısa yanıtı ve tabloyu net biçimde yaz; LLM metnini ez.
-        txt = f"### 📝 \n{short2}\n\n### 🗂️ Tablo\n{table2}"
-
-    # Ek güvenlik: tek satır-tek kolon durumu yakalanmadıysa da düzelt
-    try:
-        if rows and len(rows) == 1:
-            cols = list(rows[0].keys())
-            vals = list(rows[0].values())
-            if len(cols) == 1:
-                col = cols[0]
-                val = vals[0]
-                pretty_table = f"| {col} |\n|---|\n| {val} |"
-                txt = f"Kısa Yanıt: {col} = {val}\n\n{pretty_table}"
-    except Exception as e:
-        log.warning("Tablo postprocess atlandı: %s", e)
-
     # Boş/çok kısa cevap güvenliği
     if not txt or len(txt.strip()) < 8:
         if rows:
@@ -430,7 +451,7 @@ def run(state: AgentState, cost: CostTracker, show_sql: bool, llm_service) -> Ag
                 for r in srt[:3]:
                     auto.append(f"- {r[gcol]}: {r[mcol]}")
                 auto.append("### 📈 Toplam / Ortalama")
-                auto.append(f"- Toplam: **{int(total) if float(total).is_integer() else round(total, 2)}**")
+                auto.append(f"- Toplam: **{_fmt_num(total)}**")
                 auto.append(f"- Ortalama: **{round(avg, 2)}**")
                 txt = "\n\n".join(auto)
             else:
@@ -443,10 +464,6 @@ def run(state: AgentState, cost: CostTracker, show_sql: bool, llm_service) -> Ag
                 "- Öneri: Soru kapsamını netleştirelim veya daha geniş bir veri aralığı deneyelim."
             )
 
-    # İstenirse SQL'i ekle
-    if show_sql and state.validated_sql:
-        txt += "\n\nKullanılan SQL:\n" + state.validated_sql
-
-    state.answer_text = txt
-    log.info("Özet hazır (mode=%s).", mode)
+    state.answer_text = _with_sql(txt, state, show_sql)
+    log.info("Özet hazır (mode=%s, path=llm).", mode)
     return state
@@ -0,0 +1,287 @@
+# nodes/template_matcher.py
+"""
+Deterministik şablon hızlı yolu (planner/schema ile qgen arası).
+
+Sık gelen soru kalıplarını ("X sayısı Y başına", "unit bazında ortalama yaş",
+"son N günde kaç oturum") şema varlıklarıyla eşleştirip LLM çağrısı olmadan
+SQL üretir. Her eşleşme bir güven skoru taşır: sorudaki içerik kelimelerinin
+ne kadarının şablon tarafından açıklandığı. Eşik altında kalırsa akış
+normal RAG → qgen (LLM) yoluna devam eder.
+
+Şablon SQL'lerine kullanıcı metni hiç girmez: varlık/tablo adları sabit
+sözlükten, sayısal parametreler (N gün, top N) ise int doğrulamasıyla gelir.
+"""
+import logging
+import re
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from utils.types import AgentState
+from utils.sql_utils import enforce_outer_limit
+from tools.db import schema_catalog
+
+log = logging.getLogger("tmpl")
+
+# --- Varlık sözlüğü (soru kelimesi → şema varlığı) ---------------------------
+ENTITIES: Dict[str, str] = {
+    "user": r"kullan[ıi]c[ıi]\w*|users?",
+    "unit": r"unit\w*|birim\w*|departman\w*",
+    "session": r"chat[ _]?sessions?|sessions?|oturum\w*|sohbet\w*",
+    "message": r"mesaj\w*|messages?",
+    "llm": r"llm\w*|provider\w*|sağlayıcı\w*",
+    "month": r"ay(?:a|lık|lara)?\b|months?|monthly",
+    "weekday": r"haftanın günler\w*|hafta ?günler\w*|weekdays?|day of (?:the )?week",
+}
+_ENT_ALT = "|".join(f"(?P<{k}>{v})" for k, v in ENTITIES.items())
+_ENT_RE = re.compile(rf"\b(?:{_ENT_ALT})")
+
+# Gruplama bağlaçları: "her Y için", "Y başına", "Y'ye göre", "Y bazında", "per/by/for each Y"
+_GROUP_RES = [
+    re.compile(rf"\bher (?P<g>{_ENT_ALT.replace('?P<', '?P<g_')})(?: \w+)? (?:için|bazında)"),
+    re.compile(rf"\b(?P<g>{_ENT_ALT.replace('?P<', '?P<g_')}) (?:başına|bazında|göre)"),
+    re.compile(rf"\b(?:per|by|for each|in each|each) (?P<g>{_ENT_ALT.replace('?P<', '?P<g_')})"),
+    re.compile(r"\b(?P<g_month>aylık|monthly)\b"),
+]
+
+_AGG_RES = {
+    "avg": re.compile(r"\b(?:ortalama\w*|average|avg|mean)\b"),
+    "sum": re.compile(r"\b(?:toplam\w*|total|sum)\b"),
+    "count": re.compile(r"\b(?:kaç|sayı\w*|count|number of|how many|adet)\b"),
+}
+_AGE_RE = re.compile(r"\b(?:yaş\w*|ages?)\b")
+_WINDOW_RE = re.compile(
+    r"\b(?:son|last|past|geçen) (?P<n>\d{1,4}) ?(?P<u>gün\w*|days?|hafta\w*|weeks?|ay\w*|months?|yıl\w*|years?)"
+)
+_TOP_RE = re.compile(r"\b(?:top|ilk|en çok kullanılan) (?P<n>\d{1,4})\b")
+_USAGE_RE = re.compile(r"\b(?:kullanım\w*|usage|kullanıl\w*|used)\b")
+
+# Şablonun açıklamasına gerek olmayan dolgu kelimeleri (TR/EN)
+STOPWORDS = frozenset("""
+nedir ne neler kaç tane var vardır sayısı sayısını toplam göster listele bana bir ve ile için her
+yapıldı yapılmış açılan açıldı oluşturulan kayıtlı mevcut olan içinde de da mı mi mu mü
+the of is are was were what how many number show list me all a an each in for there have has
+been per by total count give get return display please with their its to on
+""".split())
+
+_TOKEN_RE = re.compile(r"[0-9a-zçğıöşü_]+")
+
+
+def _norm(q: str) -> str:
+    # Küçük harf, '_' → boşluk, kesme işaretli ekler birleşik ("LLM'ler" → "llmler"), noktalama → boşluk
+    q = (q or "").replace("İ", "i").lower().replace("_", " ")
+    q = re.sub(r"['’]", "", q)
+    return " ".join(re.sub(r"[^\w\s]", " ", q).split())
+
+
+def _ent_of(m: re.Match, prefix: str = "") -> Optional[str]:
+    for k in ENTITIES:
+        if m.groupdict().get(prefix + k):
+            return k
+    return None
+
+
+def _window_sql(n: int, unit: str) -> str:
+    if unit.startswith(("gün", "day")):
+        return f"'-{n} day'"
+    if unit.startswith(("hafta", "week")):
+        return f"'-{n * 7} day'"
+    if unit.startswith(("ay", "month")):
+        return f"'-{n} month'"
+    return f"'-{n} year'"
+
+
+# --- Şablon kataloğu: (ölçü, hedef varlık, grup) → SQL üretici ---------------
+class Template(NamedTuple):
+    tables: Tuple[str, ...]                               # şemada bulunması gereken tablolar
+    build: Callable[[Optional[str], Optional[int]], str]  # (window_expr, top_n) → SQL
+    window: bool = False                                  # "son N gün" filtresini destekler mi?
+    top: bool = False                                     # "top N" sıralamasını destekler mi?
+
+
+def _order_top(order_col: str, top: Optional[int]) -> str:
+    return f" ORDER BY {order_col} DESC" + (f" LIMIT {top}" if top else "")
+
+
+TEMPLATES: Dict[Tuple[str, str, Optional[str]], Template] = {
+    ("count", "user", None): Template(("user",), lambda w, t: (
+        "SELECT COUNT(*) AS user_count FROM user"
+        + (f" WHERE created_at >= DATE('now', {w})" if w else "")), window=True),
+    ("count", "unit", None): Template(("unit",), lambda w, t: "SELECT COUNT(*) AS unit_count FROM unit"),
+    ("count", "llm", None): Template(("llm_providers",), lambda w, t: "SELECT COUNT(*) AS llm_count FROM llm_providers"),
+    ("count", "session", None): Template(("chat_session",), lambda w, t: (
+        "SELECT COUNT(*) AS session_count FROM chat_session"
+        + (f" WHERE message_date >= DATE('now', {w})" if w else "")), window=True),
+    ("count", "user", "unit"): Template(("user", "unit"), lambda w, t: (
+        "SELECT un.unit_name, COUNT(*) AS user_count FROM user u "
+        "JOIN unit un ON un.unit_id = u.unit_id GROUP BY un.unit_name" + _order_top("user_count", t)), top=True),
+    ("count", "session", "llm"): Template(("use_llm_service", "llm_providers", "chat_session"), lambda w, t: (
+        "SELECT l.llm_name, COUNT(DISTINCT us.chat_session_id) AS session_count FROM use_llm_service us "
+        "JOIN llm_providers l ON l.llm_id = us.llm_id"
+        + (" JOIN chat_session c ON c.chat_session_id = us.chat_session_id"
+           f" WHERE c.message_date >= DATE('now', {w})" if w else "")
+        + " GROUP BY l.llm_name" + _order_top("session_count", t)), window=True, top=True),
+    ("count", "session", "user"): Template(("message_into", "user"), lambda w, t: (
+        "SELECT u.name || ' ' || u.surname AS user_name, COUNT(DISTINCT mi.chat_session_id) AS session_count "
+        "FROM message_into mi JOIN user u ON u.user_id = mi.user_id GROUP BY mi.user_id"
+        + _order_top("session_count", t)), top=True),
+    ("count", "session", "month"): Template(("chat_session",), lambda w, t: (
+        "SELECT strftime('%Y-%m', message_date) AS month, COUNT(*) AS session_count FROM chat_session"
+        + (f" WHERE message_date >= DATE('now', {w})" if w else "")
+        + " GROUP BY month ORDER BY month"), window=True),
+    ("count", "session", "weekday"): Template(("chat_session",), lambda w, t: (
+        "SELECT strftime('%w', message_date) AS weekday, COUNT(*) AS session_count FROM chat_session"
+        + (f" WHERE message_date >= DATE('now', {w})" if w else "")
+        + " GROUP BY weekday ORDER BY weekday"), window=True),
+    ("usage", "llm", None): Template(("use_llm_service", "llm_providers"), lambda w, t: (
+        "SELECT l.llm_name, COUNT(*) AS usage_count FROM use_llm_service us "
+        "JOIN llm_providers l ON l.llm_id = us.llm_id GROUP BY l.llm_name" + _order_top("usage_count", t)), top=True),
+    ("avg_age", "user", None): Template(("user",), lambda w, t: "SELECT AVG(age) AS avg_age FROM user"),
+    ("avg_age", "user", "unit"): Template(("user", "unit"), lambda w, t: (
+        "SELECT un.unit_name, AVG(u.age) AS avg_age FROM user u "
+        "JOIN unit un ON un.unit_id = u.unit_id GROUP BY un.unit_name ORDER BY avg_age DESC")),
+    ("avg_messages", "session", None): Template(("chat_session",), lambda w, t: (
+        "SELECT AVG(num_of_mess) AS avg_messages FROM chat_session"
+        + (f" WHERE message_date >= DATE('now', {w})" if w else "")), window=True),
+    ("sum_messages", "message", "unit"): Template(("user", "unit", "message_into", "chat_session"), lambda w, t: (
+        "SELECT un.unit_name, SUM(c.num_of_mess) AS total_messages FROM user u "
+        "JOIN unit un ON un.unit_id = u.unit_id "
+        "JOIN message_into mi ON mi.user_id = u.user_id "
+        "JOIN chat_session c ON c.chat_session_id = mi.chat_session_id"
+        + (f" WHERE c.message_date >= DATE('now', {w})" if w else "")
+        + " GROUP BY un.unit_name" + _order_top("total_messages", t)), window=True, top=True),
+}
+
+
+def match(question: str) -> Optional[Dict]:
+    """
+    Soruyu şablon kataloğuna eşler.
+    Döndürür: {"name", "key", "confidence", "window", "top"} veya None.
+    Güven = şablonun KULLANDIĞI ifadelerin kapsadığı içerik kelimesi oranı;
+    kullanılmayan varlıklar, filtreler ("fazla", "distinct"...) güveni düşürür.
+    """
+    q = _norm(question)
+    if not q:
+        return None
+    explained: List[Tuple[int, int]] = []
+
+    def inside(a: int, b: int, spans=None) -> bool:
+        return any(x <= a and b <= y for x, y in (spans if spans is not None else explained))
+
+    # 1) Grup varlığı (bağlaç ile)
+    group = None
+    for rx in _GROUP_RES:
+        m = rx.search(q)
+        if m:
+            group = _ent_of(m, "g_")
+            explained.append(m.span())
+            break
+
+    # 2) Zaman penceresi ve top-N
+    window = None
+    m = _WINDOW_RE.search(q)
+    if m:
+        window = _window_sql(int(m.group("n")), m.group("u"))
+        explained.append(m.span())
+    top = None
+    m = _TOP_RE.search(q)
+    if m:
+        top = int(m.group("n"))
+        explained.append(m.span())
+
+    # 3) Ölçülen varlıklar (grup/pencere ifadeleri dışındakiler) ve agregat sözcükleri
+    ents: List[Tuple[str, Tuple[int, int]]] = []
+    for m in _ENT_RE.finditer(q):
+        if not inside(*m.span()):
+            ents.append((_ent_of(m), m.span()))
+    names = [e for e, _ in ents]
+    aggs = {k: rx.search(q) for k, rx in _AGG_RES.items()}
+    aggs = {k: m for k, m in aggs.items() if m}
+    age = _AGE_RE.search(q)
+    usage = _USAGE_RE.search(q)
+
+    # 4) Ölçü türü → (ölçü, hedef, grup) anahtarı ve kullanılan ifadeler
+    used = set()
+    target = names[0] if names else None
+    if age and "avg" in aggs:
+        measure, target, used = "avg_age", "user", {"user", "avg", "age"}
+    elif "message" in names and "avg" in aggs:
+        measure, target, used = "avg_messages", "session", {"message", "session", "avg"}
+        if group == "session":
+            group = None        # "oturum başına ortalama mesaj" = genel ortalama
+    elif "message" in names and ("sum" in aggs or "count" in aggs) and group:
+        measure, target, used = "sum_messages", "message", {"message", "sum", "count"}
+    elif usage and "llm" in (target, group) and "session" not in names:
+        measure, target, group, used = "usage", "llm", None, {"llm", "usage", "count"}
+    elif target and ("count" in aggs or group or top or window):
+        measure, used = "count", {target, "count", "sum"}
+        # "LLM başına oturum" ile "her LLM için kaç oturum" aynı şablon
+        if target == "llm" and "session" in names and group is None:
+            target, group = "session", "llm"
+            used.add("session")
+    else:
+        return None
+
+    key = (measure, target, group)
+    tpl = TEMPLATES.get(key)
+    if tpl is None or (window and not tpl.window) or (top and not tpl.top):
+        return None
+
+    spans = list(explained)
+    spans += [sp for e, sp in ents if e in used]
+    spans += [m.span() for k, m in aggs.items() if k in used]
+    if age and "age" in used:
+        spans.append(age.span())
+    if usage and "usage" in used:
+        spans.append(usage.span())
+
+    # 5) Güven: içerik kelimelerinin şablonca açıklanan oranı
+    content, hit = 0, 0
+    for m in _TOKEN_RE.finditer(q):
+        if m.group(0) in STOPWORDS:
+            continue
+        content += 1
+        if inside(*m.span(), spans=spans):
+            hit += 1
+    confidence = round(hit / content, 3) if content else 0.0
+    return {
+        "name": "_".join(x for x in key if x),
+        "key": key,
+        "confidence": confidence,
+        "window": window,
+        "top": top,
+    }
+
+
+def run(conn, state: AgentState, max_limit: int = 1000, min_confidence: float = 0.8) -> AgentState:
+    """
+    Şablon eşleşirse, gereken tablolar şemada varsa ve güven eşiği aşılırsa
+    state.candidate_sql doldurulur; aksi halde yalnızca template_match raporu
+    yazılır ve akış LLM yoluna gider.
+    """
+    state.template_match = None
+    try:
+        m = match(state.question or "")
+    except Exception as e:
+        log.warning("Şablon eşleştirme hatası: %s", e)
+        m = None
+    if not m:
+        log.info("Şablon eşleşmedi → LLM yolu.")
+        return state
+
+    catalog = schema_catalog(conn)
+    tpl = TEMPLATES[m["key"]]
+    missing = [t for t in tpl.tables if t not in catalog]
+    info = {k: m[k] for k in ("name", "confidence", "window", "top")}
+    if missing or m["confidence"] < min_confidence:
+        info["used"] = False
+        state.template_match = info
+        log.info("Şablon '%s' güven=%.2f (eşik %.2f), eksik tablo=%s → LLM yolu.",
+                 m["name"], m["confidence"], min_confidence, missing or "-")
+        return state
+
+    sql = enforce_outer_limit(tpl.build(m["window"], m["top"]), max_limit)
+    # Deterministik SQL: validator bu SQL için LLM-critic'i atlar (bkz. query_validator)
+    info.update(used=True, sql=sql)
+    state.template_match = info
+    state.candidate_sql = [sql]
+    log.info("Şablon '%s' (güven=%.2f) → SQL üretildi (LLM yok).", m["name"], m["confidence"])
+    return state
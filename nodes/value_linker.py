@@ -0,0 +1,24 @@
+# nodes/value_linker.py
+import logging
+from typing import Any, Dict
+
+from tools.values import value_index
+from utils.types import AgentState
+
+log = logging.getLogger("values")
+
+
+def run(conn, state: AgentState, vc: Dict[str, Any]) -> AgentState:
+    """
+    Sorudaki değerleri (birim/model/kişi adı...) FTS5 değer indeksiyle DB'deki tam literallere
+    eşler ve state.value_hints'e yazar (qgen bunları prompt'a ekler). İndeks yoksa/eskiyse
+    arka planda kurulur; bu istek ipucusuz devam eder.
+    """
+    idx = value_index(conn, vc)
+    if idx is None:
+        return state
+    hits = idx.lookup(state.question)
+    state.value_hints = [h.hint() for h in hits]
+    if hits:
+        log.info("Değer eşleşmeleri: %s", state.value_hints)
+    return state
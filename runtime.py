@@ -0,0 +1,100 @@
+# runtime.py — Paylaşılan çalışma zamanı: config + DB havuzu + LLM istemcisi + BİR KEZ derlenmiş graf
+#
+# main (CLI/REPL), eval koşucusu ve diğer giriş noktaları soru başına graf derlemek,
+# DB açmak veya model yüklemek yerine tek bir AgentRuntime örneğini paylaşır.
+# İstek başına değişen bağımlılıklar (CostTracker, havuzdan alınan bağlantı, SQL gösterimi,
+# RAG tercihi) LangGraph config["configurable"] ile düğümlere geçirilir (bkz. graph.build_graph).
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, NamedTuple, Optional
+
+from graph import build_graph
+from tools.db import ConnectionPool
+from utils.cost import CostTracker
+from utils.llm import make_llm
+from utils.tracing import get_tracer
+from utils.types import AgentState
+
+
+class Answer(NamedTuple):
+    state: AgentState          # nihai durum (answer_text, validated_sql, rows_preview ...)
+    cost: Dict[str, float]     # CostTracker.to_dict()
+    ms: float                  # uçtan uca süre
+
+
+class AgentRuntime:
+    def __init__(self, cfg: Dict[str, Any], llm_service=None, pool_size: Optional[int] = None):
+        self.cfg = cfg
+        db = cfg["db"]
+        self.pool = ConnectionPool(
+            db["path"],
+            size=pool_size or db.get("pool_size", 4),
+            timeout_ms=db["timeout_ms"],
+            max_instructions=db["max_instructions"],
+        )
+        self.llm = llm_service if llm_service is not None else make_llm(cfg)
+        # Bağlantı ve maliyet sayacı istek başına config ile gelir; graf tek sefer derlenir
+        self.graph = build_graph(None, cfg, None, self.llm)
+        self.tracer = get_tracer(cfg)
+
+    def _abandon(self, state: AgentState) -> None:
+        # Graf telemetry düğümüne ulaşmadan kesildiyse açık iz süreç boyunca sızmasın
+        if self.tracer is not None:
+            self.tracer.abandon(state.trace_id)
+
+    def new_cost(self) -> CostTracker:
+        return CostTracker(self.cfg["llm"]["price_per_1k_input"], self.cfg["llm"]["price_per_1k_output"])
+
+    def run_config(self, conn, cost: CostTracker, show_sql: Optional[bool] = None, rag_enabled: Optional[bool] = None) -> Dict[str, Any]:
+        conf: Dict[str, Any] = {"conn": conn, "cost": cost}
+        if show_sql is not None:
+            conf["show_sql"] = show_sql
+        if rag_enabled is not None:
+            conf["rag_enabled"] = rag_enabled
+        return {"recursion_limit": self.cfg["runtime"].get("recursion_limit", 50), "configurable": conf}
+
+    def ask(
+        self,
+        question: str,
+        show_sql: Optional[bool] = None,
+        rag_enabled: Optional[bool] = None,
+        cost: Optional[CostTracker] = None,
+    ) -> Answer:
+        """Tek soruyu uçtan uca çalıştırır (thread-safe; bağlantı havuzdan alınır)."""
+        cost = cost or self.new_cost()
+        t0 = time.perf_counter()
+        start = AgentState(question=question)
+        try:
+            with self.pool.connection() as conn:
+                out = self.graph.invoke(start, config=self.run_config(conn, cost, show_sql, rag_enabled))
+        finally:
+            self._abandon(start)
+        state = AgentState(**out) if isinstance(out, dict) else out
+        return Answer(state, cost.to_dict(), (time.perf_counter() - t0) * 1000)
+
+    def stream(
+        self,
+        question: str,
+        cost: Optional[CostTracker] = None,
+        show_sql: Optional[bool] = None,
+        rag_enabled: Optional[bool] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """graph.stream olaylarını ({düğüm: state_dict}) üretir; bağlantı akış bitene kadar tutulur."""
+        cost = cost or self.new_cost()
+        start = AgentState(question=question)
+        try:
+            with self.pool.connection() as conn:
+                yield from self.graph.stream(start, config=self.run_config(conn, cost, show_sql, rag_enabled))
+        finally:
+            self._abandon(start)
+
+    @contextmanager
+    def connection(self):
+        with self.pool.connection() as conn:
+            yield conn
+
+    def close(self) -> None:
+        self.pool.close()
+        close_llm = getattr(self.llm, "close", None)   # çok uç noktalı istemci: HTTP havuzları
+        if callable(close_llm):
+            close_llm()
@@ -1,29 +1,140 @@
 #tools/db.py
-import sqlite3, time, logging
-from typing import List, Dict, Any
+import os, queue, sqlite3, threading, time, logging
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional
+from utils.sql_utils import enforce_outer_limit
+from utils.tracing import record_cache, record_sql_steps
+from utils.metrics import SQL_ABORTS
 
 log = logging.getLogger("db")
 
+class _QueryClock:
+    # Son conn.execute() başlangıcı; progress handler timeout'u sorgu başına ölçülür.
+    __slots__ = ("t0",)
+
+    def __init__(self):
+        self.t0 = time.monotonic()
+
+
+class ReadOnlyConnection(sqlite3.Connection):
+    """
+    sqlite3.Connection + sorgu başına zaman sayacı: her execute() saati sıfırlar.
+    (Önceden sayaç bağlantı açılışından başlıyordu; uzun yaşayan bağlantıda timeout_ms
+    dolduktan sonra her büyük sorgu haksız yere kesiliyordu.)
+    """
+    clock: _QueryClock
+
+    def execute(self, sql, parameters=(), /):
+        self.clock.t0 = time.monotonic()
+        return super().execute(sql, parameters)
+
+    def executemany(self, sql, parameters, /):
+        self.clock.t0 = time.monotonic()
+        return super().executemany(sql, parameters)
+
+
 def connect_readonly(path: str, timeout_ms: int=4000, max_instructions: int=200000) -> sqlite3.Connection:
     # SQLite bağlantısını URI ile read-only (mode=ro) açar; böylece yazma/DDL engellenir.
     uri = f"file:{path}?mode=ro"  # read-only
-    conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False, factory=ReadOnlyConnection)
     conn.row_factory = sqlite3.Row  # Satırlara kolon isimleriyle erişmeyi sağlar.
 
-    # Zaman ölçümü: progress handler bu start zamanına göre timeout kontrolü yapacak.
-    start = time.time()
+    # Zaman ölçümü: progress handler, son execute() başlangıcına göre timeout kontrolü yapar.
+    # (handler conn'a değil saate referans tutar; conn ↔ handler döngüsü oluşmaz)
+    clock = conn.clock = _QueryClock()
+    step = max(1, max_instructions)
+    limit_s = timeout_ms / 1000.0
     def aborter():
         # progress handler belirli instruction aralığında çağrılır; burada süreye bakarak iptal edebiliriz.
-        if (time.time() - start)*1000 > timeout_ms:
+        record_sql_steps(step)  # aktif trace span'i varsa yaklaşık VM adımı (çağrı × aralık)
+        if time.monotonic() - clock.t0 > limit_s:
+            SQL_ABORTS.inc(reason="timeout")
             return 1  # 1 döndürmek sorguyu abort eder.
         return 0     # 0 devam anlamına gelir.
 
     # max_instructions: handler'ın çağrılma sıklığını belirler (her N instruction'da bir).
-    conn.set_progress_handler(aborter, max(1, max_instructions))
-    # Her çalıştırılan SQL ifadesini debug loglamak için trace callback.
-    conn.set_trace_callback(lambda s: log.debug("SQL> %s", s))
+    conn.set_progress_handler(aborter, step)
+    # SQL izleme yalnızca DEBUG açıkken kurulur (kapalıyken ifade başına Python çağrısı bile yok)
+    refresh_sql_tracing(conn)
     return conn
 
+def _trace_sql(stmt: str) -> None:
+    log.debug("SQL> %s", stmt)
+
+def refresh_sql_tracing(conn) -> bool:
+    """
+    'db' logger'ı DEBUG'a açıksa her ifadeyi loglayan trace callback'i kurar, değilse kaldırır.
+    Log seviyesi çalışma anında değişirse tekrar çağrılmalıdır. Kurulduysa True döner.
+    """
+    on = log.isEnabledFor(logging.DEBUG)
+    conn.set_trace_callback(_trace_sql if on else None)
+    return on
+
+class ConnectionPool:
+    """
+    Read-only bağlantı havuzu: en fazla `size` bağlantı, ilk ihtiyaçta açılır.
+    Her istek/iş parçacığı kendi bağlantısını alır (progress handler saati ve
+    imleçler bağlantı başınadır); paylaşılan tek bağlantıdaki yarışları önler.
+
+        with pool.connection() as conn:
+            ...
+    """
+
+    def __init__(self, path: str, size: int = 4, timeout_ms: int = 4000, max_instructions: int = 200000):
+        self.path = path
+        self.size = max(1, int(size))
+        self._kw = {"timeout_ms": timeout_ms, "max_instructions": max_instructions}
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._all: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _acquire(self, timeout: Optional[float]) -> sqlite3.Connection:
+        # Kapalılık boştaki kuyruktan ÖNCE bakılır: close() sonrası kapanmış bağlantı verilmesin
+        if self._closed:
+            raise RuntimeError("ConnectionPool kapalı")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("ConnectionPool kapalı")
+            if len(self._all) < self.size:
+                conn = connect_readonly(self.path, **self._kw)
+                self._all.append(conn)
+                return conn
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"DB havuzunda boş bağlantı yok ({self.size} dolu)") from None
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = 30.0):
+        conn = self._acquire(timeout)
+        try:
+            yield conn
+        finally:
+            if self._closed:
+                conn.close()
+            else:
+                self._idle.put(conn)
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            conns, self._all = self._all, []
+        while True:   # boştakiler de kapanıyor; kuyrukta kapalı bağlantı kalmasın
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
+        for c in conns:
+            try:
+                c.close()
+            except Exception:
+                pass
+
 def list_tables(conn) -> List[str]:
     # Kullanıcı tablolarını (sqlite_% hariç) ada göre sıralı getirir.
     cur = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name;")
@@ -37,6 +148,55 @@ def table_columns(conn, tbl: str) -> List[Dict[str, Any]]:
         out.append({"cid": r["cid"], "name": r["name"], "type": r["type"], "notnull": r["notnull"], "dflt": r["dflt_value"], "pk": r["pk"]})
     return out
 
+# (db yolu, schema_version) → {tablo: [kolonlar]}; şema değişmedikçe yeniden okunmaz
+_CATALOG_CACHE: Dict[tuple, Dict[str, List[str]]] = {}
+
+def db_key(conn) -> str:
+    # Bağlantının 'main' veritabanı dosya yolu; :memory: için bağlantı kimliği döner.
+    row = conn.execute("PRAGMA database_list;").fetchone()
+    path = row[2] if row else ""
+    return path or f"mem:{id(conn)}"
+
+def schema_catalog(conn) -> Dict[str, List[str]]:
+    """
+    Tablo → kolon adları kataloğu (hepsi küçük harf).
+    PRAGMA schema_version anahtarıyla cache'lenir; DDL olmadıkça
+    her çağrı iki ucuz PRAGMA'dan ibarettir.
+    """
+    ver = conn.execute("PRAGMA schema_version;").fetchone()[0]
+    key = (db_key(conn), ver)
+    cat = _CATALOG_CACHE.get(key)
+    record_cache("catalog", cat is not None)
+    if cat is None:
+        cat = {}
+        cur = conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table','view') AND name NOT LIKE 'sqlite_%';")
+        for (t,) in cur.fetchall():
+            cols = conn.execute(f'PRAGMA table_info("{t}");').fetchall()
+            cat[t.lower()] = [c[1].lower() for c in cols]
+        _CATALOG_CACHE[key] = cat
+        log.debug("Şema kataloğu yüklendi: %d tablo.", len(cat))
+    return cat
+
+def data_version(conn) -> tuple:
+    """
+    Veri sürümü belirteci: içerik (veya şema) değişince değişir.
+    PRAGMA data_version yalnızca AYNI bağlantı içinde karşılaştırılabilir; bağlantılar
+    arası tutarlılık için dosya (ve WAL) mtime/boyutu kullanılır. :memory: için
+    bağlantı kimliği + data_version.
+    """
+    schema_ver = conn.execute("PRAGMA schema_version;").fetchone()[0]
+    path = db_key(conn)
+    if path.startswith("mem:"):
+        return (schema_ver, path, conn.execute("PRAGMA data_version;").fetchone()[0])
+    stamp = [schema_ver]
+    for p in (path, path + "-wal"):
+        try:
+            st = os.stat(p)
+            stamp += [st.st_mtime_ns, st.st_size]
+        except OSError:
+            stamp += [0, 0]
+    return tuple(stamp)
+
 def schema_document(conn) -> str:
     # Basit metinsel şema çıktısı üretir: "Table T — columns: a:type, b:type, ..."
     parts = []
@@ -54,11 +214,15 @@ def explain_query_plan(conn, sql: str) -> str:
 
 def execute_preview(conn, sql: str, limit: int=1000, preview_rows: int=50):
     # Sorguyu çalıştırır; ilk 'preview_rows' satırı {kolon: değer} sözlükleri olarak döndürür.
-    cur = conn.execute(sql)
+    # Okunmayacak satırları DB'ye ürettirmemek için dış LIMIT'i preview_rows+1'e indiririz
+    # (+1: sonucun kesilip kesilmediğini anlamak için). ORDER BY + LIMIT'te SQLite
+    # tüm sıralama yerine sınırlı top-N sıralayıcı kullanır.
+    fetch = max(1, min(int(limit), int(preview_rows) + 1))
+    q = enforce_outer_limit(sql, fetch)
+    cur = conn.execute(q)
     colnames = [d[0] for d in cur.description] if cur.description else []
-    rows = []
-    for i, r in enumerate(cur.fetchall()):
-        if i >= preview_rows: break
-        rows.append({colnames[j]: r[j] for j in range(len(colnames))})
-    # Dönüş sözlüğü: kolon adları, örnek satırlar ve bu örneklerin sayısı (rowcount)
-    return {"columns": colnames, "rows": rows, "rowcount": len(rows)}
+    raw = cur.fetchmany(fetch)
+    truncated = len(raw) > preview_rows
+    rows = [{colnames[j]: r[j] for j in range(len(colnames))} for r in raw[:preview_rows]]
+    # Dönüş sözlüğü: kolon adları, örnek satırlar, bu örneklerin sayısı (rowcount) ve kesilme bilgisi
+    return {"columns": colnames, "rows": rows, "rowcount": len(rows), "truncated": truncated}
@@ -0,0 +1,158 @@
+# tools/dimensions.py
+"""
+Boyut (dimension) çözümleme: sonuçtaki ID kolonlarını insan-okur adlara çevirir.
+
+  - Boyutlar şema metadatasından bulunur: PRAGMA foreign_key_list ile referans
+    verilen tablo/anahtar çiftleri (user.unit_id → unit.unit_id ...). Etiket kolonu
+    hedef tablodaki *_name kolonu; yoksa name (+ surname) birleşimi.
+  - ID → ad eşlemeleri tablo başına cache'lenir ve yalnızca eksik ID'ler kolon başına
+    tek bir `IN (...)` sorgusuyla çekilir. Cache data_version değişince boşaltılır.
+
+Etiketi olmayan boyutlar (örn. chat_session: yalnızca tarih/sayı kolonları) çözülmez.
+"""
+from __future__ import annotations
+import logging
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from tools.db import db_key, data_version
+from utils.tracing import record_cache
+
+log = logging.getLogger("dim")
+
+# Tek IN (...) sorgusundaki en fazla parametre (eski SQLite derlemelerinde limit 999)
+IN_CHUNK = 500
+# Tablo başına cache'lenen en fazla ID; aşılırsa o tablo cache'i sıfırlanır
+MAX_CACHED_IDS = 50_000
+
+
+class Dimension(NamedTuple):
+    table: str       # boyut tablosu (unit)
+    key: str         # anahtar kolon (unit_id)
+    label_sql: str   # etiket ifadesi ("unit_name" veya "name || ' ' || surname")
+    label: str       # sonuçta kullanılacak kolon adı (unit_name / user_name)
+
+
+# (db yolu, schema_version) → {kolon_adı_lower: Dimension}
+_SPEC_CACHE: Dict[tuple, Dict[str, Dimension]] = {}
+# db yolu → (data_version, {tablo: {id: etiket}})
+_MAP_CACHE: Dict[str, Tuple[tuple, Dict[str, Dict[Any, Any]]]] = {}
+
+
+def _label_for(conn, table: str, key: str) -> Optional[Tuple[str, str]]:
+    cols = [(r[1], (r[2] or "").upper()) for r in conn.execute(f'PRAGMA table_info("{table}");')]
+    names = {c.lower(): c for c, _ in cols}
+    text = [c for c, t in cols if c.lower() != key.lower() and ("CHAR" in t or "TEXT" in t or not t)]
+    stem = key[:-3] if key.lower().endswith("_id") else table
+    for c in text:
+        if c.lower().endswith("_name"):
+            return f'"{c}"', c
+    if "name" in names:
+        expr = f'"{names["name"]}"'
+        if "surname" in names:
+            expr += f""" || ' ' || "{names['surname']}\""""
+        return expr, f"{stem}_name"
+    return None
+
+
+def dimensions(conn) -> Dict[str, Dimension]:
+    """
+    Sonuç kolon adı → Dimension. Hem FK kolonları (user.unit_id) hem de referans
+    verilen tabloların anahtarları (unit.unit_id) aynı boyuta eşlenir.
+    Şema sürümüyle cache'lenir.
+    """
+    ver = conn.execute("PRAGMA schema_version;").fetchone()[0]
+    ck = (db_key(conn), ver)
+    specs = _SPEC_CACHE.get(ck)
+    if specs is not None:
+        return specs
+    specs = {}
+    tables = [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';")]
+    for t in tables:
+        for fk in conn.execute(f'PRAGMA foreign_key_list("{t}");').fetchall():
+            ref_table, from_col, to_col = fk[2], fk[3], fk[4]
+            if not to_col:
+                # REFERENCES t (kolonsuz) → hedefin PK'sı
+                pk = [r[1] for r in conn.execute(f'PRAGMA table_info("{ref_table}");') if r[5]]
+                if len(pk) != 1:
+                    continue
+                to_col = pk[0]
+            lab = _label_for(conn, ref_table, to_col)
+            if not lab:
+                continue
+            dim = Dimension(ref_table, to_col, lab[0], lab[1])
+            specs.setdefault(from_col.lower(), dim)
+            specs.setdefault(to_col.lower(), dim)
+    _SPEC_CACHE[ck] = specs
+    log.debug("Boyutlar: %s", {k: d.table for k, d in specs.items()})
+    return specs
+
+
+def _table_cache(conn, table: str) -> Dict[Any, Any]:
+    key = db_key(conn)
+    ver = data_version(conn)
+    entry = _MAP_CACHE.get(key)
+    if entry is None or entry[0] != ver:
+        entry = (ver, {})
+        _MAP_CACHE[key] = entry
+    tc = entry[1].setdefault(table, {})
+    if len(tc) > MAX_CACHED_IDS:
+        tc.clear()
+    return tc
+
+
+def lookup(conn, dim: Dimension, ids) -> Dict[Any, Any]:
+    """ID kümesi → etiket. Cache'te olmayanlar tek (parçalı) IN sorgusuyla çekilir."""
+    cache = _table_cache(conn, dim.table)
+    missing = [i for i in ids if i not in cache]
+    record_cache("dimension", True, len(ids) - len(missing))
+    record_cache("dimension", False, len(missing))
+    for j in range(0, len(missing), IN_CHUNK):
+        chunk = missing[j:j + IN_CHUNK]
+        marks = ",".join("?" * len(chunk))
+        q = f'SELECT "{dim.key}", {dim.label_sql} FROM "{dim.table}" WHERE "{dim.key}" IN ({marks})'
+        found = dict(conn.execute(q, chunk).fetchall())
+        for i in chunk:
+            cache[i] = found.get(i)   # bulunamayanlar None olarak cache'lenir (tekrar sorulmaz)
+    return {i: cache[i] for i in ids if cache.get(i) is not None}
+
+
+def humanize_rows(conn, rows: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    Satırlardaki boyut ID kolonlarını etiketle değiştirir (kolon sırası korunur).
+    Etiket kolonu sonuçta zaten varsa ID kolonu yalnızca kaldırılır.
+    Çözülemeyen hücreler ham ID ile kalır.
+    Döndürür: (yeni satırlar, çözülen kolonlar)
+    """
+    if not rows:
+        return rows, []
+    specs = dimensions(conn)
+    cols = list(rows[0].keys())
+    plan: Dict[str, Tuple[Dimension, Dict[Any, Any]]] = {}
+    for c in cols:
+        dim = specs.get(c.lower())
+        if dim is None:
+            continue
+        ids = {r.get(c) for r in rows if isinstance(r.get(c), (str, int))}
+        if dim.label in cols:
+            plan[c] = (dim, {})
+            continue
+        mapping = lookup(conn, dim, list(ids)) if ids else {}
+        if mapping:
+            plan[c] = (dim, mapping)
+    if not plan:
+        return rows, []
+
+    out = []
+    for r in rows:
+        r2 = {}
+        for c in cols:
+            p = plan.get(c)
+            if p is None:
+                r2[c] = r.get(c)
+            elif p[0].label in cols:
+                continue      # etiket zaten sonuçta: ID'yi at
+            else:
+                v = r.get(c)
+                r2[p[0].label] = p[1].get(v, v)
+        out.append(r2)
+    return out, list(plan)
@@ -0,0 +1,351 @@
+# tools/intent.py
+"""
+Yerel intent sınıflandırıcı (TF-IDF + lojistik regresyon).
+
+Planner'ın kural listelerine ek olarak, LLM çağrısı yapmadan şu kararları verir:
+  - is_sql     : soru veritabanı sorgusu mu? (değilse graf hemen sonlanır)
+  - use_rag    : şema RAG ipuçlarına ihtiyaç var mı?
+  - use_critic : LLM-critic (semantic_check) çalıştırılmalı mı?
+
+Eğitim sklearn ile yapılır; model ağırlıkları düz JSON'a yazılır ve çıkarım saf
+Python ile yapılır. Böylece çalışma anında sklearn/numpy import edilmez ve model
+milisaniyeler içinde yüklenir.
+
+Eğitim / ölçüm:
+  python -m tools.intent train --eval eval/eval_questions.jsonl \
+      --log logs/questions.jsonl --out models/intent.json
+  python -m tools.intent evaluate     # çapraz doğrulamalı kesinlik/kapsam → planner.min_confidence
+"""
+from __future__ import annotations
+import argparse
+import json
+import logging
+import math
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from nodes.planner import RAG_TRIGGERS, NON_SQL_NOISE, NON_SQL_EDU
+from utils.tracing import record_cache
+
+log = logging.getLogger("intent")
+
+HEADS = ("is_sql", "use_rag", "use_critic")
+
+# Veritabanı dışı tohum örnekleri (planner'ın gürültü listelerine ek)
+SEED_NON_SQL = [
+    "merhaba", "selam nasılsın", "günaydın", "teşekkürler", "hello there", "hi how are you",
+    "bana bir şiir yaz", "write a poem about the sea", "bir hikaye anlat", "tell me a story",
+    "bugün hava nasıl", "what's the weather like", "bir şaka yap", "tell me a joke",
+    "sql injection nedir", "veritabanı nedir", "what is sql injection", "how to install python",
+    "how does it work", "sen kimsin", "who are you", "deneme", "test", "lol",
+    "iyi akşamlar", "görüşürüz", "kolay gelsin", "good morning", "thanks a lot", "bye",
+    "bana tarif ver", "give me a recipe for pasta", "python'da liste nasıl sıralanır",
+    "how do i write a for loop in java", "yapay zeka nedir", "what is machine learning",
+    "bir e-posta taslağı yaz", "write an email to my manager", "bunu ingilizceye çevir",
+    "translate this to german", "dünyanın en yüksek dağı hangisi", "who won the world cup",
+    "bana motivasyon ver", "what time is it", "normalizasyon nedir", "explain database indexing",
+    "join nedir açıklar mısın", "what is a primary key", "sql öğrenmek için kaynak önerir misin",
+    "tatil için nereye gideyim", "recommend a good movie", "kendini tanıt",
+]
+
+# Veritabanı soruları tohumu (eval dışı; SQL'i bilinmediğinden use_critic=1, use_rag kurallardan)
+SEED_SQL = [
+    "kaç kullanıcı var", "toplam kullanıcı sayısı", "how many users are there", "count the users",
+    "kaç birim var", "how many units exist", "birimleri listele", "list all units",
+    "kullanıcıları yaşa göre sırala", "list users ordered by age", "en yaşlı kullanıcı kim",
+    "who is the youngest user", "30 yaşından büyük kullanıcılar", "users older than 40",
+    "kullanıcıların isim ve soyisimleri", "show user names and surnames",
+    "birim başına kullanıcı sayısı", "number of users per unit", "finans birimindeki kullanıcılar",
+    "users in the engineering unit", "kaç oturum açıldı", "how many chat sessions in total",
+    "bugün kaç oturum var", "sessions created yesterday", "günlük oturum sayıları",
+    "daily session counts for the last week", "haftanın günlerine göre oturum dağılımı",
+    "session distribution by weekday", "oturum başına ortalama mesaj", "average messages per session",
+    "en çok mesaj içeren oturumlar", "sessions with more than 20 messages", "toplam mesaj sayısı",
+    "total number of messages this month", "hangi model en çok kullanıldı", "most used llm model",
+    "gpt-4 kaç kez kullanıldı", "how many times was claude used", "model başına kullanım sayısı",
+    "usage count per llm", "llm sağlayıcılarını listele", "list llm providers with their max tokens",
+    "sıcaklığı 1'den büyük modeller", "models with temperature above 0.7", "en düşük max_token değeri",
+    "kullanıcı başına oturum sayısı", "sessions per user", "hiç oturum açmamış kullanıcılar",
+    "users without any chat session", "geçen ay en aktif 10 kullanıcı", "top 10 active users last month",
+    "aylık yeni kullanıcı sayısı", "new users per month", "birim bazında ortalama mesaj sayısı",
+    "average messages per unit", "son 24 saatte kullanılan modeller", "llms used in the last 7 days",
+    "2025 yılında kaç oturum açıldı", "sessions in 2025 by month", "mesaj sayısı dağılımı",
+]
+
+_WS_RE = re.compile(r"\s+")
+_WORD_RE = re.compile(r"\w+")
+
+
+def _features(text: str) -> List[str]:
+    """
+    Kelime unigram'ları + kelime sınırlı karakter 2-4 gram'ları.
+    Karakter n-gram'ları yazım hatalarına (kulanıcı/kullanıcı) dayanıklıdır.
+    Eğitimde ve çıkarımda AYNI fonksiyon kullanılır.
+    """
+    t = _WS_RE.sub(" ", (text or "").lower().replace("_", " ")).strip()
+    feats = ["w:" + w for w in _WORD_RE.findall(t)]
+    for w in t.split():
+        w = f" {w} "
+        for n in (2, 3, 4):
+            if len(w) < n:
+                break
+            feats.extend(w[i:i + n] for i in range(len(w) - n + 1))
+    return feats
+
+
+class IntentClassifier:
+    """JSON'dan yüklenen, saf Python çıkarımlı çok başlıklı (multi-head) lineer model."""
+
+    def __init__(self, vocab: Dict[str, int], idf: List[float], heads: Dict[str, Tuple[Dict[int, float], float]]):
+        self.vocab = vocab
+        self.idf = idf
+        self.heads = heads
+
+    def _vector(self, text: str) -> Dict[int, float]:
+        counts: Dict[int, float] = {}
+        for f in _features(text):
+            j = self.vocab.get(f)
+            if j is not None:
+                counts[j] = counts.get(j, 0.0) + 1.0
+        vec = {j: c * self.idf[j] for j, c in counts.items()}
+        norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+        return {j: v / norm for j, v in vec.items()}
+
+    def predict(self, text: str) -> Dict[str, float]:
+        """Her başlık için pozitif sınıf olasılığı (0..1)."""
+        vec = self._vector(text)
+        out = {}
+        for name, (coef, b) in self.heads.items():
+            z = b + sum(v * coef.get(j, 0.0) for j, v in vec.items())
+            out[name] = 1.0 / (1.0 + math.exp(-z))
+        return out
+
+    # --- Kalıcılık -----------------------------------------------------------
+    def to_dict(self) -> dict:
+        return {
+            "version": 1,
+            "features": "w1+cwb2-4",
+            "vocab": self.vocab,
+            "idf": [round(x, 5) for x in self.idf],
+            "heads": {
+                k: {"coef": {str(j): round(w, 5) for j, w in coef.items() if abs(w) > 1e-5}, "intercept": round(b, 5)}
+                for k, (coef, b) in self.heads.items()
+            },
+        }
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path: str) -> "IntentClassifier":
+        with open(path, "r", encoding="utf-8") as f:
+            d = json.load(f)
+        heads = {
+            k: ({int(j): w for j, w in h["coef"].items()}, float(h["intercept"]))
+            for k, h in d["heads"].items()
+        }
+        return cls(d["vocab"], d["idf"], heads)
+
+
+# (yol, mtime) → model; dosya değişmedikçe tekrar okunmaz
+_MODEL_CACHE: Dict[Tuple[str, float], IntentClassifier] = {}
+
+
+def load_classifier(path: Optional[str]) -> Optional[IntentClassifier]:
+    """Model dosyası varsa (cache'li) yükler; yoksa/bozuksa None döner (planner kurallara düşer)."""
+    if not path or not os.path.exists(path):
+        return None
+    key = (os.path.abspath(path), os.path.getmtime(path))
+    clf = _MODEL_CACHE.get(key)
+    record_cache("intent_model", clf is not None)
+    if clf is None:
+        try:
+            clf = IntentClassifier.load(path)
+        except Exception as e:
+            log.warning("Intent modeli yüklenemedi (%s): %s", path, e)
+            return None
+        _MODEL_CACHE[key] = clf
+        log.info("Intent modeli yüklendi: %s (%d özellik).", path, len(clf.vocab))
+    return clf
+
+
+# --- Eğitim ------------------------------------------------------------------
+def _weak_labels(question: str, expected_sql: str = "") -> dict:
+    ql = question.lower()
+    sl = (expected_sql or "").lower()
+    return {
+        "is_sql": 1,
+        "use_rag": int(any(t in ql for t in RAG_TRIGGERS) or " join " in sl),
+        # JOIN/tarih penceresi/HAVING içeren sorgularda anlamsal hata riski yüksek
+        "use_critic": int(any(k in sl for k in (" join ", "date(", "strftime", " having "))),
+    }
+
+
+def load_samples(eval_paths: Iterable[str] = (), log_paths: Iterable[str] = ()) -> List[dict]:
+    """
+    Eğitim örnekleri:
+      - eval JSONL: {"question", "expected_sql"} → is_sql=1, diğerleri zayıf etiket
+      - log JSONL : {"question", "intent", "sql"?, "use_rag"?, "use_critic"?}
+                    (runtime.question_log kayıtları; elle düzeltilebilir)
+      - SEED_SQL → is_sql=1 (use_critic=1: SQL bilinmiyor)
+      - SEED_NON_SQL + planner gürültü listeleri → is_sql=0
+    """
+    samples: Dict[str, dict] = {}
+    for p in eval_paths:
+        with open(p, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    d = json.loads(line)
+                    samples[d["question"]] = {"question": d["question"], **_weak_labels(d["question"], d.get("expected_sql", ""))}
+    for p in log_paths:
+        if not os.path.exists(p):
+            log.warning("Soru logu bulunamadı: %s", p)
+            continue
+        with open(p, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                d = json.loads(line)
+                q = d.get("question")
+                if not q:
+                    continue
+                is_sql = int(d.get("intent", "sql_query") == "sql_query")
+                if is_sql:
+                    lab = _weak_labels(q, d.get("sql") or "")
+                    if not d.get("sql"):
+                        lab["use_critic"] = 1   # SQL bilinmiyorsa güvenli taraf
+                else:
+                    lab = {"is_sql": 0, "use_rag": 0, "use_critic": 0}
+                for k in ("use_rag", "use_critic"):
+                    if is_sql and k in d:
+                        lab[k] = int(bool(d[k]))
+                samples[q] = {"question": q, **lab}
+    for q in SEED_SQL:
+        samples.setdefault(q, {"question": q, "is_sql": 1, "use_rag": int(any(t in q for t in RAG_TRIGGERS)), "use_critic": 1})
+    for q in list(SEED_NON_SQL) + list(NON_SQL_NOISE) + list(NON_SQL_EDU):
+        samples.setdefault(q, {"question": q, "is_sql": 0, "use_rag": 0, "use_critic": 0})
+    return list(samples.values())
+
+
+def _platt(X, y, C: float, folds: int = 5) -> Optional[Tuple[float, float]]:
+    """
+    Platt ölçekleme: çapraz doğrulamada dışarıda kalan örneklerin karar değerleri z üzerinde
+    p = σ(a·z + b) öğrenir. Sınıf başına en az 2 örnek yoksa None (ölçeklemesiz).
+    """
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.model_selection import StratifiedKFold
+    k = min(folds, min(y.count(0), y.count(1)))
+    if k < 2:
+        return None
+    z = [0.0] * len(y)
+    for tr, te in StratifiedKFold(n_splits=k, shuffle=True, random_state=0).split(X, y):
+        m = LogisticRegression(C=C, max_iter=2000, class_weight="balanced").fit(X[tr], [y[i] for i in tr])
+        for i, v in zip(te, m.decision_function(X[te])):
+            z[i] = float(v)
+    # Düzenlileştirilmiş (C=1) kalibratör: küçük veride neredeyse ayrık z'ler dik sigmoid/aşırı güven üretmesin
+    cal = LogisticRegression(C=1.0, max_iter=2000).fit([[v] for v in z], y)
+    return float(cal.coef_[0][0]), float(cal.intercept_[0])
+
+
+def train(samples: List[dict], C: float = 50.0, calibrate: bool = True) -> IntentClassifier:
+    """
+    TF-IDF + LogisticRegression (başlık başına) eğitir ve JSON'a yazılabilir modele çevirir.
+    calibrate=True: olasılıklar Platt ölçeklemesiyle kalibre edilir; ölçek (a, b) lineer olduğundan
+    ağırlıklara katlanır (coef·a, intercept·a + b) ve çıkarım/JSON biçimi değişmez.
+    """
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+
+    texts = [s["question"] for s in samples]
+    vec = TfidfVectorizer(analyzer=_features, lowercase=False)
+    X = vec.fit_transform(texts)
+    vocab = {f: int(j) for f, j in vec.vocabulary_.items()}
+    idf = [float(x) for x in vec.idf_]
+
+    heads: Dict[str, Tuple[Dict[int, float], float]] = {}
+    # Alt başlıklar (rag/critic) yalnızca SQL örnekleri üzerinde anlamlı
+    sql_idx = [i for i, s in enumerate(samples) if s["is_sql"]]
+    for h in HEADS:
+        idx = list(range(len(samples))) if h == "is_sql" else sql_idx
+        y = [samples[i][h] for i in idx]
+        if len(set(y)) < 2:
+            # Tek sınıf: sabit karar (büyük bias)
+            heads[h] = ({}, 6.0 if (y and y[0]) else -6.0)
+            continue
+        clf = LogisticRegression(C=C, max_iter=2000, class_weight="balanced")
+        clf.fit(X[idx], y)
+        a, b = (_platt(X[idx], y, C) if calibrate else None) or (1.0, 0.0)
+        coef = {int(j): float(w) * a for j, w in enumerate(clf.coef_[0]) if abs(w * a) > 1e-5}
+        heads[h] = (coef, float(clf.intercept_[0]) * a + b)
+    return IntentClassifier(vocab, idf, heads)
+
+
+def evaluate(samples: List[dict], folds: int = 5, C: float = 50.0,
+             thresholds: Iterable[float] = (0.5, 0.6, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95)) -> dict:
+    """
+    is_sql başlığı için çapraz doğrulamalı kesinlik/kapsam eğrisi (her katmanda train() ile
+    kalibrasyon dahil yeniden eğitim). Eşik t'de model p ≥ t → sql, p ≤ 1 − t → non_sql karar verir;
+    arası kurallara düşer. coverage: modelin karar verdiği oran; precision: bu kararların doğruluğu.
+    """
+    from sklearn.model_selection import StratifiedKFold
+    y = [s["is_sql"] for s in samples]
+    p = [0.0] * len(samples)
+    for tr, te in StratifiedKFold(n_splits=folds, shuffle=True, random_state=1).split(y, y):
+        m = train([samples[i] for i in tr], C=C)
+        for i in te:
+            p[i] = m.predict(samples[i]["question"])["is_sql"]
+    curve = []
+    for t in thresholds:
+        decided = [(pi >= t, yi) for pi, yi in zip(p, y) if pi >= t or pi <= 1 - t]
+        correct = sum(int(d) == yi for d, yi in decided)
+        curve.append({
+            "threshold": t,
+            "coverage": round(len(decided) / len(y), 3),
+            "precision": round(correct / len(decided), 3) if decided else None,
+            "wrong": len(decided) - correct,
+        })
+    return {"n": len(y), "n_sql": sum(y), "curve": curve,
+            "heldout": {s["question"]: round(pi, 3) for s, pi in zip(samples, p)}}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Planner intent sınıflandırıcısını eğit")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    t = sub.add_parser("train")
+    t.add_argument("--eval", action="append", default=[], help="eval JSONL (birden çok verilebilir)")
+    t.add_argument("--log", action="append", default=[], help="soru logu JSONL (birden çok verilebilir)")
+    t.add_argument("--out", default="models/intent.json")
+    e = sub.add_parser("evaluate", help="is_sql için çapraz doğrulamalı kesinlik/kapsam eğrisi")
+    e.add_argument("--eval", action="append", default=[])
+    e.add_argument("--log", action="append", default=[])
+    e.add_argument("--folds", type=int, default=5)
+    p = sub.add_parser("predict")
+    p.add_argument("--model", default="models/intent.json")
+    p.add_argument("question")
+    args = ap.parse_args()
+
+    if args.cmd == "train":
+        samples = load_samples(args.eval or ["eval/eval_questions.jsonl"], args.log)
+        model = train(samples)
+        model.save(args.out)
+        n_sql = sum(s["is_sql"] for s in samples)
+        print(f"[i] {len(samples)} örnek ({n_sql} sql / {len(samples) - n_sql} non_sql) → {args.out}")
+    elif args.cmd == "evaluate":
+        samples = load_samples(args.eval or ["eval/eval_questions.jsonl"], args.log)
+        rep = evaluate(samples, folds=args.folds)
+        print(f"{rep['n']} örnek ({rep['n_sql']} sql), {args.folds} katlı çapraz doğrulama (is_sql):")
+        print("  eşik  kapsam  kesinlik  yanlış")
+        for c in rep["curve"]:
+            print(f"  {c['threshold']:.2f}  {c['coverage']:.3f}   {c['precision'] if c['precision'] is not None else '-':<8}  {c['wrong']}")
+    else:
+        clf = load_classifier(args.model)
+        if clf is None:
+            raise SystemExit(f"Model bulunamadı: {args.model}")
+        print(json.dumps({k: round(v, 3) for k, v in clf.predict(args.question).items()}))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,31 @@
 # tools/rag.py
+#
+# Ağır bağımlılıklar (numpy, sklearn, sentence_transformers → torch) modül yüklenirken DEĞİL,
+# indeks ilk kurulduğunda import edilir: RAG'e hiç uğramayan istekler (RAG kapalı, non_sql,
+# şablon yolu) bu maliyeti ödemez.
+#
+# Arama:
+#   - Skorlama matris çarpımıdır: TF-IDF satırları L2-normalize (kosinüs = nokta çarpım, seyrek
+#     matris çarpımı zaten ters indeks gibi yalnızca ortak terimli belgelere dokunur); embedding'ler
+#     float32 ve normalize.
+#   - En iyi k seçimi np.argpartition ile O(N) (tam sıralama yok), yalnızca k aday sıralanır.
+#   - query_batch(sorular): tüm sorular tek seferde normalize/encode edilir, tek matris çarpımıyla
+#     skorlanır. query(q) = query_batch([q])[0].
+#   - Büyük korpuslarda (ivf.min_docs üzeri) embedding araması için IVF: belgeler k-means ile
+#     nlist kümeye ayrılır, sorgu yalnızca en yakın nprobe kümedeki belgeleri tarar (yaklaşık arama).
 from __future__ import annotations
-from typing import List, Tuple, Optional
+from typing import Any, Dict, List, Tuple, Optional
+import importlib.util
 import re
-import numpy as np
+import threading
 
-# TF-IDF tabanlı metin vektörizasyonu ve benzerlik
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+IVF_DEFAULTS = {"min_docs": 50000, "nlist": 0, "nprobe": 8, "seed": 0}
+_BATCH = 256   # query_batch'te aynı anda skorlanan soru sayısı (skor matrisi belleğini sınırlar)
 
-# Opsiyonel: SentenceTransformer (embedding) varsa hybrid mod daha güçlü olur
-try:
-    from sentence_transformers import SentenceTransformer
-    HAS_ST = True
-except Exception:
-    HAS_ST = False
+
+def has_sentence_transformers() -> bool:
+    """Paket kurulu mu? (import etmeden; torch yüklemesi ilk kullanıma kalır)"""
+    return importlib.util.find_spec("sentence_transformers") is not None
 
 def _pick_device():
     try:
@@ -34,12 +46,12 @@ class Embedder:
             self.device = "cpu"
             print(f"[RAG] sentence-transformers yüklenemedi ({e}); TF-IDF fallback kullanılacak.")
 
-    def encode(self, texts: list[str]) -> "np.ndarray":
+    def encode(self, texts: list[str]):
         if self.model:
             return self.model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
         # TF-IDF fallback:
-        from sklearn.feature_extraction.text import TfidfVectorizer
         import numpy as np
+        from sklearn.feature_extraction.text import TfidfVectorizer
         vec = TfidfVectorizer(ngram_range=(1,2), min_df=1)
         X = vec.fit_transform(texts)
         return X.toarray() / (np.linalg.norm(X.toarray(), axis=1, keepdims=True) + 1e-8)
@@ -53,56 +65,136 @@ def _normalize(text: str) -> str:
     return t
 
 
+def _topk(scores, top_k: int, min_score: float) -> List[Tuple[int, float]]:
+    """Skor vektöründen en iyi k (indeks, skor): argpartition O(N) + yalnızca k adayın sıralanması."""
+    import numpy as np
+    n = scores.shape[0]
+    k = min(int(top_k), n)
+    if k <= 0:
+        return []
+    idx = np.argpartition(-scores, k - 1)[:k] if k < n else np.arange(n)
+    idx = idx[np.argsort(-scores[idx], kind="stable")]
+    return [(int(i), float(scores[i])) for i in idx if scores[i] >= min_score]
+
+
+class DenseIndex:
+    """
+    Normalize float32 vektörler üzerinde iç çarpım araması.
+    Belge sayısı ivf.min_docs'u aşarsa IVF (k-means kümeleri + nprobe küme taraması) kurulur.
+    """
+    def __init__(self, X, ivf: Optional[Dict[str, Any]] = None):
+        import numpy as np
+        self.X = np.ascontiguousarray(X, dtype=np.float32)
+        self.ivf = {**IVF_DEFAULTS, **(ivf or {})}
+        self.centroids = None
+        self.lists: List[Any] = []
+        if self.ivf["min_docs"] and len(self.X) >= int(self.ivf["min_docs"]):
+            self._build_ivf()
+
+    def _build_ivf(self, iters: int = 10) -> None:
+        import numpy as np
+        n = len(self.X)
+        nlist = min(n, int(self.ivf["nlist"]) or max(1, int(np.sqrt(n))))
+        rng = np.random.default_rng(int(self.ivf["seed"]))
+        # Küresel k-means (kosinüs): örneklem üzerinde eğit, tüm belgeleri ata
+        sample = self.X[rng.choice(n, size=min(n, nlist * 64), replace=False)]
+        C = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iters):
+            assign = np.argmax(sample @ C.T, axis=1)
+            for c in range(nlist):
+                members = sample[assign == c]
+                if len(members):
+                    C[c] = members.sum(axis=0)
+            C /= np.linalg.norm(C, axis=1, keepdims=True) + 1e-12
+        assign = np.concatenate([np.argmax(self.X[i:i + 8192] @ C.T, axis=1) for i in range(0, n, 8192)])
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(nlist + 1))
+        self.centroids = C
+        self.lists = [order[bounds[c]:bounds[c + 1]] for c in range(nlist)]
+
+    def candidates(self, q) -> Optional[Any]:
+        """IVF varsa sorgunun en yakın nprobe kümesindeki belge indeksleri; yoksa None (tümü)."""
+        import numpy as np
+        if self.centroids is None:
+            return None
+        nprobe = min(int(self.ivf["nprobe"]), len(self.lists))
+        cs = self.centroids @ q
+        probe = np.argpartition(-cs, nprobe - 1)[:nprobe] if nprobe < len(cs) else np.arange(len(cs))
+        return np.concatenate([self.lists[c] for c in probe])
+
+    def search(self, Q, top_k: int, min_score: float) -> List[List[Tuple[int, float]]]:
+        import numpy as np
+        Q = np.asarray(Q, dtype=np.float32)
+        out: List[List[Tuple[int, float]]] = []
+        for s in range(0, len(Q), _BATCH):
+            Qb = Q[s:s + _BATCH]
+            if self.centroids is None:
+                S = Qb @ self.X.T
+                out.extend(_topk(S[i], top_k, min_score) for i in range(len(Qb)))
+                continue
+            for q in Qb:
+                cand = self.candidates(q)
+                out.append([(int(cand[i]), sc) for i, sc in _topk(self.X[cand] @ q, top_k, min_score)])
+        return out
+
+
 class _TFIDFRAG:
     """Sadece TF-IDF tabanlı basit RAG."""
     def __init__(self, docs: List[str]):
+        import numpy as np
         # Orijinal metinler ve normalize edilmiş haller
         self.raw_docs = docs
         self.docs = [_normalize(d) for d in docs]
-        # Stopwords kullanmıyoruz (TR/EN karışık kısa satırlar); 1-2 gram tercih ediliyor
-        self.vectorizer = TfidfVectorizer(ngram_range=(1, 2), min_df=1, token_pattern=r"(?u)\b\w+\b")
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        # Stopwords kullanmıyoruz (TR/EN karışık kısa satırlar); 1-2 gram tercih ediliyor.
+        # norm="l2" (varsayılan): satırlar birim uzunlukta → kosinüs = nokta çarpım
+        self.vectorizer = TfidfVectorizer(ngram_range=(1, 2), min_df=1, token_pattern=r"(?u)\b\w+\b", dtype=np.float32)
         self.X = self.vectorizer.fit_transform(self.docs)  # Doküman matrisini hazırla
+        self._XT = self.X.T.tocsr()                         # Skorlama için (terim × belge)
 
-    def query(self, q: str, top_k: int = 5, min_score: float = 0.1) -> List[Tuple[float, str]]:
-        # Sorguyu TF-IDF uzayına projekte et
-        qv = self.vectorizer.transform([_normalize(q)])
-        # Kozinüs benzerliği ile skorla
-        scores = cosine_similarity(qv, self.X).ravel()
-        # En yüksekten düşüğe sırala
-        order = np.argsort(-scores)
-        out: List[Tuple[float, str]] = []
-        # İlk top_k sonucu, eşik üstünde ise döndür
-        for i in order[:top_k]:
-            s = float(scores[i])
-            if s >= min_score:
-                out.append((s, self.raw_docs[i]))
+    def scores(self, normalized: List[str]):
+        """Normalize edilmiş sorular → (soru × belge) yoğun skor matrisi (float32)."""
+        return (self.vectorizer.transform(normalized) @ self._XT).toarray()
+
+    def query_batch(self, questions: List[str], top_k: int = 5, min_score: float = 0.1) -> List[List[Tuple[float, str]]]:
+        qs = [_normalize(q) for q in questions]
+        out = []
+        for s in range(0, len(qs), _BATCH):
+            S = self.scores(qs[s:s + _BATCH])
+            out.extend([(sc, self.raw_docs[i]) for i, sc in _topk(row, top_k, min_score)] for row in S)
         return out
 
+    def query(self, q: str, top_k: int = 5, min_score: float = 0.1) -> List[Tuple[float, str]]:
+        return self.query_batch([q], top_k, min_score)[0]
+
 
 class _EmbeddingRAG:
     """Sadece embedding tabanlı RAG (SentenceTransformer gerekir)."""
-    def __init__(self, docs: List[str], model_name: str = "paraphrase-MiniLM-L6-v2"):
-        if not HAS_ST:
+    def __init__(self, docs: List[str], model_name: str = "paraphrase-MiniLM-L6-v2", ivf: Optional[Dict[str, Any]] = None):
+        if not has_sentence_transformers():
             raise RuntimeError("sentence_transformers yüklü değil.")
+        from sentence_transformers import SentenceTransformer
         self.raw_docs = docs
         self.docs = [_normalize(d) for d in docs]
         # Embedding modeli
         self.embedder = SentenceTransformer(model_name)
-        # Doküman embedding'leri (normalize edilmiş)
-        self.X = self.embedder.encode(self.docs, normalize_embeddings=True)
+        # Doküman embedding'leri (normalize, float32; büyük korpusta IVF)
+        self.index = DenseIndex(self.encode(self.docs), ivf=ivf)
+
+    @property
+    def X(self):
+        return self.index.X
+
+    def encode(self, normalized: List[str]):
+        import numpy as np
+        return np.asarray(self.embedder.encode(normalized, normalize_embeddings=True, convert_to_numpy=True), dtype=np.float32)
+
+    def query_batch(self, questions: List[str], top_k: int = 5, min_score: float = 0.1) -> List[List[Tuple[float, str]]]:
+        Q = self.encode([_normalize(q) for q in questions])
+        return [[(sc, self.raw_docs[i]) for i, sc in hits] for hits in self.index.search(Q, top_k, min_score)]
 
     def query(self, q: str, top_k: int = 5, min_score: float = 0.1) -> List[Tuple[float, str]]:
-        # Sorgu embedding'i (normalize edilmiş)
-        qv = self.embedder.encode([_normalize(q)], normalize_embeddings=True)[0]
-        # Kozinüs için normalize vektörlerle dot product yeterli
-        scores = np.dot(self.X, qv)
-        order = np.argsort(-scores)
-        out: List[Tuple[float, str]] = []
-        for i in order[:top_k]:
-            s = float(scores[i])
-            if s >= min_score:
-                out.append((s, self.raw_docs[i]))
-        return out
+        return self.query_batch([q], top_k, min_score)[0]
 
 
 class HybridRAG:
@@ -110,41 +202,49 @@ class HybridRAG:
     Hybrid RAG: TF-IDF (+ opsiyonel embedding).
     Embedding yoksa TF-IDF tek başına çalışır.
     """
-    def __init__(self, docs: List[str], embed_model: str = "paraphrase-MiniLM-L6-v2", alpha: float = 0.5):
+    def __init__(self, docs: List[str], embed_model: str = "paraphrase-MiniLM-L6-v2", alpha: float = 0.5,
+                 ivf: Optional[Dict[str, Any]] = None):
         # TF-IDF tarafı her zaman aktif
         self.tfidf = _TFIDFRAG(docs)
         self.embed: Optional[_EmbeddingRAG] = None
         self.alpha = float(alpha)
         # SentenceTransformer varsa embedding modunu da hazırla
-        if HAS_ST:
+        if has_sentence_transformers():
             try:
-                self.embed = _EmbeddingRAG(docs, model_name=embed_model)
+                self.embed = _EmbeddingRAG(docs, model_name=embed_model, ivf=ivf)
             except Exception:
                 # Embedding başaramazsa (model indirilemedi vs.) sessizce TF-IDF'e düş
                 self.embed = None
 
-    def query(self, q: str, top_k: int = 5, min_score: float = 0.1) -> List[Tuple[float, str]]:
-        # TF-IDF skorları
-        qv = self.tfidf.vectorizer.transform([_normalize(q)])
-        tf_scores = cosine_similarity(qv, self.tfidf.X).ravel()
-
-        # Embedding skorları (varsa) ve karışım
-        if self.embed is not None:
-            qv_emb = self.embed.embedder.encode([_normalize(q)], normalize_embeddings=True)[0]
-            emb_scores = np.dot(self.embed.X, qv_emb)
-            scores = self.alpha * emb_scores + (1.0 - self.alpha) * tf_scores
-        else:
-            scores = tf_scores
-
-        # Skorları sırala ve top_k + min_score filtresi uygula
-        order = np.argsort(-scores)
-        out: List[Tuple[float, str]] = []
-        for i in order[:top_k]:
-            s = float(scores[i])
-            if s >= min_score:
-                out.append((s, self.tfidf.raw_docs[i]))  # Orijinal metni döndür
+    def query_batch(self, questions: List[str], top_k: int = 5, min_score: float = 0.1) -> List[List[Tuple[float, str]]]:
+        import numpy as np
+        raw = self.tfidf.raw_docs
+        qs = [_normalize(q) for q in questions]   # tek normalizasyon; iki taraf da aynı metni kullanır
+        out: List[List[Tuple[float, str]]] = []
+        for s in range(0, len(qs), _BATCH):
+            chunk = qs[s:s + _BATCH]
+            T = self.tfidf.scores(chunk)
+            if self.embed is None:
+                out.extend([(sc, raw[i]) for i, sc in _topk(row, top_k, min_score)] for row in T)
+                continue
+            E = self.embed.encode(chunk)
+            index = self.embed.index
+            if index.centroids is None:
+                # Tam arama: skor karışımı tek matris çarpımıyla
+                S = self.alpha * (E @ index.X.T) + (1.0 - self.alpha) * T
+                out.extend([(sc, raw[i]) for i, sc in _topk(row, top_k, min_score)] for row in S)
+                continue
+            # IVF: adaylar = yakın kümeler ∪ TF-IDF'in en iyileri; karışım yalnızca adaylarda
+            for e, t in zip(E, T):
+                lex = np.argpartition(-t, min(len(t), top_k * 10) - 1)[:top_k * 10] if len(t) > top_k * 10 else np.arange(len(t))
+                cand = np.unique(np.concatenate([index.candidates(e), lex]))
+                sc = self.alpha * (index.X[cand] @ e) + (1.0 - self.alpha) * t[cand]
+                out.append([(s_, raw[cand[i]]) for i, s_ in _topk(sc, top_k, min_score)])
         return out
 
+    def query(self, q: str, top_k: int = 5, min_score: float = 0.1) -> List[Tuple[float, str]]:
+        return self.query_batch([q], top_k, min_score)[0]
+
 
 # --- Geriye dönük uyumluluk: graph.py SimpleRAG bekliyor ---
 class SimpleRAG(HybridRAG):
@@ -163,4 +263,21 @@ def get_rag(docs: List[str], prefer: str = "hybrid") -> HybridRAG | _TFIDFRAG:
     return HybridRAG(docs)
 
 
-__all__ = ["SimpleRAG", "HybridRAG", "get_rag"]
+# Belge kümesi → indeks; süreçte bir kez kurulur (graf, Streamlit oturumları ve warm-up paylaşır)
+_SHARED: dict = {}
+_SHARED_LOCK = threading.Lock()
+
+
+def shared_rag(docs: List[str], ivf: Optional[Dict[str, Any]] = None) -> SimpleRAG:
+    """Aynı belge listesi için süreç genelinde tek SimpleRAG (thread-safe, ilk çağrıda kurulur)."""
+    key = (hash(tuple(docs)), tuple(sorted((ivf or {}).items())))
+    rag = _SHARED.get(key)
+    if rag is None:
+        with _SHARED_LOCK:
+            rag = _SHARED.get(key)
+            if rag is None:
+                rag = _SHARED[key] = SimpleRAG(docs, ivf=ivf)
+    return rag
+
+
+__all__ = ["SimpleRAG", "HybridRAG", "DenseIndex", "get_rag", "shared_rag"]
@@ -0,0 +1,693 @@
+# tools/rollups.py
+"""
+Ön-agregat (rollup) tabloları ve otomatik sorgu yeniden yazımı.
+
+Analist yükünün çoğu birkaç agregat kalıbıdır (günlük oturum sayıları, birim başına ortalamalar,
+model başına kullanım). Bu kalıplar için kaynak tablolar bir yan SQLite dosyasında
+(varsayılan <db>.rollup.db) önceden gruplanır; doğrulanmış SQL bir rollup'tan yanıtlanabiliyorsa
+yürütücü onu şeffaf biçimde rollup'ı okuyacak şekilde yeniden yazar (kullanıcıya gösterilen SQL
+değişmez; execution_stats'ta rollup adı ve yeniden yazılmış SQL görünür).
+
+Rollup'lar (ROLLUPS): taban tablo + düz kolon boyutları (+ opsiyonel gün boyutu: date(kolon) → day)
+ve ölçüler: n = COUNT(*), her sayısal kolon için cnt_/sum_/min_/max_, COUNT(DISTINCT) için dn_.
+
+Yeniden yazım kuralları (muhafazakâr; emin olunamayan her şeyde None → taban sorgu çalışır):
+  - Tek SELECT bloğu: WITH/alt sorgu/UNION/pencere fonksiyonu/`*` yok; sorgu agregat olmalı.
+  - FROM: taban tablo + yalnızca boyut kolonu üzerinden `a.x = b.y` ile JOIN edilen diğer tablolar.
+    LEFT JOIN yalnızca taban tablo korunan (sol) taraftaysa; RIGHT/FULL JOIN hiç yeniden yazılmaz.
+  - Taban tablo kolonları yalnızca şu bağlamlarda:
+      boyut kolonu (düz)                      → aynen (rollup'ta aynı adla var)
+      COUNT(*) / COUNT(k) / SUM / TOTAL / AVG / MIN / MAX (k ölçü kolonu) → yeniden agregasyon
+      MIN/MAX/COUNT(DISTINCT boyut)            → aynen
+      COUNT(DISTINCT k) (dn_ ölçüsü)           → yalnızca JOIN yokken ve GROUP BY tüm boyutları içerirken
+      gün kaynağı: date(k), strftime('<yalnızca tarih alanları>', k),
+                   k >= X / k < X (X: DATE(...) veya 'YYYY-MM-DD')  → day üzerinden
+  - Yan dosyanın data_version damgası kaynak DB'ninkiyle aynı değilse (ETL sonrası) yeniden yazım
+    yapılmaz; rollup'lar arka planda yeniden kurulur.
+
+CLI:
+    python -m tools.rollups build  [--db data/app.db]     # ETL yenilemesinden sonra çağrılır
+    python -m tools.rollups verify [--db data/app_x100.db] [--queries q.sql]
+        → örnek + eval sorgularında taban ve yeniden yazılmış sorgu sonuçlarını karşılaştırır
+          (repo'da test paketi yok; doğruluk kontrolü bu komuttur), süreleri raporlar.
+"""
+from __future__ import annotations
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from tools import sidecar
+from tools.db import connect_readonly, data_version, db_key, schema_catalog
+from utils.sql_utils import SqlToken, tokenize_sql
+
+log = logging.getLogger("rollup")
+
+ROLLUP_DEFAULTS = {"enabled": True, "path": None}
+SCHEMA = "rollup"   # yan dosyanın ATTACH adı
+
+
+class Rollup(NamedTuple):
+    name: str                       # yan dosyadaki tablo adı
+    base: str                       # kaynak tablo
+    dims: Tuple[str, ...]           # düz boyut kolonları (rollup'ta aynı adla)
+    day: Optional[str]              # gün boyutu kaynağı: date(day) → "day" kolonu
+    measures: Tuple[str, ...]       # sayısal ölçü kolonları → cnt_/sum_/min_/max_
+    distinct: Tuple[str, ...] = ()  # COUNT(DISTINCT) ölçüleri → dn_ (yalnızca tam granülaritede)
+
+
+# Aynı taban için sırayla denenir (küçük/kaba olan önce)
+ROLLUPS: Dict[str, Rollup] = {r.name: r for r in (
+    Rollup("r_session_daily", "chat_session", (), "message_date", ("num_of_mess",)),
+    Rollup("r_user_unit", "user", ("unit_id",), None, ("age",), ("user_id",)),
+    Rollup("r_llm_usage", "use_llm_service", ("llm_id",), None, (), ("chat_session_id",)),
+    Rollup("r_llm_daily", "use_llm_service", ("llm_id",), "created_at", ()),
+)}
+
+_AGG = frozenset({"count", "sum", "total", "avg", "min", "max"})
+_BAIL = frozenset({"select", "with", "union", "intersect", "except", "over", "window", "natural", "using", "cross", "filter"})
+_CLAUSE_END = frozenset({"where", "group", "having", "order", "limit"})
+_PRED_END = frozenset({"and", "or", "group", "having", "order", "limit"})
+_JOIN_WORDS = frozenset({"join", "inner", "left", "right", "full", "outer", "on", "as"}) | _CLAUSE_END
+_DAY_FMT = re.compile(r"^'(?:[^%']|%[YmdwjW%])*'$")     # yalnızca tarih alanları: gün hassasiyetinde aynı sonuç
+_DAY_LIT = re.compile(r"^'\d{4}-\d{2}-\d{2}'$")
+
+
+def rollup_config(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    return {**ROLLUP_DEFAULTS, **(cfg.get("rollups") or {})}
+
+
+def sidecar_path(db_path: str, path: Optional[str] = None) -> str:
+    return path or os.path.splitext(db_path)[0] + ".rollup.db"
+
+
+# ---------------------------------------------------------------------------
+# Kurulum
+# ---------------------------------------------------------------------------
+def _select_sql(r: Rollup, src: str = "src") -> str:
+    cols = list(r.dims) + ([f'date("{r.day}") AS day'] if r.day else []) + ["COUNT(*) AS n"]
+    for m in r.measures:
+        cols += [f'COUNT("{m}") AS cnt_{m}', f'SUM("{m}") AS sum_{m}', f'MIN("{m}") AS min_{m}', f'MAX("{m}") AS max_{m}']
+    cols += [f'COUNT(DISTINCT "{d}") AS dn_{d}' for d in r.distinct]
+    groups = list(r.dims) + (["day"] if r.day else [])
+    return f'SELECT {", ".join(cols)} FROM {src}."{r.base}"' + (f" GROUP BY {', '.join(groups)}" if groups else "")
+
+
+def _buildable(conn, r: Rollup) -> Optional[str]:
+    """Rollup kaynak şemaya uyuyor mu? Uymuyorsa nedeni."""
+    cols = set(schema_catalog(conn).get(r.base.lower(), []))
+    missing = [c for c in r.dims + r.measures + r.distinct + ((r.day,) if r.day else ()) if c.lower() not in cols]
+    if missing:
+        return f"eksik kolon(lar): {', '.join(missing)}"
+    if r.day:
+        # k >= 'YYYY-MM-DD' ⇔ date(k) >= 'YYYY-MM-DD' yalnızca ISO metin zaman damgalarında geçerli
+        bad = conn.execute(
+            f'SELECT COUNT(*) FROM "{r.base}" WHERE "{r.day}" IS NOT NULL AND (typeof("{r.day}") != \'text\' '
+            f'OR "{r.day}" NOT GLOB \'[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]*\');').fetchone()[0]
+        if bad:
+            return f"{r.day}: {bad} ISO olmayan değer"
+    return None
+
+
+def build(db_path: str, out_path: str) -> Dict[str, Any]:
+    """Rollup tablolarını yan dosyaya kurar (geçici dosya + os.replace). Özet döndürür."""
+    t0 = time.perf_counter()
+    src = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        stamp = data_version(src)   # kurulum öncesi damga: kurulum sırasında veri değişirse indeks eski sayılır
+        skipped = {r.name: why for r in ROLLUPS.values() if (why := _buildable(src, r))}
+    finally:
+        src.close()
+
+    tmp = sidecar.tmp_path(out_path)
+    dst = sqlite3.connect(tmp, uri=True)
+    built = {}
+    try:
+        dst.execute("ATTACH DATABASE ? AS src;", (f"file:{db_path}?mode=ro",))
+        dst.execute("CREATE TABLE meta(k TEXT PRIMARY KEY, v TEXT);")
+        for r in ROLLUPS.values():
+            if r.name in skipped:
+                log.warning("Rollup %s atlandı: %s", r.name, skipped[r.name])
+                continue
+            dst.execute(f'CREATE TABLE "{r.name}" AS {_select_sql(r)};')
+            keys = list(r.dims) + (["day"] if r.day else [])
+            if keys:
+                dst.execute(f'CREATE INDEX "ix_{r.name}" ON "{r.name}" ({", ".join(keys)});')
+            built[r.name] = dst.execute(f'SELECT COUNT(*) FROM "{r.name}";').fetchone()[0]
+        dst.executemany("INSERT INTO meta VALUES (?,?);", [
+            ("data_version", json.dumps(list(stamp))),
+            ("rollups", json.dumps(sorted(built))),
+            ("built_at", time.strftime("%Y-%m-%d %H:%M:%S")),
+        ])
+        dst.commit()
+        dst.execute("DETACH DATABASE src;")
+        dst.close()
+        os.replace(tmp, out_path)
+    finally:
+        dst.close()
+        sidecar.discard(tmp)
+    ms = round((time.perf_counter() - t0) * 1000, 1)
+    log.info("Rollup'lar kuruldu: %s, %.0f ms → %s", built, ms, out_path)
+    return {"rollups": built, "skipped": skipped, "ms": ms}
+
+
+# yan dosya yolu → (damga, mevcut rollup adları); kuruluyor olan yollar
+_STATE: Dict[str, Tuple[tuple, frozenset]] = {}
+_BUILDING: set = set()
+_LOCK = threading.Lock()
+
+
+def _read_meta(out: str) -> Optional[Tuple[tuple, frozenset]]:
+    try:
+        c = sqlite3.connect(f"file:{out}?mode=ro", uri=True)
+        try:
+            meta = dict(c.execute("SELECT k, v FROM meta;").fetchall())
+        finally:
+            c.close()
+        return tuple(json.loads(meta["data_version"])), frozenset(json.loads(meta["rollups"]))
+    except (sqlite3.Error, KeyError, ValueError) as e:
+        log.warning("Rollup yan dosyası okunamadı (%s): %s", out, e)
+        return None
+
+
+def _rebuild(db_path: str, out: str) -> None:
+    try:
+        build(db_path, out)
+        st = _read_meta(out)
+        with _LOCK:
+            if st:
+                _STATE[out] = st
+        sidecar.succeeded(out)
+    except Exception as e:
+        sidecar.failed(out)
+        log.warning("Rollup'lar kurulamadı (%.0f sn yeniden denenmeyecek): %s", sidecar.RETRY_AFTER_S, e)
+    finally:
+        with _LOCK:
+            _BUILDING.discard(out)
+
+
+def available(conn, rc: Dict[str, Any], wait: bool = False) -> Tuple[Optional[str], frozenset]:
+    """
+    Güncel (damgası kaynak DB'ninkiyle aynı) yan dosya yolu ve içindeki rollup adları.
+    Eskiyse/yoksa: wait=True → kurulur; wait=False → arka planda kurulur, (None, ∅) döner
+    (son kurulum başarısızsa sidecar.RETRY_AFTER_S dolana kadar yeniden denenmez).
+    """
+    db_path = db_key(conn)
+    if db_path.startswith("mem:"):
+        return None, frozenset()
+    out = sidecar_path(db_path, rc.get("path"))
+    stamp = data_version(conn)
+    with _LOCK:
+        st = _STATE.get(out)
+        if (st is None or st[0] != stamp) and out not in _BUILDING and os.path.exists(out):
+            st = _read_meta(out)
+            if st:
+                _STATE[out] = st
+        if st is not None and st[0] == stamp:
+            return out, st[1]
+        if out in _BUILDING or (not wait and sidecar.backing_off(out)):
+            return None, frozenset()
+        _BUILDING.add(out)
+    if wait:
+        _rebuild(db_path, out)
+        st = _STATE.get(out)
+        return (out, st[1]) if st and st[0] == stamp else (None, frozenset())
+    sidecar.start(_rebuild, (db_path, out), "rollup-build")
+    return None, frozenset()
+
+
+def attach(conn, path: str) -> None:
+    """Yan dosyayı bağlantıya read-only ATTACH eder; dosya yeniden kurulduysa (inode değişti) yeniler."""
+    ident = os.stat(path).st_ino
+    if getattr(conn, "rollup_ident", None) == (path, ident):
+        return
+    if any(r[1] == SCHEMA for r in conn.execute("PRAGMA database_list;")):
+        conn.execute(f"DETACH DATABASE {SCHEMA};")
+    conn.execute(f"ATTACH DATABASE ? AS {SCHEMA};", (f"file:{path}?mode=ro",))
+    conn.rollup_ident = (path, ident)
+
+
+# ---------------------------------------------------------------------------
+# Yeniden yazım
+# ---------------------------------------------------------------------------
+class _Bail(Exception):
+    pass
+
+
+class _Table(NamedTuple):
+    name: str
+    alias: str
+    tok: int          # tablo adı token indeksi
+    has_alias: bool
+    nullable: bool    # LEFT [OUTER] JOIN'in sağ tarafı (eşleşmeyen satırlar NULL gelir)
+
+
+def _ident(t: SqlToken) -> bool:
+    return t.kind in ("id", "qid")
+
+
+def _parse_from(toks: List[SqlToken], a: int, b: int) -> Tuple[List[_Table], List[Tuple[int, int]]]:
+    """FROM aralığı [a, b) → tablolar ve ON koşulları (her biri 'x.c = y.d' token aralığı)."""
+    tables, conds = [], []
+    i = a
+    left = False
+    while i < b:
+        t = toks[i]
+        if t.kind == "id" and t.name in ("right", "full"):
+            raise _Bail(f"{t.text.upper()} JOIN")
+        if t.kind == "id" and t.name in ("join", "inner", "left", "outer"):
+            left = left or t.name in ("left", "outer")
+            i += 1
+            continue
+        if not _ident(t):
+            raise _Bail(f"FROM: beklenmeyen {t.text}")
+        j = i + 1
+        alias, has = t.name, False
+        if j < b and toks[j].kind == "id" and toks[j].name == "as":
+            j += 1
+        if j < b and _ident(toks[j]) and toks[j].name not in _JOIN_WORDS:
+            alias, has = toks[j].name, True
+            j += 1
+        tables.append(_Table(t.name, alias, i, has, left))
+        left = False
+        if j < b and toks[j].kind == "id" and toks[j].name == "on":
+            # Yalnızca a.x = b.y
+            seg = toks[j + 1:j + 8]
+            if (len(seg) >= 7 and _ident(seg[0]) and seg[1].text == "." and _ident(seg[2]) and seg[3].text == "="
+                    and _ident(seg[4]) and seg[5].text == "." and _ident(seg[6])
+                    and (j + 8 >= b or (toks[j + 8].kind == "id" and toks[j + 8].name in ("join", "inner", "left", "right", "full")))):
+                conds.append((j + 1, j + 8))
+                j += 8
+            else:
+                raise _Bail("JOIN koşulu a.x = b.y değil")
+        elif j < b and toks[j].text == ",":
+            raise _Bail("virgüllü JOIN")
+        i = j
+    return tables, conds
+
+
+def _call_end(toks: List[SqlToken], open_idx: int) -> int:
+    """'(' indeksinden eşleşen ')' indeksine."""
+    d = toks[open_idx].depth
+    for k in range(open_idx + 1, len(toks)):
+        if toks[k].text == ")" and toks[k].depth == d:
+            return k
+    raise _Bail("kapanmayan parantez")
+
+
+def _rewrite_for(sql: str, toks: List[SqlToken], r: Rollup, tables: List[_Table], conds, cat) -> str:
+    base = [t for t in tables if t.name == r.base.lower()]
+    if len(base) != 1:
+        raise _Bail("taban tablo tek değil")
+    base = base[0]
+    if base.nullable:
+        # Eşleşmeyen boyut satırı tabanda tek NULL satır üretir (COUNT(*) = 1); rollup'ta satırı yoktur
+        raise _Bail("taban tablo OUTER JOIN'in NULL tarafında")
+    others = [t for t in tables if t is not base]
+    cols = {t.alias: set(cat.get(t.name, [])) for t in tables}
+    base_cols = cols[base.alias]
+    dims = {d.lower() for d in r.dims}
+    day = r.day.lower() if r.day else None
+    measures = {m.lower() for m in r.measures}
+    distinct = {d.lower() for d in r.distinct}
+    q = f'"{base.alias}"' if not base.alias.isidentifier() else base.alias
+
+    for s, e in conds:
+        for k in (s, s + 4):
+            if toks[k].name == base.alias and toks[k + 2].name not in dims:
+                raise _Bail("JOIN taban tablonun boyut olmayan kolonu üzerinden")
+
+    frm = next(i for i, t in enumerate(toks) if t.depth == 0 and t.kind == "id" and t.name == "from")
+    from_end = next((i for i, t in enumerate(toks) if i > frm and t.depth == 0 and t.kind == "id" and t.name in _CLAUSE_END), len(toks))
+    group = [i for i, t in enumerate(toks) if t.depth == 0 and t.kind == "id" and t.name == "group"]
+    group_end = next((i for i, t in enumerate(toks) if group and i > group[0] and t.depth == 0 and t.kind == "id"
+                      and t.name in ("having", "order", "limit")), len(toks))
+    where = next((i for i, t in enumerate(toks) if t.depth == 0 and t.kind == "id" and t.name == "where"), None)
+
+    repl: List[Tuple[int, int, str]] = []   # (başlangıç ofseti, bitiş ofseti, metin)
+    span = lambda i, j: (toks[i].pos, toks[j].pos + len(toks[j].text))
+    has_agg = False
+    group_cols = set()
+    needs_exact = False
+
+    i = 0
+    while i < len(toks):
+        t = toks[i]
+        if frm <= i < from_end:
+            i += 1
+            continue
+        # COUNT(*)
+        if t.kind == "id" and t.name == "count" and toks[i + 1:i + 4] and [x.text for x in toks[i + 1:i + 4]] == ["(", "*", ")"]:
+            repl.append((*span(i, i + 3), f"COALESCE(SUM({q}.n), 0)"))
+            has_agg = True
+            i += 4
+            continue
+        if t.text == "*":
+            prev = toks[i - 1] if i else None
+            if prev is None or prev.text in (",", ".") or (prev.kind == "id" and prev.name in ("select", "distinct")):
+                raise _Bail("SELECT *")
+        if t.kind == "id" and t.name in _AGG and i + 1 < len(toks) and toks[i + 1].text == "(":
+            has_agg = True
+        # Kolon referansı
+        if not _ident(t) or (i + 1 < len(toks) and toks[i + 1].text == "("):
+            i += 1
+            continue
+        if i + 2 < len(toks) and toks[i + 1].text == "." and _ident(toks[i + 2]):
+            owner, col, last = t.name, toks[i + 2].name, i + 2
+            if owner not in cols:
+                raise _Bail(f"bilinmeyen nitelik {owner}")
+        elif i and toks[i - 1].text == ".":
+            i += 1
+            continue
+        else:
+            col, last = t.name, i
+            owners = [a for a, cs in cols.items() if col in cs]
+            if not owners:
+                i += 1          # SELECT takma adı / anahtar kelime
+                continue
+            owner = owners[0] if len(owners) == 1 else None
+            if owner is None:
+                raise _Bail(f"belirsiz kolon {col}")
+        if owner != base.alias:
+            i = last + 1
+            continue
+        if col not in base_cols:
+            raise _Bail(f"{base.name}.{col} yok")
+        in_group = bool(group) and group[0] < i < group_end
+        if in_group:
+            group_cols.add(col)
+
+        # Agregat argümanı mı?  fn ( [DISTINCT] kolon )
+        k = i - 1
+        dist = k >= 0 and toks[k].kind == "id" and toks[k].name == "distinct"
+        if dist:
+            k -= 1
+        is_arg = (k >= 1 and toks[k].text == "(" and toks[k - 1].kind == "id" and toks[k - 1].name in _AGG
+                  and last + 1 < len(toks) and toks[last + 1].text == ")")
+        if is_arg:
+            fn = toks[k - 1].name
+            s0, s1 = span(k - 1, last + 1)
+            if col in dims and (fn in ("min", "max") or (fn == "count" and dist)):
+                pass                                     # boyut kümesi üzerinde aynı sonuç
+            elif dist:
+                if fn == "count" and col in distinct:
+                    repl.append((s0, s1, f"SUM({q}.dn_{col})"))
+                    needs_exact = True
+                else:
+                    raise _Bail(f"{fn}(DISTINCT {col})")
+            elif col in measures:
+                repl.append((s0, s1, {
+                    "count": f"COALESCE(SUM({q}.cnt_{col}), 0)",
+                    "sum": f"SUM({q}.sum_{col})",
+                    "total": f"TOTAL({q}.sum_{col})",
+                    "avg": f"(SUM({q}.sum_{col}) * 1.0 / SUM({q}.cnt_{col}))",
+                    "min": f"MIN({q}.min_{col})",
+                    "max": f"MAX({q}.max_{col})",
+                }[fn]))
+            else:
+                raise _Bail(f"{fn}({col}) rollup'ta yok")
+            i = last + 2
+            continue
+
+        if col in dims:
+            i = last + 1
+            continue
+        if col == day:
+            s0, s1 = span(i, last)
+            nxt = toks[last + 1] if last + 1 < len(toks) else None
+            if i >= 2 and toks[i - 1].text == "(" and toks[i - 2].kind == "id" and toks[i - 2].name == "date" and nxt is not None and nxt.text == ")":
+                repl.append((*span(i - 2, last + 1), f"{q}.day"))
+                i = last + 2
+                continue
+            if (i >= 4 and toks[i - 1].text == "," and _DAY_FMT.match(toks[i - 2].text) and toks[i - 3].text == "("
+                    and toks[i - 4].kind == "id" and toks[i - 4].name == "strftime" and nxt is not None and nxt.text == ")"):
+                repl.append((s0, s1, f"{q}.day"))
+                i = last + 1
+                continue
+            in_where = where is not None and where < i and (not group or i < group[0])
+            if in_where and nxt is not None and nxt.text in (">=", "<"):
+                before = toks[i - 1]
+                if not (before.text == "(" or (before.kind == "id" and before.name in ("where", "and", "or", "not"))):
+                    raise _Bail("karşılaştırmanın sol tarafı yalnız kolon değil")
+                x = last + 2
+                if x < len(toks) and toks[x].kind == "str" and _DAY_LIT.match(toks[x].text):
+                    x_end = x
+                elif x + 1 < len(toks) and toks[x].kind == "id" and toks[x].name == "date" and toks[x + 1].text == "(":
+                    x_end = _call_end(toks, x + 1)
+                else:
+                    raise _Bail("karşılaştırma değeri gün hizalı değil")
+                after = toks[x_end + 1] if x_end + 1 < len(toks) else None
+                if after is not None and not (after.text == ")" or (after.kind == "id" and after.name in _PRED_END)):
+                    raise _Bail("karşılaştırma değeri ifade içinde")
+                repl.append((s0, s1, f"{q}.day"))
+                i = x_end + 1
+                continue
+            raise _Bail(f"{col} gün dışı bağlamda")
+        raise _Bail(f"{col} boyut/ölçü değil")
+
+    if not has_agg and not group:
+        raise _Bail("agregat sorgu değil")
+    if needs_exact and (others or group_cols != dims or day):
+        raise _Bail("COUNT(DISTINCT) yalnızca tam granülaritede")
+
+    # Takma adsız SELECT öğeleri: SQLite kolon adını ifade metninden alır → orijinal metni ad olarak koru
+    bounds = [0] + [k for k in range(1, frm) if toks[k].depth == 0 and toks[k].text == ","] + [frm]
+    for a, b in zip(bounds, bounds[1:]):
+        a += 1
+        item = toks[a:b]
+        if item and item[0].kind == "id" and item[0].name == "distinct":
+            a += 1
+            item = item[1:]
+        if not item or any(t.depth == 0 and t.kind == "id" and t.name == "as" for t in item):
+            continue
+        if len(item) >= 2 and _ident(item[-1]) and (item[-2].text == ")" or item[-2].kind in ("id", "qid", "num", "str")):
+            continue   # örtük takma ad: "expr ad"
+        s0, s1 = span(a, b - 1)
+        if any(s0 <= p < s1 for p, _, _ in repl):
+            name = sql[s0:s1].replace('"', '""')
+            repl.append((s1, s1, f' AS "{name}"'))
+
+    t = toks[base.tok]
+    s0, s1 = span(base.tok, base.tok)
+    repl.append((s0, s1, f"{SCHEMA}.{r.name}" + ("" if base.has_alias else f" AS {t.text}")))
+    out, pos = [], 0
+    for a, b, txt in sorted(repl):
+        out.append(sql[pos:a])
+        out.append(txt)
+        pos = b
+    out.append(sql[pos:])
+    return "".join(out)
+
+
+def rewrite(sql: str, catalog: Dict[str, List[str]], names) -> Optional[Tuple[str, str]]:
+    """Doğrulanmış SQL → (rollup adı, yeniden yazılmış SQL) veya None (taban sorgu çalışmalı)."""
+    s = sql.strip().rstrip(";").rstrip()
+    toks = tokenize_sql(s)
+    if not toks or toks[0].kind != "id" or toks[0].name != "select":
+        return None
+    if any(t.kind == "id" and t.name in _BAIL for t in toks[1:]) or any(t.text == ";" for t in toks):
+        return None
+    froms = [i for i, t in enumerate(toks) if t.depth == 0 and t.kind == "id" and t.name == "from"]
+    if len(froms) != 1:
+        return None
+    a = froms[0] + 1
+    b = next((i for i in range(a, len(toks)) if toks[i].depth == 0 and toks[i].kind == "id" and toks[i].name in _CLAUSE_END), len(toks))
+    try:
+        tables, conds = _parse_from(toks, a, b)
+    except _Bail as e:
+        log.debug("Rollup yok: %s", e)
+        return None
+    table_names = {t.name for t in tables}
+    for r in ROLLUPS.values():
+        if r.name not in names or r.base.lower() not in table_names:
+            continue
+        try:
+            return r.name, _rewrite_for(s, toks, r, tables, conds, catalog)
+        except _Bail as e:
+            log.debug("Rollup %s uygun değil: %s", r.name, e)
+    return None
+
+
+def plan(conn, sql: str, rc: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+    """Yürütücü için: güncel rollup'lar varsa yeniden yazar ve yan dosyayı bağlantıya ATTACH eder."""
+    path, names = available(conn, rc)
+    if not names:
+        return None
+    rw = rewrite(sql, schema_catalog(conn), names)
+    if rw is not None:
+        attach(conn, path)
+    return rw
+
+
+# ---------------------------------------------------------------------------
+# CLI: build / verify
+# ---------------------------------------------------------------------------
+SAMPLE_QUERIES = [
+    "SELECT date(message_date) AS day, COUNT(*) AS sessions FROM chat_session GROUP BY day ORDER BY day",
+    "SELECT strftime('%Y-%m', message_date) AS month, COUNT(*) AS session_count, SUM(num_of_mess) AS msgs "
+    "FROM chat_session WHERE message_date >= DATE('now', '-365 day') GROUP BY month ORDER BY month",
+    "SELECT strftime('%w', message_date) AS weekday, COUNT(*) AS session_count FROM chat_session GROUP BY weekday ORDER BY weekday",
+    "SELECT COUNT(*) AS session_count FROM chat_session WHERE message_date >= DATE('now', '-30 day')",
+    "SELECT ROUND(AVG(num_of_mess), 2) AS avg_messages, MAX(num_of_mess) AS mx FROM chat_session "
+    "WHERE message_date >= '2025-01-01' AND message_date < '2026-01-01'",
+    "SELECT un.unit_name, ROUND(AVG(u.age), 2) AS avg_age, COUNT(*) AS n FROM user u "
+    "JOIN unit un ON un.unit_id = u.unit_id GROUP BY un.unit_name ORDER BY avg_age DESC",
+    "SELECT un.unit_name, COUNT(*) AS user_count FROM user u JOIN unit un ON un.unit_id = u.unit_id "
+    "GROUP BY un.unit_name ORDER BY user_count DESC LIMIT 5",
+    "SELECT unit_id, COUNT(DISTINCT user_id) AS users, MIN(age) AS youngest FROM user GROUP BY unit_id",
+    "SELECT l.llm_name, COUNT(*) AS usage_count FROM use_llm_service us "
+    "JOIN llm_providers l ON l.llm_id = us.llm_id GROUP BY l.llm_name ORDER BY usage_count DESC",
+    "SELECT llm_id, COUNT(DISTINCT chat_session_id) AS sessions FROM use_llm_service GROUP BY llm_id",
+    "SELECT llm_id, COUNT(*) AS uses FROM use_llm_service WHERE created_at >= DATE('now', '-90 day') GROUP BY llm_id",
+    # Yeniden yazılmaması gerekenler (taban sorgu çalışır)
+    "SELECT message_date, num_of_mess FROM chat_session ORDER BY message_date DESC LIMIT 5",
+    "SELECT COUNT(*) FROM chat_session WHERE message_date > '2025-01-01'",
+    "SELECT strftime('%H', message_date) AS hour, COUNT(*) FROM chat_session GROUP BY hour",
+]
+
+# Eşleşmesiz boyut satırı olan kopyada (_unmatched_copy) çalıştırılır: taban tablo OUTER JOIN'in
+# NULL tarafındaysa yeniden yazılmamalı, korunan taraftaysa sonuç aynı kalmalı.
+OUTER_QUERIES = [
+    "SELECT un.unit_name, COUNT(*) FROM unit un LEFT JOIN user u ON u.unit_id = un.unit_id GROUP BY un.unit_name",
+    "SELECT un.unit_name, COUNT(u.age) AS n, AVG(u.age) AS a FROM unit un LEFT OUTER JOIN user u "
+    "ON u.unit_id = un.unit_id GROUP BY un.unit_name",
+    "SELECT un.unit_name, COUNT(*) AS n FROM user u RIGHT JOIN unit un ON un.unit_id = u.unit_id GROUP BY un.unit_name",
+    "SELECT un.unit_name, COUNT(*) AS n FROM user u FULL OUTER JOIN unit un ON un.unit_id = u.unit_id GROUP BY un.unit_name",
+    "SELECT l.llm_name, COUNT(*) AS uses FROM llm_providers l LEFT JOIN use_llm_service us "
+    "ON us.llm_id = l.llm_id GROUP BY l.llm_name",
+    "SELECT u.unit_id, un.unit_name, COUNT(*) AS n FROM user u LEFT JOIN unit un ON un.unit_id = u.unit_id "
+    "GROUP BY u.unit_id, un.unit_name",
+    "SELECT l.llm_name, COUNT(*) AS uses FROM use_llm_service us LEFT JOIN llm_providers l "
+    "ON l.llm_id = us.llm_id GROUP BY l.llm_name",
+]
+
+
+def _rows(conn, sql: str):
+    cur = conn.execute(sql)
+    rows = [tuple(round(v, 6) if isinstance(v, float) else v for v in r) for r in cur.fetchall()]
+    return [d[0] for d in cur.description], sorted(rows, key=repr)
+
+
+def _best_ms(conn, sql: str, n: int = 3) -> float:
+    best = float("inf")
+    for _ in range(n):
+        t0 = time.perf_counter()
+        conn.execute(sql).fetchall()
+        best = min(best, (time.perf_counter() - t0) * 1000)
+    return best
+
+
+def _unmatched_copy(db_path: str, out_path: str) -> None:
+    """Kaynak DB'nin kopyası + hiçbir satırla eşleşmeyen boyut satırları (birim ve model)."""
+    src = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    dst = sqlite3.connect(out_path)
+    try:
+        src.backup(dst)
+        dst.execute("INSERT INTO unit(unit_id, unit_name) VALUES ('__verify_empty', 'Empty Unit');")
+        dst.execute("INSERT INTO llm_providers(llm_id, llm_name, temp, max_token) "
+                    "VALUES ('__verify_empty', 'Unused LLM', 0, 1);")
+        dst.commit()
+    finally:
+        dst.close()
+        src.close()
+
+
+def _check(db_path: str, rc: Dict[str, Any], queries: List[str], report: Dict[str, Any], fixture: Optional[str] = None) -> None:
+    conn = connect_readonly(db_path, timeout_ms=600_000)   # büyük tabanda taban sorgu uzun sürebilir
+    path, names = available(conn, rc, wait=True)
+    if not names:
+        conn.close()
+        raise SystemExit("Rollup yan dosyası kurulamadı.")
+    attach(conn, path)
+    cat = schema_catalog(conn)
+    for sql in queries:
+        rw = rewrite(sql, cat, names)
+        item: Dict[str, Any] = {"sql": sql, "rollup": rw[0] if rw else None, "fixture": fixture}
+        if rw is None:
+            report["skipped"] += 1
+        else:
+            try:
+                base, new = _rows(conn, sql), _rows(conn, rw[1])
+                item["ok"] = base == new
+                item["base_ms"] = round(_best_ms(conn, sql), 3)
+                item["rollup_ms"] = round(_best_ms(conn, rw[1]), 3)
+                report["rewritten"] += 1
+                report["mismatch"] += not item["ok"]
+                if not item["ok"]:
+                    item["rewritten_sql"] = rw[1]
+            except sqlite3.Error as e:
+                item["ok"], item["error"] = False, str(e)
+                item["rewritten_sql"] = rw[1]
+                report["error"] += 1
+        report["queries"].append(item)
+    conn.close()
+
+
+def verify(db_path: str, rc: Dict[str, Any], queries: List[str]) -> Dict[str, Any]:
+    """
+    Her sorguda taban ve yeniden yazılmış sonuç kümelerini karşılaştırır; süreleri ölçer.
+    OUTER_QUERIES ayrıca eşleşmesiz boyut satırlı geçici kopyada (fixture="unmatched") denenir.
+    """
+    import tempfile
+    report = {"rewritten": 0, "skipped": 0, "mismatch": 0, "error": 0, "queries": []}
+    _check(db_path, rc, queries, report)
+    with tempfile.TemporaryDirectory() as d:
+        copy = os.path.join(d, "unmatched.db")
+        _unmatched_copy(db_path, copy)
+        _check(copy, {**rc, "path": None}, OUTER_QUERIES, report, fixture="unmatched")
+    return report
+
+
+def main() -> None:
+    import argparse
+    import yaml
+    ap = argparse.ArgumentParser(description="Build rollup tables / verify rollup query rewriting")
+    ap.add_argument("cmd", choices=["build", "verify"])
+    ap.add_argument("--config", default="config.yaml")
+    ap.add_argument("--db", default=None, help="config'teki db.path yerine")
+    ap.add_argument("--queries", default=None, help="verify: satır başına bir SQL (yoksa örnekler + eval expected_sql)")
+    ap.add_argument("--out", default=None, help="verify: rapor JSON'u")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(name)s | %(message)s")
+    with open(args.config, "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f)
+    rc = rollup_config(cfg)
+    db_path = args.db or cfg["db"]["path"]
+    if args.cmd == "build":
+        print(json.dumps(build(db_path, sidecar_path(db_path, rc.get("path"))), ensure_ascii=False, indent=2))
+        return
+
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as f:
+            queries = [l.strip() for l in f if l.strip() and not l.startswith("--")]
+    else:
+        queries = list(SAMPLE_QUERIES)
+        eval_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "eval", "eval_questions.jsonl")
+        if os.path.exists(eval_path):
+            with open(eval_path, "r", encoding="utf-8") as f:
+                queries += [json.loads(l)["expected_sql"] for l in f if l.strip()]
+    rep = verify(db_path, rc, queries)
+    for it in rep["queries"]:
+        if it["rollup"] is None:
+            continue
+        mark = "OK  " if it.get("ok") else "FAIL"
+        timing = f"{it['base_ms']:.2f} → {it['rollup_ms']:.2f} ms" if "base_ms" in it else it.get("error", "")
+        tag = " [eşleşmesiz]" if it.get("fixture") else ""
+        print(f"{mark} {it['rollup']:<16} {timing:<22} {it['sql'][:90]}{tag}")
+        if not it.get("ok"):
+            print(f"     yeniden yazılmış: {it['rewritten_sql']}")
+    print(f"\n{len(rep['queries'])} sorgu: {rep['rewritten']} yeniden yazıldı, {rep['skipped']} taban sorguda kaldı, "
+          f"{rep['mismatch']} uyumsuz, {rep['error']} hata")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(rep, f, ensure_ascii=False, indent=2)
+    if rep["mismatch"] or rep["error"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
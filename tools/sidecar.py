@@ -0,0 +1,87 @@
+# tools/sidecar.py
+"""
+Yan dosya (values/rollup sidecar) kurulumlarının ortak yaşam döngüsü.
+
+  - tmp_path(): kurulum geçici dosyası (<yan dosya>.tmp<pid>); süreç içinde kaydedilir.
+    discard() başarısız/yarım kalan geçici dosyayı (ve -journal'ını) siler.
+  - Arka plan kurulumları start() ile başlar. Süreç çıkarken (main.py -q tek atımlık çalıştırma)
+    süren kurulumlar en fazla EXIT_WAIT_S beklenir, kalan geçici dosyalar silinir.
+  - Başarısız kurulumdan sonra aynı yan dosya RETRY_AFTER_S boyunca istek yolunda yeniden
+    denenmez (örn. salt-okunur veri dizini: her sorgu yeni bir tam kurulum başlatmasın).
+"""
+from __future__ import annotations
+import atexit
+import logging
+import os
+import threading
+import time
+from typing import Dict, List
+
+log = logging.getLogger("sidecar")
+
+RETRY_AFTER_S = 300.0
+EXIT_WAIT_S = 10.0
+
+_LOCK = threading.Lock()
+_PENDING: set = set()                    # henüz yerine taşınmamış geçici dosyalar
+_THREADS: List[threading.Thread] = []
+_FAILED: Dict[str, float] = {}           # yan dosya yolu → son başarısız kurulumun zamanı (monotonic)
+
+
+def tmp_path(out: str) -> str:
+    tmp = f"{out}.tmp{os.getpid()}"
+    discard(tmp)
+    with _LOCK:
+        _PENDING.add(tmp)
+    return tmp
+
+
+def discard(tmp: str) -> None:
+    """Geçici dosyayı siler (os.replace ile taşındıysa yalnızca kaydı düşer)."""
+    for p in (tmp, tmp + "-journal"):
+        try:
+            os.remove(p)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            log.warning("Geçici dosya silinemedi (%s): %s", p, e)
+    with _LOCK:
+        _PENDING.discard(tmp)
+
+
+def failed(out: str) -> None:
+    with _LOCK:
+        _FAILED[out] = time.monotonic()
+
+
+def succeeded(out: str) -> None:
+    with _LOCK:
+        _FAILED.pop(out, None)
+
+
+def backing_off(out: str) -> bool:
+    """Son kurulum denemesi RETRY_AFTER_S içinde başarısız olduysa True."""
+    with _LOCK:
+        t = _FAILED.get(out)
+    return t is not None and time.monotonic() - t < RETRY_AFTER_S
+
+
+def start(target, args: tuple, name: str) -> None:
+    th = threading.Thread(target=target, args=args, name=name, daemon=True)
+    with _LOCK:
+        _THREADS[:] = [t for t in _THREADS if t.is_alive()]
+        _THREADS.append(th)
+    th.start()
+
+
+@atexit.register
+def _at_exit() -> None:
+    deadline = time.monotonic() + EXIT_WAIT_S
+    with _LOCK:
+        threads = [t for t in _THREADS if t.is_alive()]
+    for th in threads:
+        th.join(max(0.0, deadline - time.monotonic()))
+    with _LOCK:
+        leftover = list(_PENDING)
+    for tmp in leftover:
+        discard(tmp)
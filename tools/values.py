@@ -0,0 +1,341 @@
+# tools/values.py
+"""
+Değer indeksi (entity linking): sorudaki değerleri ("Finans birimi", "GPT-4") DB'deki tam
+literallere eşler; LLM yazımı tahmin etmek zorunda kalmaz (boş sonuç / onarım döngüsü azalır).
+
+  - Düşük kardinaliteli metin kolonları şemadan keşfedilir: PK/*_id/FK olmayan TEXT kolonlar,
+    en fazla `max_distinct` farklı değer ve `max_len` karakter (serbest metin kolonları elenir).
+  - Farklı değerler bir SQLite FTS5 yan dosyasına (sidecar, varsayılan <db>.values.db) yazılır:
+      v_word → unicode61 + prefix indeksi (kelime/önek eşleşmesi: "gemini" → 'Gemini Pro')
+      v_tri  → trigram (bulanık eşleşme: "finans" → 'Finance Team'; adaylar 4-gramlarla bulunur,
+               difflib benzerliğiyle puanlanır)
+  - Soru kelimeleri: 3+ harf, TR/EN işlev kelimeleri ve tablo adları hariç; bir değer kelimesinin
+    öneki sayılmak için en az 4 harf ("her" → 'Hernandez' değil). Bulunanlar prompt'a "aday değer"
+    olarak girer; LLM yalnızca soruyla ilgiliyse kullanır.
+  - Yan dosyada kaynak DB'nin data_version damgası saklanır; damga değişmedikçe (ETL yenilemesi
+    olmadıkça) yeniden kurulmaz — süreç yeniden başlasa da. Kurulum geçici dosyaya yapılıp
+    os.replace ile atomik olarak yerleştirilir.
+  - İstek yolunda indeks eskiyse arka planda yeniden kurulur, o sırada eski indeks (yoksa hiç
+    ipucu) kullanılır; warm-up ve CLI kurulumu bekler.
+
+CLI:
+    python -m tools.values --db data/app.db                     # gerekirse kur, özet
+    python -m tools.values --db data/app.db --rebuild "Finans biriminde kaç kullanıcı var"
+"""
+from __future__ import annotations
+import difflib
+import functools
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from tools import sidecar
+from tools.db import data_version, db_key
+from utils.tracing import record_cache
+
+log = logging.getLogger("values")
+
+VALUE_DEFAULTS = {
+    "enabled": True,
+    "path": None,
+    "max_distinct": 200,
+    "max_len": 80,
+    "columns": [],
+    "top_k": 5,
+    "min_similarity": 0.75,
+    "generic_df": 4,
+}
+
+# Türkçe/aksanlı harfler → ASCII (soru ve değer aynı biçime katlanır: "İŞLEM" ~ "islem")
+_FOLD = str.maketrans("ıİşŞğĞüÜöÖçÇâÂîÎûÛ", "iissgguuooccaaiiuu")
+_WORD = re.compile(r"\w+")
+_DATE_TYPES = ("DATE", "TIME")
+_MIN_PREFIX = 4   # soru kelimesi en az bu uzunluktaysa değer kelimesinin öneki sayılır ("her" ≠ 'Hernandez')
+# Katlanmış (ASCII) TR/EN işlev kelimeleri: değer adayı değildir ("son" → 'Sonnet' gibi sahte eşleşmeler)
+_STOPWORDS = frozenset("""
+    ve ile icin her son kac hangi hangisi olan olarak gibi gore kadar daha once sonra bir bu su tum
+    var yok mi mu nedir nasil neler ise veya ama den dan ten tan nin nun
+    the and for with per each how many much what which who whom from last all are was were has have
+    that this those these into over than then top
+""".split())
+
+
+class ValueHit(NamedTuple):
+    table: str
+    column: str
+    value: str
+    score: float
+
+    def hint(self) -> str:
+        lit = self.value.replace("'", "''")
+        return f"{self.table}.{self.column} = '{lit}'"
+
+
+def value_config(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    return {**VALUE_DEFAULTS, **(cfg.get("values") or {})}
+
+
+def _fold(text: str) -> str:
+    return (text or "").translate(_FOLD).lower()
+
+
+def _tokens(text: str) -> List[str]:
+    # 3+ harfli kelimeler ve sayılar ("gpt 4" → ["gpt", "4"]); işlev kelimeleri hariç
+    return [t for t in _WORD.findall(_fold(text)) if (len(t) >= 3 or t.isdigit()) and t not in _STOPWORDS]
+
+
+def sidecar_path(db_path: str, path: Optional[str] = None) -> str:
+    return path or os.path.splitext(db_path)[0] + ".values.db"
+
+
+def discover_columns(conn, max_distinct: int = 200, max_len: int = 80) -> List[tuple]:
+    """Düşük kardinaliteli metin kolonları → [(tablo, kolon)]."""
+    out = []
+    tables = [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';")]
+    for t in tables:
+        fks = {fk[3].lower() for fk in conn.execute(f'PRAGMA foreign_key_list("{t}");')}
+        for _, col, ctype, _, _, pk in conn.execute(f'PRAGMA table_info("{t}");').fetchall():
+            ctype = (ctype or "").upper()
+            if pk or col.lower() in fks or col.lower().endswith("_id") or any(x in ctype for x in _DATE_TYPES):
+                continue
+            if ctype and not any(x in ctype for x in ("CHAR", "TEXT", "CLOB")):
+                continue
+            n, longest = conn.execute(
+                f'SELECT COUNT(*), MAX(LENGTH(v)) FROM (SELECT DISTINCT "{col}" AS v FROM "{t}" '
+                f'WHERE "{col}" IS NOT NULL LIMIT {int(max_distinct) + 1});'
+            ).fetchone()
+            if 0 < n <= max_distinct and (longest or 0) <= max_len:
+                out.append((t, col))
+    return out
+
+
+def build(db_path: str, out_path: str, vc: Dict[str, Any]) -> Dict[str, Any]:
+    """Kaynak DB'den değer indeksini kurar (geçici dosya + os.replace). Özet döndürür."""
+    t0 = time.perf_counter()
+    # Kurulum çevrimdışı iştir: havuzun progress/timeout bütçesi olmadan ayrı read-only bağlantı
+    src = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        stamp = data_version(src)
+        cols = [tuple(c.split(".", 1)) for c in vc["columns"]] or discover_columns(src, vc["max_distinct"], vc["max_len"])
+        rows = []
+        for t, c in cols:
+            for (v,) in src.execute(f'SELECT DISTINCT "{c}" FROM "{t}" WHERE "{c}" IS NOT NULL;'):
+                v = str(v).strip()
+                if v:
+                    rows.append((t, c, v, _fold(v)))
+    finally:
+        src.close()
+
+    tmp = sidecar.tmp_path(out_path)
+    dst = sqlite3.connect(tmp)
+    try:
+        dst.executescript("""
+            CREATE TABLE meta(k TEXT PRIMARY KEY, v TEXT);
+            CREATE TABLE vals(id INTEGER PRIMARY KEY, tbl TEXT, col TEXT, value TEXT, key TEXT);
+            CREATE VIRTUAL TABLE v_word USING fts5(key, content='vals', content_rowid='id',
+                                                   prefix='2 3', tokenize='unicode61 remove_diacritics 2');
+            CREATE VIRTUAL TABLE v_tri USING fts5(key, content='vals', content_rowid='id', tokenize='trigram');
+            CREATE VIRTUAL TABLE v_vocab USING fts5vocab(v_word, 'row');
+        """)
+        dst.executemany("INSERT INTO vals(tbl, col, value, key) VALUES (?,?,?,?);", rows)
+        dst.execute("INSERT INTO v_word(v_word) VALUES('rebuild');")
+        dst.execute("INSERT INTO v_tri(v_tri) VALUES('rebuild');")
+        dst.executemany("INSERT INTO meta VALUES (?,?);", [
+            ("data_version", json.dumps(list(stamp))),
+            ("columns", json.dumps([f"{t}.{c}" for t, c in cols])),
+            ("built_at", time.strftime("%Y-%m-%d %H:%M:%S")),
+        ])
+        dst.commit()
+        dst.close()
+        os.replace(tmp, out_path)
+    finally:
+        dst.close()
+        sidecar.discard(tmp)
+    summary = {"columns": [f"{t}.{c}" for t, c in cols], "values": len(rows), "ms": round((time.perf_counter() - t0) * 1000, 1)}
+    log.info("Değer indeksi kuruldu: %d kolon, %d değer, %.0f ms → %s", len(cols), len(rows), summary["ms"], out_path)
+    return summary
+
+
+class ValueIndex:
+    """Kurulmuş yan dosya üzerinde salt-okunur arama (thread-safe; aramalar milisaniyenin altında)."""
+
+    def __init__(self, path: str, vc: Dict[str, Any]):
+        self.path = path
+        self.vc = vc
+        self.conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+        meta = dict(self.conn.execute("SELECT k, v FROM meta;").fetchall())
+        self.stamp = tuple(json.loads(meta["data_version"]))
+        self.columns = json.loads(meta["columns"])
+        # Tablo adları soruda şema kelimesi olarak geçer ("her unit için") → değer adayı sayılmaz
+        self.schema_words = frozenset(_fold(c.split(".", 1)[0]) for c in self.columns)
+        # Kelime → kaç değerde geçtiği; çok yaygın kelimeler ("team", "unit") tek başına eşleşme sayılmaz
+        self.df = dict(self.conn.execute("SELECT term, doc FROM v_vocab;").fetchall())
+        self.size = self.conn.execute("SELECT COUNT(*) FROM vals;").fetchone()[0]
+        self.closed = False
+
+    def close(self) -> None:
+        # Süren aramanın bitmesi beklenir; sonrakiler kapalı indekste boş döner
+        with self._lock:
+            self.conn.close()
+            self.closed = True
+
+    def _rows(self, table: str, expr: str) -> List[tuple]:
+        return self.conn.execute(
+            f"SELECT v.id, v.tbl, v.col, v.value, v.key FROM {table} JOIN vals v ON v.id = {table}.rowid "
+            f"WHERE {table} MATCH ? LIMIT 200;", (expr,)).fetchall()
+
+    def lookup(self, question: str, top_k: Optional[int] = None) -> List[ValueHit]:
+        toks = [t for t in _tokens(question) if t not in self.schema_words]
+        if not toks:
+            return []
+        min_sim = float(self.vc["min_similarity"])
+        with self._lock:
+            if self.closed:      # yeniden kurulumla değiştirildi (çağıran eski referansı tutuyordu)
+                return []
+            # Kısa kelimeler yalnızca tam kelime olarak aranır (önek sorgusu değil)
+            rows = self._rows("v_word", " OR ".join(f'"{t}"*' if len(t) >= _MIN_PREFIX else f'"{t}"' for t in toks))
+            # Önekle açıklanamayan uzun kelimeler için trigram adayları (4-gram pencereleri)
+            words = {w for r in rows for w in _WORD.findall(r[4])}
+            rest = [t for t in toks if len(t) >= 4 and not any(_prefix_match(t, w) for w in words)]
+            grams = {t[i:i + 4] for t in rest for i in range(len(t) - 3)}
+            if grams:
+                seen = {r[0] for r in rows}
+                rows += [r for r in self._rows("v_tri", " OR ".join(f'"{g}"' for g in grams)) if r[0] not in seen]
+
+        hits = []
+        generic = int(self.vc["generic_df"])
+        for _, tbl, col, value, key in rows:
+            words = _WORD.findall(key)
+            best, covered = 0.0, 0
+            for w in words:
+                sim = max(_similarity(t, w, min_sim) for t in toks)
+                if sim >= min_sim:
+                    covered += 1
+                    if self.df.get(w, 1) < generic or len(words) == 1:
+                        best = max(best, sim)
+            if best >= min_sim:
+                hits.append(ValueHit(tbl, col, value, round(best + 0.1 * covered / len(words), 3)))
+        hits.sort(key=lambda h: (-h.score, h.value))
+        return hits[: int(top_k or self.vc["top_k"])]
+
+
+def _prefix_match(tok: str, word: str) -> bool:
+    return tok == word or (len(word) >= 3 and tok.startswith(word)) or (len(tok) >= _MIN_PREFIX and word.startswith(tok))
+
+
+@functools.lru_cache(maxsize=65536)
+def _similarity(tok: str, word: str, min_sim: float) -> float:
+    if _prefix_match(tok, word):
+        return 1.0
+    # Bulanık eşleşme yalnızca aynı harfle başlayan, 4+ harfli kelimelerde (yazım hatası / ek)
+    if tok[0] != word[0] or tok.isdigit() or word.isdigit() or min(len(tok), len(word)) < 4:
+        return 0.0
+    sim = 0.0
+    cands = [tok, tok[:len(word)]] if len(tok) > len(word) else [tok]   # Türkçe ek: "finansta" ~ "finance"
+    for t in cands:
+        sm = difflib.SequenceMatcher(None, t, word)
+        if sm.quick_ratio() >= min_sim:
+            sim = max(sim, sm.ratio())
+    return sim
+
+
+# yan dosya yolu → açık indeks; kuruluyor olan yollar
+_INDEXES: Dict[str, ValueIndex] = {}
+_BUILDING: set = set()
+_LOCK = threading.Lock()
+
+
+def _current(out: str, vc: Dict[str, Any]) -> Optional[ValueIndex]:
+    idx = _INDEXES.get(out)
+    if idx is None and os.path.exists(out):
+        try:
+            idx = _INDEXES[out] = ValueIndex(out, vc)
+        except sqlite3.Error as e:
+            log.warning("Değer indeksi açılamadı (%s): %s", out, e)
+    return idx
+
+
+def _rebuild(db_path: str, out: str, vc: Dict[str, Any]) -> None:
+    try:
+        build(db_path, out, vc)
+        new = ValueIndex(out, vc)
+        with _LOCK:
+            old, _INDEXES[out] = _INDEXES.get(out), new
+        if old is not None:
+            old.close()
+        sidecar.succeeded(out)
+    except Exception as e:
+        sidecar.failed(out)
+        log.warning("Değer indeksi kurulamadı (%.0f sn yeniden denenmeyecek): %s", sidecar.RETRY_AFTER_S, e)
+    finally:
+        with _LOCK:
+            _BUILDING.discard(out)
+
+
+def value_index(conn, vc: Dict[str, Any], wait: bool = False) -> Optional[ValueIndex]:
+    """
+    Bağlantının DB'si için güncel değer indeksi. data_version damgası indeksinkinden farklıysa
+    yeniden kurulur: wait=True → kurulum beklenir; wait=False → arka planda kurulur, bu arada
+    eski indeks (veya None) döner; son kurulum başarısızsa sidecar.RETRY_AFTER_S dolana kadar
+    yeniden denenmez. :memory: DB'ler için None.
+    """
+    db_path = db_key(conn)
+    if db_path.startswith("mem:"):
+        return None
+    out = sidecar_path(db_path, vc.get("path"))
+    stamp = data_version(conn)
+    with _LOCK:
+        idx = _current(out, vc)
+        fresh = idx is not None and idx.stamp == stamp
+        record_cache("values", fresh)
+        if fresh or out in _BUILDING or (not wait and sidecar.backing_off(out)):
+            return idx
+        _BUILDING.add(out)
+    if wait:
+        _rebuild(db_path, out, vc)
+        return _INDEXES.get(out)
+    sidecar.start(_rebuild, (db_path, out, vc), "values-build")
+    return idx
+
+
+def main() -> None:
+    import argparse
+    import yaml
+    ap = argparse.ArgumentParser(description="Build/query the FTS5 value index (entity linking)")
+    ap.add_argument("question", nargs="*", help="eşleşmeleri gösterilecek soru(lar)")
+    ap.add_argument("--config", default="config.yaml")
+    ap.add_argument("--db", default=None, help="config'teki db.path yerine")
+    ap.add_argument("--rebuild", action="store_true", help="damga aynı olsa da yeniden kur")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(name)s | %(message)s")
+    with open(args.config, "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f)
+    vc = value_config(cfg)
+    db_path = args.db or cfg["db"]["path"]
+    if args.rebuild:
+        build(db_path, sidecar_path(db_path, vc.get("path")), vc)
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    idx = value_index(conn, vc, wait=True)
+    conn.close()
+    if idx is None:
+        raise SystemExit("Değer indeksi kurulamadı.")
+    print(f"{idx.path}: {idx.size} değer, kolonlar: {', '.join(idx.columns)}")
+    for q in args.question:
+        t0 = time.perf_counter()
+        n = 200
+        for _ in range(n):
+            hits = idx.lookup(q)
+        us = (time.perf_counter() - t0) / n * 1e6
+        print(f"\n{q}  ({us:.0f} µs/arama)")
+        for h in hits:
+            print(f"  {h.score:.3f}  {h.hint()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,17 @@
+import logging
 import time
+from contextlib import closing
 import yaml
 import pandas as pd
 import streamlit as st
 
-from graph import build_graph
+from runtime import AgentRuntime
+from warmup import warm_up, warmup_config
 from utils.types import AgentState
-from utils.cost import CostTracker
-from utils.llm import LLMService
-from tools.db import connect_readonly
+from utils.tracing import get_tracer
+from utils.logging import setup_logging_from_config
+from utils.metrics import REGISTRY, setup_metrics
+from utils.singleflight import SingleFlight, question_key
 
 # ─────────────────────────────────────
 # SAYFA AYARLARI
@@ -96,6 +100,22 @@ def load_config(path="config.yaml"):
     with open(path, "r") as f:
         return yaml.safe_load(f)
 
+# Süreç genelinde paylaşılan kaynaklar (tüm tarayıcı oturumları için tek kopya):
+# DB havuzu, LLM istemcisi, bir kez derlenmiş graf (RAG indeksi dahil), şema kataloğu.
+# Hepsi thread-safe; oturum başına yalnızca sohbet geçmişi tutulur.
+# Isınma burada yapılır: ilk sayfa, ısınma bitince (sıcak runtime ile) açılır.
+@st.cache_resource(show_spinner="Çalışma zamanı hazırlanıyor…")
+def get_runtime(path="config.yaml"):
+    rt = AgentRuntime(load_config(path))
+    if warmup_config(rt.cfg)["enabled"]:
+        warm_up(rt)
+    return rt
+
+@st.cache_resource(show_spinner=False)
+def get_flight():
+    # Oturumlar arası paylaşılır: aynı anda sorulan aynı soru bir kez çalışır
+    return SingleFlight("ui")
+
 class StepStatus:
     def __init__(self, min_run=0.45, done_hold=0.45):
         self.min_run = float(min_run)
@@ -108,6 +128,7 @@ class StepStatus:
 STEP_LABELS = {
     "planner":   ("🤔", "Analiz"),
     "schema":    ("📚", "Şema"),
+    "tmpl":      ("⚡", "Şablon"),
     "rag":       ("🔎", "RAG"),
     "qgen":      ("🧮", "SQL"),
     "qval":      ("🛡️", "Doğrulama"),
@@ -143,24 +164,18 @@ st.markdown("""
 # OTURUM
 # ─────────────────────────────────────
 cfg = load_config()
-if "conn" not in st.session_state:
-    st.session_state.conn = connect_readonly(
-        cfg["db"]["path"],
-        timeout_ms=cfg["db"]["timeout_ms"],
-        max_instructions=cfg["db"]["max_instructions"],
-    )
-if "llm" not in st.session_state:
-    st.session_state.llm = LLMService(
-        model_name=cfg["llm"]["model_name"],
-        max_tokens=cfg["llm"]["max_tokens"],
-        temperature=cfg["llm"]["temperature"],
-        base_url=cfg["llm"]["base_url"],
-        api_key=cfg["llm"]["api_key"],
-        timeout=cfg["llm"].get("timeout", 30),
-    )
+# Kuyruk tabanlı log hattı (süreç başına bir kez kurulur; rerun'larda yalnızca seviye güncellenir)
+setup_logging_from_config(cfg)
+# Metrik kaydı süreç başına bir kez kurulur (rerun'larda idempotent); port verildiyse /metrics açılır
+setup_metrics(cfg, get_tracer(cfg))
+rt = get_runtime()
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
+with st.sidebar:
+    with st.expander("📈 Metrikler", expanded=False):
+        st.code(REGISTRY.render(), language="text")
+
 # ─────────────────────────────────────
 # GEÇMİŞ
 # ─────────────────────────────────────
@@ -186,38 +201,46 @@ if user_prompt:
         ans_ph = st.empty()
         meta_ph = st.empty()
 
-        cost = CostTracker(cfg["llm"]["price_per_1k_input"], cfg["llm"]["price_per_1k_output"])
-        state = AgentState(question=user_prompt)
-        graph = build_graph(st.session_state.conn, cfg, cost, st.session_state.llm)
-
         done_steps: set[str] = set()
-        running_step: str | None = None
         stepper = StepStatus()
         t0 = time.time()
 
-        tl_ph.markdown(timeline_html(running_step, done_steps), unsafe_allow_html=True)
+        tl_ph.markdown(timeline_html(None, done_steps), unsafe_allow_html=True)
 
-        final_state_dict = None
-        try:
-            for event in graph.stream(state, config={"recursion_limit": cfg["runtime"].get("recursion_limit", 100)}):
-                step = list(event.keys())[0]
-                running_step = step
-                start_ts = time.time()
-                tl_ph.markdown(timeline_html(running_step, done_steps), unsafe_allow_html=True)
+        def run_graph():
+            cost = rt.new_cost()
+            final_state_dict = None
+            # closing: rerun/stop ile kesilirse havuz bağlantısı hemen iade edilir
+            with closing(rt.stream(user_prompt, cost=cost)) as events:
+                for event in events:
+                    step = list(event.keys())[0]
+                    start_ts = time.time()
+                    tl_ph.markdown(timeline_html(step, done_steps), unsafe_allow_html=True)
 
-                final_state_dict = event[step]
-                stepper.wait_min(start_ts)
+                    final_state_dict = event[step]
+                    stepper.wait_min(start_ts)
 
-                done_steps.add(step)
-                running_step = None
-                tl_ph.markdown(timeline_html(running_step, done_steps), unsafe_allow_html=True)
-                time.sleep(stepper.done_hold)
+                    done_steps.add(step)
+                    tl_ph.markdown(timeline_html(None, done_steps), unsafe_allow_html=True)
+                    time.sleep(stepper.done_hold)
+            return final_state_dict, cost
+
+        def on_wait():
+            tl_ph.markdown("<div class='badge'>⏳ Aynı soru şu an çalışıyor; sonucu bekleniyor…</div>", unsafe_allow_html=True)
+
+        try:
+            if cfg["runtime"].get("single_flight", True):
+                (final_state_dict, cost), coalesced = get_flight().do(question_key(user_prompt), run_graph, on_wait=on_wait)
+            else:
+                (final_state_dict, cost), coalesced = run_graph(), False
 
             fs = AgentState(**final_state_dict) if isinstance(final_state_dict, dict) else final_state_dict
             answer_text = getattr(fs, "answer_text", None) or "(cevap oluşturulamadı)"
             elapsed = time.time() - t0
             meta = f"⏱ {elapsed:.2f} s  ·  💲 ≈ {getattr(cost, 'usd', lambda: 0.0)():.4f} USD" if callable(getattr(cost, 'usd', None)) else f"⏱ {elapsed:.2f} s"
 
+            if coalesced:
+                meta += "  ·  🔗 paylaşılan sonuç"
             tl_ph.markdown("", unsafe_allow_html=True)
             meta_ph.markdown(f"<div class='badge'>✅ Tamamlandı · {meta}</div>", unsafe_allow_html=True)
 
@@ -228,6 +251,12 @@ if user_prompt:
                 time.sleep(0.02)
 
             st.session_state.messages.append({"role": "assistant", "content": answer_text})
+            mc = cfg.get("metrics", {})
+            if mc.get("enabled") and mc.get("dump_path"):
+                try:
+                    REGISTRY.dump(mc["dump_path"])
+                except OSError as e:   # metrik dosyası yazılamadı diye yanıt hataya dönmesin
+                    logging.getLogger("analist_agent").warning("Metrik dosyası yazılamadı: %s", e)
 
             validated_sql = getattr(fs, "validated_sql", None)
             rows_preview = getattr(fs, "rows_preview", None)
@@ -0,0 +1,167 @@
+# utils/excerpt.py
+"""
+Summarizer prompt'u için kompakt veri excerpt kodlayıcıları.
+
+json.dumps(rows) her satırda kolon adlarını tekrarlar; geniş sonuçlarda girdi
+token'ının büyük kısmı anahtar tekrarıdır. Buradaki kodlayıcılar aynı veriyi
+daha az token ile verir:
+
+  - csv / tsv : başlık + satırlar
+  - columnar  : kolon başına tek satır (az satır × çok kolon / tekrar eden değerler)
+  - sketch    : büyük sonuçlar için istatistiksel özet (baş/son satırlar, top-k,
+                distinct sayıları, sayısal min/max/ortalama/toplam)
+  - json      : eski format (karşılaştırma / geri dönüş için)
+
+encode_excerpt() token bütçesine sığan en kısa gösterimi seçer.
+"""
+from __future__ import annotations
+import csv
+import io
+import json
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from utils.cost import CostTracker
+
+Rows = List[Dict[str, Any]]
+
+# auto modunda denenecek tam (kayıpsız) gösterimler
+LOSSLESS = ("csv", "tsv", "columnar")
+
+
+def _fmt(v: Any) -> str:
+    """Değeri kısa metne çevirir (float'lar 4 ondalığa yuvarlanır, None → boş)."""
+    if v is None:
+        return ""
+    if isinstance(v, float):
+        v = round(v, 4)
+        return str(int(v)) if v.is_integer() else repr(v)
+    return str(v)
+
+
+def _columns(rows: Rows) -> List[str]:
+    return list(rows[0].keys()) if rows else []
+
+
+def encode_json(rows: Rows) -> str:
+    return json.dumps(rows, ensure_ascii=False)
+
+
+def _encode_delimited(rows: Rows, delimiter: str) -> str:
+    buf = io.StringIO()
+    w = csv.writer(buf, delimiter=delimiter, lineterminator="\n")
+    cols = _columns(rows)
+    w.writerow(cols)
+    for r in rows:
+        w.writerow([_fmt(r.get(c)) for c in cols])
+    return buf.getvalue().rstrip("\n")
+
+
+def encode_csv(rows: Rows) -> str:
+    return _encode_delimited(rows, ",")
+
+
+def encode_tsv(rows: Rows) -> str:
+    return _encode_delimited(rows, "\t")
+
+
+def encode_columnar(rows: Rows) -> str:
+    """Kolon başına bir satır: `kolon: v1 | v2 | ...` (satır sırası korunur)."""
+    out = []
+    for c in _columns(rows):
+        vals = [_fmt(r.get(c)).replace("|", "/") for r in rows]
+        out.append(f"{c}: " + " | ".join(vals))
+    return "\n".join(out)
+
+
+def _is_num(v: Any) -> bool:
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+
+def encode_sketch(rows: Rows, truncated: bool = False, head: int = 5, tail: int = 3, top_k: int = 5) -> str:
+    """
+    İstatistiksel özet: satır sayısı, kolon başına sayısal özet veya distinct/top-k,
+    ardından ilk `head` ve son `tail` satır (CSV).
+    truncated=True ise özet yalnızca önizleme satırlarını kapsar (rows=N+).
+    """
+    cols = _columns(rows)
+    n = len(rows)
+    lines = [f"rows={n}+ (sonuç kesildi; özet ilk {n} satırdan)" if truncated else f"rows={n}"]
+    for c in cols:
+        vals = [r.get(c) for r in rows if r.get(c) is not None]
+        nulls = n - len(vals)
+        null_txt = f", null={nulls}" if nulls else ""
+        if vals and all(_is_num(v) for v in vals):
+            s = sum(vals)
+            lines.append(
+                f"{c}: num min={_fmt(min(vals))} max={_fmt(max(vals))} "
+                f"avg={_fmt(s / len(vals))} sum={_fmt(s)}{null_txt}"
+            )
+        else:
+            cnt = Counter(_fmt(v) for v in vals)
+            top = ", ".join(f"{v}({k})" for v, k in cnt.most_common(top_k))
+            lines.append(f"{c}: distinct={len(cnt)} top: {top}{null_txt}")
+    if n <= head + tail:
+        sample = rows
+        lines.append("satırlar:")
+    else:
+        sample = rows[:head] + rows[-tail:]
+        lines.append(f"ilk {head} + son {tail} satır:")
+    lines.append(encode_csv(sample))
+    return "\n".join(lines)
+
+
+ENCODERS: Dict[str, Callable[[Rows], str]] = {
+    "json": encode_json,
+    "csv": encode_csv,
+    "tsv": encode_tsv,
+    "columnar": encode_columnar,
+}
+
+
+def encode_excerpt(
+    rows: Rows,
+    fmt: str = "auto",
+    budget_tokens: int = 1200,
+    max_rows: int = 50,
+    truncated: bool = False,
+    candidates: Sequence[str] = LOSSLESS,
+) -> Tuple[str, str]:
+    """
+    Satırları prompt için kodlar. Döndürür: (metin, açıklama) — açıklama prompt
+    etiketinde kullanılır (ör. "csv, 20 satır"). truncated: executor sonucu
+    önizleme sınırında kesti mi (execution_stats["truncated"]).
+
+    fmt="auto": ilk `max_rows` satırın kayıpsız gösterimlerinden bütçeye sığan en
+    kısası; hiçbiri sığmıyorsa sketch, o da sığmıyorsa en kısa gösterim satır
+    bazında kırpılır.
+    Belirli bir format verilirse bütçeye bakılmaksızın o kullanılır.
+    """
+    if not rows:
+        return "(boş)", "boş"
+    data = rows[:max_rows]
+    cut = truncated or len(rows) > len(data)
+    more = " (sonuç daha uzun)" if cut else ""
+
+    if fmt == "sketch":
+        return encode_sketch(rows, cut), "sketch"
+    if fmt in ENCODERS:
+        return ENCODERS[fmt](data), f"{fmt}, ilk {len(data)} satır{more}"
+
+    est = CostTracker.est_tokens
+    best: Optional[Tuple[int, str, str]] = None
+    for name in candidates:
+        txt = ENCODERS[name](data)
+        t = est(txt)
+        if best is None or t < best[0]:
+            best = (t, txt, name)
+    if best and best[0] <= budget_tokens:
+        return best[1], f"{best[2]}, {len(data)} satır{more}"
+
+    # Büyük sonuç: sketch; o da taşarsa kayıpsız gösterimi satır bazında kırp
+    sketch = encode_sketch(rows, cut)
+    if est(sketch) <= budget_tokens or best is None:
+        return sketch, "sketch"
+    _, txt, name = best
+    keep = max(1, int(len(data) * budget_tokens / max(1, best[0])))
+    return ENCODERS[name](data[:keep]), f"{name}, ilk {keep} satır (sonuç daha uzun)"
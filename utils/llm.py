@@ -1,12 +1,22 @@
 import logging
+import threading
+import time
 from typing import Optional
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
-from langchain_openai import ChatOpenAI
 from utils.cost import CostTracker
+from utils import tracing
+from utils.metrics import LLM_LATENCY, LLM_REQUESTS, LLM_RETRIES, LLM_TOKENS
 
 # LLM yardımcı modülü için logger
 log = logging.getLogger("llm")
 
+
+def _on_retry(retry_state) -> None:
+    # tenacity before_sleep: her yeniden denemeden önce çağrılır
+    LLM_RETRIES.inc()
+    exc = retry_state.outcome.exception() if retry_state.outcome else None
+    log.warning("LLM çağrısı başarısız (deneme %d): %s", retry_state.attempt_number, exc)
+
 class LLMService:
     """
     OpenAI-compatible LLM istemcisi (LangChain ChatOpenAI üzerinden).
@@ -26,10 +36,9 @@ class LLMService:
         self.max_tokens = max_tokens
         self.temperature = temperature
 
-        # LangChain ChatOpenAI istemcisi:
-        # - OpenAI uyumlu endpoint'e bağlanır
-        # - invoke(messages) ile çağrılır
-        self.llm = ChatOpenAI(
+        # LangChain ChatOpenAI istemcisi ilk çağrıda kurulur (langchain_openai/openai importu
+        # ~0.6 s; LLM'e hiç gitmeyen yollar ve başlangıç bu maliyeti ödemez)
+        self._client_kwargs = dict(
             base_url=base_url,
             model=model_name,
             max_tokens=max_tokens,
@@ -37,12 +46,25 @@ class LLMService:
             api_key=api_key,
             **kwargs
         )
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def llm(self):
+        """ChatOpenAI istemcisi (lazy; OpenAI uyumlu endpoint'e bağlanır, invoke(messages) ile çağrılır)."""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from langchain_openai import ChatOpenAI
+                    self._client = ChatOpenAI(**self._client_kwargs)
+        return self._client
 
     @retry(
         reraise=True,                                 # hata sürerse çağırana fırlat
         stop=stop_after_attempt(3),                   # en fazla 3 deneme
         wait=wait_exponential(multiplier=0.5, min=0.5, max=4),  # üstel bekleme
         retry=retry_if_exception_type(Exception),     # Exception tipinde ise yeniden dene
+        before_sleep=_on_retry,                       # retry sayacı (metrics)
     )
     def get_text(self, system: str, user: str, **kwargs) -> str:
         """
@@ -59,16 +81,81 @@ class LLMService:
         text = getattr(resp, "content", None) or str(resp)
         return text
 
+class BoundedLLM:
+    """
+    Eşzamanlı LLM çağrılarını max_concurrency ile sınırlar (get_text semaforla korunur).
+    Graf thread'leri LLM dışındaki adımlarda (SQL, özet) serbestçe paralel koşar; model
+    sunucusuna aynı anda en fazla N istek gider. Diğer öznitelikler iç istemciye aktarılır.
+    """
+    def __init__(self, inner, max_concurrency: int):
+        self.inner = inner
+        self.max_concurrency = int(max_concurrency)
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+
+    def get_text(self, system: str, user: str, **kwargs) -> str:
+        with self._slots:
+            return self.inner.get_text(system, user, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+def make_llm(cfg):
+    """
+    config.yaml 'llm' bölümünden istemci kurar (main/Streamlit/eval/API ortak).
+    use_mock: true → utils.mock_llm.MockLLMService (fixture oynatma / kayıt, sentetik gecikme).
+    endpoints verildiyse → utils.llm_pool.MultiEndpointLLM (dengeleme, deadline, hedge, devre kesici).
+    max_concurrency verildiyse istemci BoundedLLM ile sarılır.
+    """
+    lc = cfg["llm"]
+    if lc.get("use_mock"):
+        from utils.mock_llm import make_mock_llm
+        llm = make_mock_llm(cfg, inner_factory=lambda: _real_llm(lc))
+    elif lc.get("endpoints"):
+        from utils.llm_pool import from_config
+        llm = from_config(lc)
+    else:
+        llm = _real_llm(lc)
+    if lc.get("max_concurrency"):
+        llm = BoundedLLM(llm, lc["max_concurrency"])
+    return llm
+
+def _real_llm(lc) -> LLMService:
+    kwargs = {}
+    if lc.get("timeout") is not None:
+        kwargs["timeout"] = lc["timeout"]
+    return LLMService(
+        model_name=lc["model_name"],
+        max_tokens=lc["max_tokens"],
+        temperature=lc["temperature"],
+        base_url=lc["base_url"],
+        api_key=lc["api_key"],
+        **kwargs,
+    )
+
 def call_llm_text(llm: LLMService, system: str, user: str, cost: Optional[CostTracker]=None, **kwargs) -> str:
     """
     Yüksek seviyeli yardımcı:
       - LLMService.get_text'i çağırır
       - CostTracker'a yaklaşık token/maliyet ekler (varsa)
+      - Aktif trace span'ine gecikme ve token sayılarını yazar
       - Üretilen metni döndürür
     """
-    out = llm.get_text(system, user, **kwargs)
+    t0 = time.perf_counter()
+    try:
+        out = llm.get_text(system, user, **kwargs)
+    except Exception:
+        LLM_REQUESTS.inc(outcome="error")
+        raise
+    ms = (time.perf_counter() - t0) * 1000
+    prompt = system + "\n" + user
     if cost is not None:
         # Yaklaşık token hesabı: gerçek usage metrikleri yoksa prompt+cevap üzerinden
-        cost.add_call(system + "\n" + user, out)
+        cost.add_call(prompt, out)
+    t_in, t_out = CostTracker.est_tokens(prompt), CostTracker.est_tokens(out)
+    tracing.record_llm(ms, t_in, t_out)
+    LLM_REQUESTS.inc(outcome="ok")
+    LLM_LATENCY.observe(ms / 1000)
+    LLM_TOKENS.inc(t_in, direction="in")
+    LLM_TOKENS.inc(t_out, direction="out")
     log.debug("LLM çıktı uzunluğu: %d", len(out))
     return out
@@ -0,0 +1,342 @@
+# utils/llm_pool.py
+"""
+Çok uç noktalı (multi-endpoint) OpenAI-compatible LLM istemcisi.
+
+llm.endpoints listesi verildiğinde utils.llm.make_llm bunu döndürür (LLMService ile aynı
+get_text(system, user) arayüzü). Tek bir yavaş/bozuk replikanın soruyu uzun süre kilitlemesini
+önler:
+
+  - Yük dengeleme: en az bekleyen istek (least outstanding requests); eşitlikte rastgele
+  - Süre bütçesi (deadline): her istek deadline_s içinde biter; her denemenin zaman aşımı
+    min(attempt_timeout_s, kalan bütçe) ile kırpılır, bekleme (backoff) bütçeyi aşacaksa
+    yeniden denenmez
+  - Yeniden deneme yalnızca geçici hatalarda: bağlantı/zaman aşımı, HTTP 429 ve 5xx
+    (4xx istek hataları hemen yükseltilir)
+  - Hedging: birincil deneme son başarılı çağrıların p95'i kadar sürede dönmezse başka bir
+    replikaya ikinci (yedek) istek gönderilir; ilk dönen kazanır, diğerinin sonucu yok sayılır
+  - Devre kesici (circuit breaker): ardışık breaker_failures geçici hatada replika
+    breaker_cooldown_s boyunca rotasyondan çıkar; süre dolunca tek deneme (half-open) ile
+    geri alınır
+
+HTTP için httpx kullanılır (replika başına kalıcı bağlantı havuzu; deneme başına zaman aşımı).
+Yerel stand-in sunucularla denemek için: python bench/bench_llm_client.py
+"""
+from __future__ import annotations
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+
+from utils.metrics import LLM_BREAKER_STATE, LLM_ENDPOINT_REQUESTS, LLM_HEDGES, LLM_OUTSTANDING, LLM_RETRIES
+
+log = logging.getLogger("llm_pool")
+
+CLIENT_DEFAULTS = {
+    "deadline_s": 60.0,
+    "attempt_timeout_s": 30.0,
+    "max_attempts": 3,
+    "backoff_s": 0.5,
+    "backoff_max_s": 4.0,
+    "hedge": True,
+    "hedge_delay_s": 2.0,
+    "hedge_min_samples": 20,
+    "breaker_failures": 5,
+    "breaker_cooldown_s": 30.0,
+}
+
+
+class LLMUnavailable(RuntimeError):
+    """Rotasyonda sağlıklı replika yok (tüm devreler açık)."""
+
+
+class DeadlineExceeded(TimeoutError):
+    """İstek süre bütçesi (deadline_s) doldu."""
+
+
+class TransientError(RuntimeError):
+    """Yeniden denenebilir hata (HTTP 429/5xx)."""
+
+
+class CircuitBreaker:
+    """closed → (ardışık N hata) → open → (cooldown) → half_open → başarı: closed / hata: open"""
+
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+    def __init__(self, failures: int = 5, cooldown_s: float = 30.0):
+        self.failures = max(1, int(failures))
+        self.cooldown_s = float(cooldown_s)
+        self.state = self.CLOSED
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._probe = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Bu replikaya şimdi istek gönderilebilir mi? (half-open'da aynı anda tek deneme)"""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown_s:
+                self.state, self._probe = self.HALF_OPEN, False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probe:
+                self._probe = True
+                return True
+            return False
+
+    def available(self) -> bool:
+        """allow()'un yan etkisiz hali (seçim öncesi filtre)."""
+        with self._lock:
+            if self.state == self.OPEN:
+                return time.monotonic() - self._opened_at >= self.cooldown_s
+            return self.state == self.CLOSED or not self._probe
+
+    def success(self) -> None:
+        with self._lock:
+            self.state, self._consecutive, self._probe = self.CLOSED, 0, False
+
+    def release(self) -> None:
+        """Sonuçsuz deneme (bütçe doldu): half-open deneme hakkını geri ver."""
+        with self._lock:
+            self._probe = False
+
+    def failure(self) -> bool:
+        """Hata kaydet; devre bu hatayla açıldıysa True."""
+        with self._lock:
+            self._consecutive += 1
+            if self.state == self.HALF_OPEN or self._consecutive >= self.failures:
+                opened = self.state != self.OPEN
+                self.state, self._opened_at, self._probe = self.OPEN, time.monotonic(), False
+                return opened
+            return False
+
+
+class Endpoint:
+    """Tek replika: httpx istemcisi (lazy), bekleyen istek sayısı, devre kesici."""
+
+    def __init__(self, base_url: str, api_key: str, model: str, breaker: CircuitBreaker):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.model = model
+        self.breaker = breaker
+        self.outstanding = 0
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import httpx
+                    self._client = httpx.Client(
+                        base_url=self.base_url,
+                        headers={"Authorization": f"Bearer {self.api_key}"},
+                        limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+                    )
+        return self._client
+
+    def begin(self) -> None:
+        with self._lock:
+            self.outstanding += 1
+        LLM_OUTSTANDING.inc(endpoint=self.base_url)
+
+    def end(self) -> None:
+        with self._lock:
+            self.outstanding -= 1
+        LLM_OUTSTANDING.dec(endpoint=self.base_url)
+
+    def close(self) -> None:
+        if self._client is not None:
+            self._client.close()
+
+
+class MultiEndpointLLM:
+    """Birden çok OpenAI-compatible replika üzerinde dengeli, süre bütçeli, hedge'li get_text."""
+
+    def __init__(
+        self,
+        endpoints: List[Dict[str, str]],
+        model_name: str,
+        max_tokens: int = 4096,
+        temperature: float = 0.7,
+        api_key: str = "dummy",
+        **client_cfg,
+    ):
+        if not endpoints:
+            raise ValueError("MultiEndpointLLM: en az bir endpoint gerekli")
+        cc = {**CLIENT_DEFAULTS, **{k: v for k, v in client_cfg.items() if v is not None}}
+        self.cc = cc
+        self.model_name = model_name
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.endpoints = [
+            Endpoint(
+                e["base_url"],
+                e.get("api_key") or api_key,
+                e.get("model") or model_name,
+                CircuitBreaker(cc["breaker_failures"], cc["breaker_cooldown_s"]),
+            )
+            for e in endpoints
+        ]
+        for ep in self.endpoints:
+            LLM_BREAKER_STATE.set(CircuitBreaker.CLOSED, endpoint=ep.base_url)
+        # Başarılı çağrı süreleri (s) → hedge gecikmesi için p95
+        self._lat: deque = deque(maxlen=512)
+        self._lat_lock = threading.Lock()
+        # Denemeler thread'lerde koşar: kaybeden hedge isteği çağıranı bekletmeden arkada biter
+        self._pool = ThreadPoolExecutor(max_workers=16 * len(self.endpoints), thread_name_prefix="llm")
+
+    # --- seçim ----------------------------------------------------------------------
+    def _pick(self, exclude=(), avoid=()) -> Optional[Endpoint]:
+        # exclude: kesinlikle seçilmez (hedge ≠ birincil); avoid: yalnızca başka seçenek yoksa
+        # (yeniden deneme, az önce hata veren replikaya değil öncelikle diğerlerine gider)
+        cands = [ep for ep in self.endpoints if ep not in exclude and ep.breaker.available()]
+        random.shuffle(cands)
+        for ep in sorted(cands, key=lambda e: (e in avoid, e.outstanding)):
+            if ep.breaker.allow():
+                return ep
+        return None
+
+    def hedge_delay(self) -> float:
+        with self._lat_lock:
+            xs = sorted(self._lat)
+        if len(xs) < int(self.cc["hedge_min_samples"]):
+            return float(self.cc["hedge_delay_s"])
+        return xs[min(len(xs) - 1, int(0.95 * len(xs)))]
+
+    # --- tek deneme -------------------------------------------------------------------
+    def _call(self, ep: Endpoint, payload: Dict[str, Any], deadline: float) -> str:
+        import httpx
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded("LLM süre bütçesi doldu")
+        # Zaman aşımı isteğin kalan bütçesinden geliyorsa replika suçlanmaz (devreye yazılmaz)
+        budget_bound = remaining < float(self.cc["attempt_timeout_s"])
+        timeout = min(float(self.cc["attempt_timeout_s"]), remaining)
+        ep.begin()
+        t0 = time.monotonic()
+        try:
+            r = ep.client.post("/chat/completions", json={**payload, "model": ep.model}, timeout=timeout)
+            if r.status_code == 429 or r.status_code >= 500:
+                raise TransientError(f"HTTP {r.status_code}: {r.text[:200]}")
+            r.raise_for_status()
+            text = r.json()["choices"][0]["message"]["content"] or ""
+        except httpx.TimeoutException as e:
+            if budget_bound:
+                LLM_ENDPOINT_REQUESTS.inc(endpoint=ep.base_url, outcome="deadline")
+                ep.breaker.release()
+                raise DeadlineExceeded("LLM süre bütçesi doldu") from e
+            self._record_failure(ep, e)
+            raise
+        except (httpx.TransportError, TransientError) as e:
+            self._record_failure(ep, e)
+            raise
+        except Exception:
+            # 4xx / bozuk gövde: replika sağlıklı, istek hatalı → devreye yazılmaz
+            LLM_ENDPOINT_REQUESTS.inc(endpoint=ep.base_url, outcome="bad_request")
+            ep.breaker.success()
+            raise
+        finally:
+            ep.end()
+        ep.breaker.success()
+        LLM_BREAKER_STATE.set(CircuitBreaker.CLOSED, endpoint=ep.base_url)
+        LLM_ENDPOINT_REQUESTS.inc(endpoint=ep.base_url, outcome="ok")
+        with self._lat_lock:
+            self._lat.append(time.monotonic() - t0)
+        return text
+
+    def _record_failure(self, ep: Endpoint, e: BaseException) -> None:
+        LLM_ENDPOINT_REQUESTS.inc(endpoint=ep.base_url, outcome="error")
+        if ep.breaker.failure():
+            log.warning("LLM replikası rotasyondan çıkarıldı (%ss): %s — %s", self.cc["breaker_cooldown_s"], ep.base_url, e)
+        LLM_BREAKER_STATE.set(ep.breaker.state, endpoint=ep.base_url)
+
+    # --- hedge'li deneme ----------------------------------------------------------------
+    def _attempt(self, payload: Dict[str, Any], deadline: float, failed: set) -> str:
+        primary = self._pick(avoid=failed)
+        if primary is None:
+            raise LLMUnavailable("Sağlıklı LLM replikası yok (tüm devreler açık)")
+        futs = {self._pool.submit(self._call, primary, payload, deadline): primary}
+        hedge_at = time.monotonic() + self.hedge_delay() if self.cc["hedge"] and len(self.endpoints) > 1 else None
+        error: Optional[BaseException] = None
+        while futs:
+            now = time.monotonic()
+            until = deadline if hedge_at is None else min(deadline, hedge_at)
+            done, _ = wait(futs, timeout=max(0.0, until - now), return_when=FIRST_COMPLETED)
+            if not done:
+                if hedge_at is not None and time.monotonic() < deadline:
+                    hedge_at = None   # deneme başına tek hedge
+                    ep = self._pick(exclude=set(futs.values()), avoid=failed)
+                    if ep is not None:
+                        LLM_HEDGES.inc(result="sent")
+                        futs[self._pool.submit(self._call, ep, payload, deadline)] = ep
+                    continue
+                raise DeadlineExceeded("LLM süre bütçesi doldu")
+            for f in done:
+                ep = futs.pop(f)
+                try:
+                    text = f.result()
+                except Exception as e:
+                    failed.add(ep)
+                    error = e
+                    continue
+                if ep is not primary:
+                    LLM_HEDGES.inc(result="won")
+                return text
+        raise error
+
+    def get_text(self, system: str, user: str, **kwargs) -> str:
+        payload = {
+            "messages": [{"role": "system", "content": system}, {"role": "user", "content": user}],
+            "max_tokens": kwargs.pop("max_tokens", self.max_tokens),
+            "temperature": kwargs.pop("temperature", self.temperature),
+            **kwargs,
+        }
+        deadline = time.monotonic() + float(self.cc["deadline_s"])
+        attempt, failed = 0, set()
+        while True:
+            attempt += 1
+            try:
+                return self._attempt(payload, deadline, failed)
+            except (DeadlineExceeded, LLMUnavailable):
+                raise
+            except Exception as e:
+                if not _transient(e) or attempt >= int(self.cc["max_attempts"]):
+                    raise
+                backoff = min(float(self.cc["backoff_max_s"]), float(self.cc["backoff_s"]) * 2 ** (attempt - 1))
+                backoff *= random.uniform(0.5, 1.0)
+                if time.monotonic() + backoff >= deadline:
+                    raise DeadlineExceeded("LLM süre bütçesi yeniden denemeye yetmiyor") from e
+                LLM_RETRIES.inc()
+                log.warning("LLM çağrısı başarısız (deneme %d): %s", attempt, e)
+                time.sleep(backoff)
+
+    def status(self) -> List[Dict[str, Any]]:
+        names = {CircuitBreaker.CLOSED: "closed", CircuitBreaker.HALF_OPEN: "half_open", CircuitBreaker.OPEN: "open"}
+        return [{"base_url": ep.base_url, "outstanding": ep.outstanding, "breaker": names[ep.breaker.state]} for ep in self.endpoints]
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        for ep in self.endpoints:
+            ep.close()
+
+
+def _transient(e: BaseException) -> bool:
+    import httpx
+    return isinstance(e, (TransientError, httpx.TransportError))
+
+
+def from_config(lc: Dict[str, Any]) -> MultiEndpointLLM:
+    """llm bölümünden kurar; endpoints öğeleri URL string'i veya {base_url, api_key?, model?}."""
+    eps = [{"base_url": e} if isinstance(e, str) else dict(e) for e in lc["endpoints"]]
+    return MultiEndpointLLM(
+        eps,
+        model_name=lc["model_name"],
+        max_tokens=lc["max_tokens"],
+        temperature=lc["temperature"],
+        api_key=lc.get("api_key", "dummy"),
+        **(lc.get("client") or {}),
+    )
@@ -1,13 +1,143 @@
-import logging, os, sys
-from rich.logging import RichHandler
+import atexit, copy, json, logging, os, queue, sys, time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from typing import Optional
+
+# Kuyruk dinleyicisi (süreç başına bir kez kurulur; Streamlit rerun'larında tekrar kurulmaz)
+_LISTENER: Optional[QueueListener] = None
+
+# JSON satırına taşınmayacak standart LogRecord alanları
+_STD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Her kaydı tek satır JSON olarak yazar (ts, level, logger, msg, trace_id/node, exc, extra alanlar)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        d = {
+            "ts": round(record.created, 6),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for k, v in vars(record).items():
+            if k not in _STD_ATTRS and not k.startswith("_"):
+                d[k] = v if isinstance(v, (str, int, float, bool, type(None))) else str(v)
+        if record.exc_info:
+            d["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            d["exc"] = record.exc_text
+        return json.dumps(d, ensure_ascii=False)
+
+
+class _TraceContextFilter(logging.Filter):
+    """
+    Kaydı üreten thread'de (kuyruğa girmeden önce) aktif span'in trace_id/düğüm adını ekler;
+    kuyruk dinleyicisi farklı thread'de çalıştığı için contextvar orada okunamaz.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        from utils.tracing import current_span
+        sp = current_span()
+        if sp is not None:
+            record.trace_id = sp.trace_id
+            record.node = sp.name
+        return True
+
+
+class _LocalQueueHandler(QueueHandler):
+    """
+    Süreç içi kuyruk için QueueHandler: stdlib prepare() traceback'i msg'ye gömüp exc_info/exc_text'i
+    siler (kayıt pickle'lanabilsin diye). Kuyruk aynı süreçte olduğundan exc_info korunur; böylece
+    JSON formatter'ın "exc" alanı dolar ve RichHandler traceback'i kendisi çizer.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()   # args burada birleştirilir (dinleyici thread'inde değil)
+        record.msg = record.message
+        record.args = None
+        return record
+
+
+def setup_logging(
+    log_dir: str = "logs",
+    level=logging.INFO,
+    json_lines: bool = True,
+    console: bool = True,
+    max_bytes: int = 20 * 1024 * 1024,
+    backup_count: int = 5,
+    rotate_when: Optional[str] = None,
+):
+    """
+    Bloklamayan log hattı:
+      uygulama thread'leri → QueueHandler (yalnızca kuyruğa koyar)
+                           → QueueListener thread'i → dosya (+ konsol) handler'ları
+    Dosya: JSON lines (run.jsonl) veya düz metin (run.log); boyut (max_bytes) ya da
+    zaman (rotate_when: 'midnight', 'H' ...) bazlı döndürme.
+    İdempotent: ikinci çağrı yalnızca seviyeyi günceller.
+    """
+    global _LISTENER
+    root = logging.getLogger()
+    root.setLevel(level)
+    if _LISTENER is not None:
+        return logging.getLogger("analist_agent")
 
-def setup_logging(log_dir: str="logs", level=logging.INFO):
     os.makedirs(log_dir, exist_ok=True)
-    log_path = os.path.join(log_dir, "run.log")
-    logging.basicConfig(
-        level=level,
-        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
-        datefmt="[%H:%M:%S]",
-        handlers=[RichHandler(rich_tracebacks=True), logging.FileHandler(log_path, encoding="utf-8")]
+    log_path = os.path.join(log_dir, "run.jsonl" if json_lines else "run.log")
+    if rotate_when:
+        file_h = TimedRotatingFileHandler(log_path, when=rotate_when, backupCount=backup_count, encoding="utf-8")
+    else:
+        file_h = RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+    file_h.setFormatter(
+        JsonLinesFormatter() if json_lines
+        else logging.Formatter("%(asctime)s | %(levelname)s | %(name)s | %(message)s", datefmt="[%H:%M:%S]")
     )
+    handlers = [file_h]
+    if console:
+        try:
+            from rich.logging import RichHandler
+            con_h = RichHandler(rich_tracebacks=True)
+        except ImportError:
+            con_h = logging.StreamHandler(sys.stderr)
+            con_h.setFormatter(logging.Formatter("%(asctime)s | %(levelname)s | %(name)s | %(message)s", datefmt="[%H:%M:%S]"))
+        handlers.append(con_h)
+
+    q: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    qh = _LocalQueueHandler(q)
+    qh.addFilter(_TraceContextFilter())
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    root.addHandler(qh)
+
+    _LISTENER = QueueListener(q, *handlers, respect_handler_level=True)
+    _LISTENER.start()
+    atexit.register(_LISTENER.stop)   # çıkışta kuyruğu boşalt
     return logging.getLogger("analist_agent")
+
+
+def flush_logging() -> None:
+    """
+    Kuyruktaki kayıtları şimdi yazar (dinleyici durdurulup yeniden başlatılır).
+    Sinyalle sonlanan süreçlerde (uvicorn SIGTERM'i kapanıştan sonra yeniden yükseltir) atexit
+    çalışmayabilir; kapanış adımlarının sonunda çağrılır.
+    """
+    if _LISTENER is not None:
+        _LISTENER.stop()
+        _LISTENER.start()
+
+
+def setup_logging_from_config(cfg: dict):
+    """config.yaml: runtime.debug/log_dir + 'logging' bölümünden setup_logging çağırır."""
+    rt = cfg.get("runtime", {})
+    lc = cfg.get("logging", {}) or {}
+    level = lc.get("level") or ("DEBUG" if rt.get("debug") else "INFO")
+    return setup_logging(
+        log_dir=rt.get("log_dir", "logs"),
+        level=getattr(logging, str(level).upper(), logging.INFO),
+        json_lines=lc.get("json", True),
+        console=lc.get("console", True),
+        max_bytes=int(lc.get("max_bytes", 20 * 1024 * 1024)),
+        backup_count=int(lc.get("backup_count", 5)),
+        rotate_when=lc.get("rotate_when"),
+    )
@@ -0,0 +1,270 @@
+# utils/metrics.py
+"""
+Süreç içi metrik kaydı (Prometheus text exposition 0.0.4 uyumlu, ek bağımlılık yok).
+
+  - Counter / Gauge / Histogram, etiket (label) destekli, thread-safe
+  - REGISTRY.render()          → /metrics metni
+  - REGISTRY.dump(path)        → dosyaya atomik yazım (node_exporter textfile collector)
+  - serve(port)                → arka plan thread'inde http://0.0.0.0:<port>/metrics
+
+Uygulama metrikleri bu modülde tanımlıdır; trace'ler bittikçe observe_trace()
+ile (Tracer dinleyicisi) doldurulur. LLM retry/hata ve SQL abort sayaçları ilgili
+noktalarda doğrudan artırılır.
+"""
+from __future__ import annotations
+import logging
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+log = logging.getLogger("metrics")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Saniye cinsinden gecikme kovaları (1 ms … 60 s)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _esc(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_esc(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{_esc(extra[1])}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _fmt_num(x: float) -> str:
+    if x == float("inf"):
+        return "+Inf"
+    return repr(float(x)) if isinstance(x, float) and not float(x).is_integer() else str(int(x))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: etiketler {self.labelnames} olmalı, gelen {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        head = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(head + list(self._samples()))
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        k = self._key(labels)
+        with self._lock:
+            self._values[k] = self._values.get(k, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        if not items and not self.labelnames:
+            items = [((), 0.0)]   # etiketsiz sayaç: henüz artmamış olsa da 0 olarak görünür
+        for k, v in items:
+            yield f"{self.name}{_fmt_labels(self.labelnames, k)} {_fmt_num(v)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        k = self._key(labels)
+        with self._lock:
+            self._values[k] = float(value)
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels) -> None:
+        k = self._key(labels)
+        with self._lock:
+            st = self._values.get(k)
+            if st is None:
+                st = self._values[k] = [[0] * len(self.buckets), 0.0, 0]
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    st[0][i] += 1
+                    break
+            st[1] += value
+            st[2] += 1
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._values.items())
+        for k, (counts, total, n) in items:
+            acc = 0
+            for b, c in zip(self.buckets, counts):
+                acc += c
+                yield f"{self.name}_bucket{_fmt_labels(self.labelnames, k, ('le', _fmt_num(b)))} {acc}"
+            yield f"{self.name}_sum{_fmt_labels(self.labelnames, k)} {_fmt_num(total)}"
+            yield f"{self.name}_count{_fmt_labels(self.labelnames, k)} {n}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, *args, **kwargs):
+        with self._lock:
+            m = self._metrics.get(name)
+            if m is None:
+                m = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(m, cls):
+                raise ValueError(f"{name} zaten {m.kind} olarak kayıtlı")
+            return m
+
+    def counter(self, name: str, doc: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get(Counter, name, doc, labelnames)
+
+    def gauge(self, name: str, doc: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get(Gauge, name, doc, labelnames)
+
+    def histogram(self, name: str, doc: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, doc, labelnames, buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(m.render() for m in metrics) + "\n"
+
+    def dump(self, path: str) -> None:
+        """Atomik yazım: tmp dosya + os.replace (okuyucular yarım dosya görmez)."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+
+REGISTRY = Registry()
+
+# --- Uygulama metrikleri -----------------------------------------------------
+REQUESTS = REGISTRY.counter("analist_requests_total", "Tamamlanan istekler", ("intent", "status"))
+REQUEST_LATENCY = REGISTRY.histogram("analist_request_duration_seconds", "Uçtan uca istek süresi")
+NODE_LATENCY = REGISTRY.histogram("analist_node_duration_seconds", "Graf düğümü süresi", ("node",))
+REPAIR_ITERATIONS = REGISTRY.histogram(
+    "analist_repair_iterations", "İstek başına QGen↔Validator onarım turu", buckets=(0, 1, 2, 3, 5, 8)
+)
+LLM_REQUESTS = REGISTRY.counter("analist_llm_requests_total", "LLM çağrıları (retry'lar sonrası nihai sonuç)", ("outcome",))
+LLM_RETRIES = REGISTRY.counter("analist_llm_retries_total", "tenacity tarafından yapılan LLM yeniden denemeleri")
+LLM_LATENCY = REGISTRY.histogram("analist_llm_duration_seconds", "Başarılı LLM çağrısı süresi (retry'lar dahil)")
+LLM_TOKENS = REGISTRY.counter("analist_llm_tokens_total", "Tahmini LLM token sayısı", ("direction",))
+LLM_ENDPOINT_REQUESTS = REGISTRY.counter(
+    "analist_llm_endpoint_requests_total", "Replika başına LLM denemeleri (çok uç noktalı istemci)", ("endpoint", "outcome")
+)
+LLM_OUTSTANDING = REGISTRY.gauge("analist_llm_outstanding", "Replika başına bekleyen LLM istekleri", ("endpoint",))
+LLM_BREAKER_STATE = REGISTRY.gauge("analist_llm_breaker_state", "Devre kesici durumu (0 kapalı, 1 yarı açık, 2 açık)", ("endpoint",))
+LLM_HEDGES = REGISTRY.counter("analist_llm_hedges_total", "Hedge (yedek) LLM istekleri (sent: gönderildi, won: önce döndü)", ("result",))
+SQL_ABORTS = REGISTRY.counter("analist_sql_aborts_total", "Progress handler ile kesilen SQL sorguları", ("reason",))
+CACHE_REQUESTS = REGISTRY.counter("analist_cache_requests_total", "İsimli cache erişimleri", ("cache", "result"))
+HTTP_REQUESTS = REGISTRY.counter("analist_http_requests_total", "API istekleri (uç nokta, HTTP kodu)", ("endpoint", "code"))
+HTTP_INFLIGHT = REGISTRY.gauge("analist_http_inflight", "API'de çalışan graf istekleri")
+HTTP_QUEUED = REGISTRY.gauge("analist_http_queued", "API'de eşzamanlılık slotu bekleyen istekler")
+SINGLEFLIGHT = REGISTRY.counter(
+    "analist_singleflight_total", "Single-flight çağrıları (leader: çalıştırdı, follower: uçuştaki sonuca katıldı)", ("flight", "role")
+)
+ROLLUP_QUERIES = REGISTRY.counter(
+    "analist_rollup_queries_total", "Rollup'tan yanıtlanan sorgular (hit) ve taban sorguya dönüşler (error)", ("rollup", "outcome")
+)
+WARMUP_SECONDS = REGISTRY.gauge("analist_warmup_duration_seconds", "Son başlangıç ısınmasının adım bazlı süresi", ("step",))
+
+
+def observe_trace(rec: Dict[str, Any]) -> None:
+    """Tracer dinleyicisi: biten iz kaydından istek/düğüm/cache metriklerini günceller."""
+    REQUESTS.inc(intent=rec.get("intent") or "unknown", status=rec.get("status", "ok"))
+    REQUEST_LATENCY.observe(rec["duration_ms"] / 1000)
+    REPAIR_ITERATIONS.observe(rec.get("repair_attempts") or 0)
+    for s in rec["spans"]:
+        NODE_LATENCY.observe(s["wall_ms"] / 1000, node=s["name"])
+        for cname, c in s["cache"].items():
+            if c["hit"]:
+                CACHE_REQUESTS.inc(c["hit"], cache=cname, result="hit")
+            if c["miss"]:
+                CACHE_REQUESTS.inc(c["miss"], cache=cname, result="miss")
+
+
+# --- HTTP uç noktası ---------------------------------------------------------
+class _Handler(BaseHTTPRequestHandler):
+    registry: Registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):   # erişim loglarını bastır
+        log.debug("metrics %s", fmt % args)
+
+
+_SERVERS: Dict[int, ThreadingHTTPServer] = {}
+
+
+def serve(port: int, host: str = "0.0.0.0", registry: Registry = REGISTRY) -> Optional[ThreadingHTTPServer]:
+    """/metrics uç noktasını daemon thread'de başlatır (port başına bir kez; Streamlit rerun'larında tekrar açmaz)."""
+    if port in _SERVERS:
+        return _SERVERS[port]
+    handler = type("MetricsHandler", (_Handler,), {"registry": registry})
+    try:
+        srv = ThreadingHTTPServer((host, port), handler)
+    except OSError as e:
+        log.warning("Metrik uç noktası açılamadı (%s:%d): %s", host, port, e)
+        return None
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, name=f"metrics-{port}", daemon=True).start()
+    _SERVERS[port] = srv
+    log.info("Metrikler: http://%s:%d/metrics", host, port)
+    return srv
+
+
+def setup_metrics(cfg: Dict[str, Any], tracer=None) -> Optional[str]:
+    """
+    config.yaml 'metrics' bölümüne göre kurulum (idempotent):
+      - tracer verilirse biten izler metriklere işlenir
+      - port > 0 ise HTTP uç noktası açılır
+    Dosya dökümü yolu (varsa) döner; çağıran uygun anlarda REGISTRY.dump(path) yapar.
+    """
+    mc = cfg.get("metrics", {}) or {}
+    if not mc.get("enabled", False):
+        return None
+    if tracer is not None and observe_trace not in tracer.listeners:
+        tracer.listeners.append(observe_trace)
+    if mc.get("port"):
+        serve(int(mc["port"]), mc.get("host", "0.0.0.0"))
+    return mc.get("dump_path")
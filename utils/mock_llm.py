@@ -0,0 +1,365 @@
+# utils/mock_llm.py
+"""
+Deterministik sahte (mock) / kayıt-oynatma (replay) LLM arka ucu.
+
+  - Yanıtlar prompt özetiyle (sha256(system + NUL + user)) anahtarlanan bir JSONL
+    fixture dosyasından okunur: {"key", "completion", "system_head", "user_head"}
+  - mode=record: fixture'da olmayan prompt'lar gerçek LLM'e (inner) sorulur ve dosyaya eklenir
+  - Fixture'da yoksa (on_miss):
+      synthetic → rol bazlı deterministik yanıt (SQL üretici: sql_hints'teki soru → SQL,
+                  validator: "OK", diğerleri: sabit özet metni)
+      error     → KeyError (katı oynatma; eksik kayıt hatası görünür olsun)
+  - Sentetik gecikme: base_latency + giriş/prefill_tok_s + çıkış/decode_tok_s (± jitter,
+    prompt anahtarı + seed ile deterministik); time_scale=0 beklemeyi kapatır.
+
+LLMService ile aynı get_text(system, user) arayüzünü sunar; llm.use_mock: true iken
+utils.llm.make_llm bunu döndürür. Aynı arka uç OpenAI-compatible bir HTTP sunucusu olarak da
+çalışabilir (gerçek istemci/HTTP yolunu da ölçmek için):
+
+    python -m utils.mock_llm --port 8089 --fixtures data/llm_fixtures.jsonl
+    # config.yaml: llm.base_url: "http://127.0.0.1:8089/v1", use_mock: false
+"""
+from __future__ import annotations
+import argparse
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+from utils.cost import CostTracker
+
+log = logging.getLogger("mockllm")
+
+SYNTHETIC_SUMMARY = (
+    "Kısa Yanıt: Sorgu sonucu aşağıda özetlenmiştir.\n"
+    "Öne Çıkan Metrikler:\n"
+    "- Satır sayısı ve temel istatistikler tabloda yer alır.\n"
+    "Notlar:\n"
+    "- Bu yanıt sahte (mock) LLM tarafından üretilmiştir."
+)
+
+
+def prompt_key(system: str, user: str) -> str:
+    """Fixture anahtarı: system + user metninin sha256 özeti (ilk 20 hane)."""
+    h = hashlib.sha256()
+    h.update((system or "").encode("utf-8"))
+    h.update(b"\x00")
+    h.update((user or "").encode("utf-8"))
+    return h.hexdigest()[:20]
+
+
+class FixtureStore:
+    """JSONL fixture dosyası: anahtar → completion. Kayıt modunda thread-safe ekleme yapar."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data: Dict[str, str] = {}
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        rec = json.loads(line)
+                        self._data[rec["key"]] = rec["completion"]
+            log.info("Mock LLM fixture yüklendi: %s (%d kayıt)", path, len(self._data))
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> Optional[str]:
+        return self._data.get(key)
+
+    def add(self, key: str, completion: str, system: str, user: str) -> None:
+        with self._lock:
+            if key in self._data:
+                return
+            self._data[key] = completion
+            if not self.path:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            rec = {"key": key, "completion": completion, "system_head": system[:80], "user_head": user[:160]}
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+
+def _load_sql_hints(path: Optional[str]) -> Dict[str, str]:
+    """question → expected_sql (eval_questions.jsonl formatı); sentetik SQL yanıtları için."""
+    if not path or not os.path.exists(path):
+        return {}
+    out = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                rec = json.loads(line)
+                if rec.get("question") and rec.get("expected_sql"):
+                    out[rec["question"].strip()] = rec["expected_sql"].strip()
+    return out
+
+
+class MockLLMService:
+    """LLMService yerine geçen deterministik arka uç (get_text arayüzü)."""
+
+    def __init__(
+        self,
+        fixtures: Optional[str] = None,
+        mode: str = "replay",
+        on_miss: str = "synthetic",
+        sql_hints: Optional[str] = None,
+        base_latency_ms: float = 0.0,
+        prefill_tok_s: float = 0.0,
+        decode_tok_s: float = 0.0,
+        jitter: float = 0.0,
+        seed: int = 0,
+        time_scale: float = 1.0,
+        inner=None,
+        model_name: str = "mock",
+    ):
+        if mode not in ("replay", "record"):
+            raise ValueError(f"Geçersiz mock modu: {mode}")
+        if mode == "record" and inner is None:
+            raise ValueError("record modu gerçek bir LLM istemcisi (inner) gerektirir")
+        self.store = FixtureStore(fixtures)
+        self.mode = mode
+        self.on_miss = on_miss
+        self.sql_hints = _load_sql_hints(sql_hints)
+        self.base_latency_ms = base_latency_ms
+        self.prefill_tok_s = prefill_tok_s
+        self.decode_tok_s = decode_tok_s
+        self.jitter = jitter
+        self.seed = seed
+        self.time_scale = time_scale
+        self.inner = inner
+        self.model_name = model_name
+        self.stats = {"hit": 0, "miss": 0, "recorded": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    # --- yanıt üretimi -------------------------------------------------------
+    def _synthetic(self, system: str, user: str) -> str:
+        if "SQL generator" in system:
+            m = re.search(r"QUESTION:\s*\n(.*?)\n", user + "\n", re.S)
+            q = m.group(1).strip() if m else ""
+            if q in self.sql_hints:
+                return self.sql_hints[q]
+            # Tablo: izinli liste (aynı satırda; boşsa sonraki satıra taşmaz) yoksa SCHEMA'daki ilk tablo ("TABLE x (" / "Table x —")
+            t = (re.search(r"Allowed tables:[ \t]*(\w+)", system)
+                 or re.search(r"^TABLE (\w+)", user, re.M | re.I))
+            return f'SELECT COUNT(*) AS n FROM "{t.group(1)}"' if t else "SELECT 1 AS n"
+        if "SQL validator" in system:
+            return "OK"
+        return SYNTHETIC_SUMMARY
+
+    def complete(self, system: str, user: str) -> Tuple[str, str]:
+        """Gecikme uygulamadan yanıtı döndürür → (metin, kaynak: fixture/recorded/synthetic)."""
+        key = prompt_key(system, user)
+        out = self.store.get(key)
+        if out is not None:
+            self._count("hit")
+            return out, "fixture"
+        self._count("miss")
+        if self.mode == "record":
+            out = self.inner.get_text(system, user)
+            self.store.add(key, out, system, user)
+            self._count("recorded")
+            return out, "recorded"
+        if self.on_miss == "error":
+            raise KeyError(f"Mock LLM: fixture bulunamadı (key={key})")
+        return self._synthetic(system, user), "synthetic"
+
+    def latency_s(self, system: str, user: str, out: str) -> Tuple[float, float]:
+        """Sentetik (ilk token, toplam) süre, saniye. Prompt anahtarı + seed ile deterministik."""
+        t_in = CostTracker.est_tokens(system + "\n" + user)
+        t_out = CostTracker.est_tokens(out)
+        ttft = self.base_latency_ms / 1000 + (t_in / self.prefill_tok_s if self.prefill_tok_s else 0.0)
+        total = ttft + (t_out / self.decode_tok_s if self.decode_tok_s else 0.0)
+        if self.jitter:
+            rng = random.Random(f"{self.seed}:{prompt_key(system, user)}")
+            f = 1.0 + rng.uniform(-self.jitter, self.jitter)
+            ttft, total = ttft * f, total * f
+        return ttft * self.time_scale, total * self.time_scale
+
+    def get_text(self, system: str, user: str, **kwargs) -> str:
+        out, source = self.complete(system, user)
+        if source != "recorded":   # kayıt modunda gerçek çağrının süresi zaten yaşandı
+            _, total = self.latency_s(system, user, out)
+            if total > 0:
+                time.sleep(total)
+        return out
+
+
+def make_mock_llm(cfg: Dict[str, Any], inner_factory=None) -> MockLLMService:
+    """config.yaml llm.mock bölümünden kurar; record modunda inner_factory() gerçek istemciyi verir."""
+    lc = cfg["llm"]
+    mc = dict(lc.get("mock") or {})
+    inner = inner_factory() if mc.get("mode") == "record" and inner_factory else None
+    return MockLLMService(inner=inner, model_name=lc.get("model_name", "mock"), **mc)
+
+
+# --- OpenAI-compatible stand-in sunucu ---------------------------------------
+def _split_messages(messages) -> Tuple[str, str]:
+    sys_parts, user_parts = [], []
+    for m in messages or []:
+        content = m.get("content") or ""
+        if isinstance(content, list):   # [{type: text, text: ...}] biçimi
+            content = "".join(p.get("text", "") for p in content if isinstance(p, dict))
+        (sys_parts if m.get("role") == "system" else user_parts).append(content)
+    return "\n".join(sys_parts), "\n".join(user_parts)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    mock: MockLLMService
+    error_rate: float = 0.0
+    _rng = random.Random(0)
+
+    def _send_json(self, code: int, obj: Dict[str, Any]) -> None:
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path.endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": self.mock.model_name, "object": "model", "owned_by": "mock"}]})
+        elif path in ("/health", "/v1/health"):
+            self._send_json(200, {"status": "ok", "fixtures": len(self.mock.store), **self.mock.stats})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if not self.path.split("?", 1)[0].rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        n = int(self.headers.get("Content-Length") or 0)
+        req = json.loads(self.rfile.read(n) or b"{}")
+        if self.error_rate and self._rng.random() < self.error_rate:
+            self._send_json(503, {"error": {"message": "mock: injected failure", "type": "server_error"}})
+            return
+        system, user = _split_messages(req.get("messages"))
+        try:
+            out, _ = self.mock.complete(system, user)
+        except KeyError as e:
+            self._send_json(404, {"error": {"message": str(e), "type": "fixture_miss"}})
+            return
+        ttft, total = self.mock.latency_s(system, user, out)
+        model = req.get("model") or self.mock.model_name
+        cid = "chatcmpl-" + uuid.uuid4().hex[:16]
+        usage = {
+            "prompt_tokens": CostTracker.est_tokens(system + "\n" + user),
+            "completion_tokens": CostTracker.est_tokens(out),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        if req.get("stream"):
+            self._stream(cid, model, out, ttft, total)
+            return
+        time.sleep(total)
+        self._send_json(200, {
+            "id": cid, "object": "chat.completion", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": out}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    def _stream(self, cid: str, model: str, out: str, ttft: float, total: float) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        pieces = re.findall(r"\S+\s*|\s+", out) or [""]
+        step = (total - ttft) / len(pieces) if len(pieces) else 0.0
+        time.sleep(ttft)
+
+        def chunk(delta: Dict[str, Any], finish=None) -> bytes:
+            c = {"id": cid, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                 "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+            return f"data: {json.dumps(c, ensure_ascii=False)}\n\n".encode("utf-8")
+
+        self.wfile.write(chunk({"role": "assistant", "content": ""}))
+        for p in pieces:
+            self.wfile.write(chunk({"content": p}))
+            self.wfile.flush()
+            if step > 0:
+                time.sleep(step)
+        self.wfile.write(chunk({}, "stop"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def log_message(self, fmt, *args):
+        log.debug("mock %s", fmt % args)
+
+
+class _Server(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # İstemci yanıtı beklemeden koptu (zaman aşımı, kaybeden hedge isteği): beklenen durum
+        import sys
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            log.debug("mock: istemci bağlantıyı kapattı (%s)", client_address)
+            return
+        super().handle_error(request, client_address)
+
+
+def serve(mock: MockLLMService, port: int = 8089, host: str = "127.0.0.1", error_rate: float = 0.0, block: bool = True) -> ThreadingHTTPServer:
+    """OpenAI-compatible stand-in sunucuyu başlatır (/v1/chat/completions, /v1/models, /health)."""
+    handler = type("MockLLMHandler", (_Handler,), {"mock": mock, "error_rate": error_rate, "_rng": random.Random(mock.seed)})
+    srv = _Server((host, port), handler)
+    srv.daemon_threads = True
+    log.info("Mock LLM sunucusu: http://%s:%d/v1", host, srv.server_address[1])
+    if block:
+        try:
+            srv.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            srv.server_close()
+    else:
+        threading.Thread(target=srv.serve_forever, name=f"mockllm-{port}", daemon=True).start()
+    return srv
+
+
+def main():
+    ap = argparse.ArgumentParser(description="OpenAI-compatible mock/replay LLM sunucusu")
+    ap.add_argument("--config", default=None, help="config.yaml (llm.mock bölümü varsayılanları verir)")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8089)
+    ap.add_argument("--fixtures", default=None)
+    ap.add_argument("--sql-hints", default=None)
+    ap.add_argument("--on-miss", choices=("synthetic", "error"), default=None)
+    ap.add_argument("--base-latency-ms", type=float, default=None)
+    ap.add_argument("--prefill-tok-s", type=float, default=None)
+    ap.add_argument("--decode-tok-s", type=float, default=None)
+    ap.add_argument("--jitter", type=float, default=None)
+    ap.add_argument("--time-scale", type=float, default=None)
+    ap.add_argument("--seed", type=int, default=None)
+    ap.add_argument("--error-rate", type=float, default=0.0, help="rastgele 503 döndürme oranı (hata enjeksiyonu)")
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(name)s | %(message)s")
+    mc: Dict[str, Any] = {}
+    if args.config:
+        import yaml
+        with open(args.config, "r", encoding="utf-8") as f:
+            mc = dict((yaml.safe_load(f).get("llm") or {}).get("mock") or {})
+    mc.pop("mode", None)   # sunucu yalnızca oynatır
+    for name in ("fixtures", "sql_hints", "on_miss", "base_latency_ms", "prefill_tok_s", "decode_tok_s", "jitter", "time_scale", "seed"):
+        v = getattr(args, name)
+        if v is not None:
+            mc[name] = v
+    serve(MockLLMService(**mc), args.port, args.host, args.error_rate)
+
+
+if __name__ == "__main__":
+    main()
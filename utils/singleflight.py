@@ -0,0 +1,126 @@
+# utils/singleflight.py
+"""
+Single-flight: aynı anahtarla eşzamanlı gelen istekleri tek çalıştırmada birleştirir.
+
+İlk gelen (leader) işi çalıştırır; o bitene kadar aynı anahtarla gelenler (follower) işi
+tekrar başlatmaz, leader'ın sonucunu (veya hatasını) bekler. İş bittiğinde anahtar silinir:
+sonuçlar CACHE'LENMEZ, yalnızca uçuştaki (in-flight) tekrarlar birleştirilir.
+
+  - SingleFlight       → thread tabanlı çağıranlar (Streamlit oturumları)
+  - AsyncSingleFlight  → asyncio çağıranlar (api.py); follower'lar event loop'u bloklamaz
+
+Anahtar: question_key(soru, show_sql, rag) — soru normalize edilir (küçük harf, boşluk
+sadeleştirme, sondaki noktalama), oturum override'ları anahtara dahildir.
+"""
+from __future__ import annotations
+import asyncio
+import re
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from utils.metrics import SINGLEFLIGHT
+
+_WS = re.compile(r"\s+")
+
+
+def normalize_question(q: str) -> str:
+    return _WS.sub(" ", (q or "").strip().lower()).rstrip(" ?!.")
+
+
+def question_key(question: str, show_sql: Optional[bool] = None, rag: Optional[bool] = None) -> Tuple[str, Optional[bool], Optional[bool]]:
+    return normalize_question(question), show_sql, rag
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "aborted")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[Exception] = None
+        self.aborted = False
+
+
+class SingleFlight:
+    """
+    Thread-safe single-flight. do() → (sonuç, shared): shared=True ise sonuç başka bir çağrıdan geldi.
+
+    Leader'ın hatası (Exception) follower'lara da yükseltilir. Leader Exception dışı bir sinyalle
+    kesilirse (KeyboardInterrupt, Streamlit rerun/stop) bu kesinti follower'lara taşınmaz;
+    follower'lar yeniden dener (biri yeni leader olur).
+    """
+
+    def __init__(self, name: str = "ask"):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Any, _Call] = {}
+
+    def do(self, key: Any, fn: Callable[[], Any], on_wait: Optional[Callable[[], None]] = None) -> Tuple[Any, bool]:
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+            if leader:
+                break
+            SINGLEFLIGHT.inc(flight=self.name, role="follower")
+            if on_wait:
+                on_wait()
+            call.done.wait()
+            if call.aborted:
+                continue
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        SINGLEFLIGHT.inc(flight=self.name, role="leader")
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        except BaseException:
+            call.aborted = True
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result, False
+
+    def inflight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+class AsyncSingleFlight:
+    """
+    asyncio single-flight (tek event loop içinde). İş, leader'dan bağımsız bir Task olarak koşar:
+    leader veya follower'ın iptali (istemci koptu) diğer bekleyenleri etkilemez.
+    """
+
+    def __init__(self, name: str = "ask"):
+        self.name = name
+        self._calls: Dict[Any, "asyncio.Task"] = {}
+
+    async def do(self, key: Any, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        task = self._calls.get(key)
+        shared = task is not None
+        if shared:
+            SINGLEFLIGHT.inc(flight=self.name, role="follower")
+        else:
+            SINGLEFLIGHT.inc(flight=self.name, role="leader")
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t, k=key: self._forget(k, t))
+        return await asyncio.shield(task), shared
+
+    def _forget(self, key: Any, task: "asyncio.Task") -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()   # bekleyen kalmadıysa "exception was never retrieved" uyarısını bastır
+
+    def inflight(self) -> int:
+        return len(self._calls)
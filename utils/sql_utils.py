@@ -1,5 +1,6 @@
 import re
-from typing import Tuple
+from functools import lru_cache
+from typing import Tuple, List, NamedTuple, Iterable
 
 def is_select_only(sql: str) -> bool:
     s = sql.strip().strip(";").lower()
@@ -10,19 +11,26 @@ def has_multiple_statements(sql: str) -> bool:
     # naif kontrol: ; sayısı >1 ise çoklu statement olabilir
     return sql.strip().count(";") > 1
 
-def contains_banned(sql: str, banned_keywords) -> str | None:
-    s = re.sub(r"\s+", " ", sql.lower())
-    for kw in banned_keywords:
-        if re.search(rf"\b{re.escape(kw)}\b", s):
-            return kw
-    return None
+@lru_cache(maxsize=32)
+def _banned_matcher(keywords: Tuple[str, ...]) -> "re.Pattern | None":
+    # Tüm yasaklı kelimeler için TEK alternation regex; config başına bir kez derlenir.
+    # Uzun kelimeler önce denenir; çok kelimeli girdilerde boşluklar \s+ ile eşleşir.
+    kws = sorted({k.strip().lower() for k in keywords if k and k.strip()}, key=len, reverse=True)
+    if not kws:
+        return None
+    alts = "|".join(r"\s+".join(map(re.escape, k.split())) for k in kws)
+    return re.compile(rf"\b(?:{alts})\b", re.I)
+
+def contains_banned(sql: str, banned_keywords: Iterable[str]) -> str | None:
+    pat = _banned_matcher(tuple(banned_keywords))
+    if pat is None:
+        return None
+    m = pat.search(sql)
+    return re.sub(r"\s+", " ", m.group(0).lower()) if m else None
 
 def ensure_limit(sql: str, max_limit: int) -> str:
-    s = sql.strip().rstrip(";")
-    # LIMIT var mı?
-    if re.search(r"\blimit\s+\d+\b", s, flags=re.I):
-        return s + ";"
-    return f"{s} LIMIT {max_limit};"
+    # Dış sorguda LIMIT yoksa ekler, varsa max_limit'e kırpar (bkz. enforce_outer_limit)
+    return enforce_outer_limit(sql, max_limit, skip_pure_aggregate=False) + ";"
 
 def sanitize_sql(sql: str) -> str:
     # yorumları kaldır (naif)
@@ -69,4 +77,160 @@ def extract_single_select(sql_text: str) -> str | None:
         cand = cand.split(";", 1)[0] + ";"
     # Güvenlik için yorumları sil
     cand = sanitize_sql(cand)
-    return cand
\ No newline at end of file
+    return cand
+
+
+# ---------------------------------------------------------------------------
+# Hafif SQL tokenizer (SQLite sözdizimi)
+# ---------------------------------------------------------------------------
+class SqlToken(NamedTuple):
+    kind: str    # "id" | "qid" | "str" | "num" | "param" | "op"
+    text: str    # ham metin
+    depth: int   # parantez derinliği (0 = en dış sorgu)
+    pos: int     # kaynak metindeki başlangıç ofseti
+
+    @property
+    def name(self) -> str:
+        """Tanımlayıcılar için küçük harfli, tırnaksız ad."""
+        if self.kind == "qid":
+            return self.text[1:-1].replace('""', '"').lower()
+        return self.text.lower()
+
+
+_TOKEN_RE = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<comment>--[^\n]*|/\*.*?(?:\*/|$))
+  | (?P<str>'(?:[^']|'')*')
+  | (?P<qid>"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\])
+  | (?P<num>(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<id>[^\W\d]\w*)
+  | (?P<param>[?:@$]\w*)
+  | (?P<op>\|\||<=|>=|<>|!=|==|<<|>>|[-+*/%<>=~&|(),.;])
+""", re.S | re.X)
+
+
+def tokenize_sql(sql: str) -> List[SqlToken]:
+    """
+    SQL metnini boşluk/yorum içermeyen token listesine çevirir.
+    Her token parantez derinliğini taşır; böylece alt sorgular ile en dış
+    sorgu regex sezgisine gerek kalmadan ayırt edilebilir.
+    Tanınmayan karakterler tek karakterlik 'op' token'ı olarak geçer.
+    """
+    out: List[SqlToken] = []
+    depth = 0
+    pos = 0
+    n = len(sql)
+    while pos < n:
+        m = _TOKEN_RE.match(sql, pos)
+        if not m:
+            out.append(SqlToken("op", sql[pos], depth, pos))
+            pos += 1
+            continue
+        kind = m.lastgroup
+        text = m.group(kind)
+        if kind not in ("ws", "comment"):
+            if text == ")":
+                depth = max(0, depth - 1)
+            if kind == "qid" and text[0] in "`[":
+                text = '"' + text[1:-1] + '"'
+            out.append(SqlToken(kind, text, depth, pos))
+            if text == "(":
+                depth += 1
+        pos = m.end()
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Dış sorgu LIMIT yönetimi (token/derinlik tabanlı)
+# ---------------------------------------------------------------------------
+_AGG_FUNCS = frozenset({"count", "avg", "sum", "total", "min", "max", "group_concat"})
+_COMPOUND = frozenset({"union", "intersect", "except"})
+
+
+def _top_level(toks: List[SqlToken], word: str) -> List[int]:
+    return [i for i, t in enumerate(toks) if t.depth == 0 and t.kind == "id" and t.name == word]
+
+
+def is_pure_aggregate(sql: str) -> bool:
+    """
+    Dış SELECT tek satır döndüren saf bir agregat mı?
+    - Seçim listesinde (derinlik 0) aggregate fonksiyon var
+    - Dış sorguda GROUP BY, pencere fonksiyonu (OVER) ve UNION/INTERSECT/EXCEPT yok
+    Alt sorgu/CTE içindeki GROUP BY veya LIMIT dış sorguyu etkilemez.
+    """
+    toks = tokenize_sql(sql)
+    if any(t.depth == 0 and t.kind == "id" and t.name in _COMPOUND for t in toks):
+        return False
+    selects = _top_level(toks, "select")
+    if not selects or _top_level(toks, "group"):
+        return False
+    start = selects[-1]
+    froms = [i for i in _top_level(toks, "from") if i > start]
+    end = froms[0] if froms else len(toks)
+    items = toks[start + 1:end]
+    if any(t.kind == "id" and t.name == "over" for t in items):
+        return False
+    return any(
+        t.depth == 0 and t.kind == "id" and t.name in _AGG_FUNCS
+        and k + 1 < len(items) and items[k + 1].text == "("
+        for k, t in enumerate(items)
+    )
+
+
+def enforce_outer_limit(sql: str, max_limit: int, skip_pure_aggregate: bool = True) -> str:
+    """
+    En dış sorgunun LIMIT'ini max_limit ile sınırlar (sondaki ';' atılır):
+      - Dış LIMIT yoksa 'LIMIT max_limit' eklenir (saf agregatlar hariç, istenirse)
+      - 'LIMIT n' / 'LIMIT n OFFSET m' / 'LIMIT m, n' → n > max_limit veya n < 0 ise kırpılır
+      - Sabit olmayan LIMIT ifadesi → MIN((ifade), max_limit)
+    Alt sorgu/CTE içindeki LIMIT'ler dikkate alınmaz ve değiştirilmez. Sondaki yorumlar atılır
+    (eklenen LIMIT '-- ...' satır yorumunun içine düşmesin).
+    """
+    s = sql.lstrip()
+    toks = tokenize_sql(s)
+    while toks and toks[-1].text == ";":
+        toks.pop()
+    if not toks:
+        return s.strip().rstrip(";").rstrip()
+    s = s[:toks[-1].pos + len(toks[-1].text)]
+    limits = _top_level(toks, "limit")
+    if not limits:
+        if skip_pure_aggregate and is_pure_aggregate(s):
+            return s
+        return f"{s} LIMIT {int(max_limit)}"
+
+    li = limits[-1]
+    # LIMIT ifadesinin token aralığını bul: [a, b)
+    a = li + 1
+    b = a
+    comma = None
+    while b < len(toks):
+        t = toks[b]
+        if t.depth == 0 and t.kind == "id" and t.name == "offset":
+            break
+        if t.depth == 0 and t.text == ",":
+            comma = b
+        b += 1
+    if comma is not None:
+        # SQLite 'LIMIT offset, count' biçimi: sayı virgülden sonra
+        a = comma + 1
+    if a >= b:
+        return s
+    start = toks[a].pos
+    end = toks[b].pos if b < len(toks) else len(s)
+    expr = s[start:end].strip()
+    if b - a == 1 and toks[a].kind == "num":
+        try:
+            n = int(float(expr))
+        except ValueError:
+            return s
+        if 0 <= n <= max_limit:
+            return s
+        repl = str(int(max_limit))
+    elif b - a == 2 and toks[a].text == "-" and toks[a + 1].kind == "num":
+        repl = str(int(max_limit))   # negatif LIMIT = sınırsız
+    else:
+        repl = f"MIN(({expr}), {int(max_limit)})"
+    tail = s[end:]
+    return f"{s[:start]}{repl}{' ' if tail and not tail[0].isspace() else ''}{tail}".rstrip()
+
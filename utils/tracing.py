@@ -0,0 +1,329 @@
+# utils/tracing.py
+"""
+Düğüm bazlı izleme (tracing) katmanı.
+
+Her graf düğümü Tracer.wrap ile sarılır; düğüm başına bir span tutulur:
+  - wall_ms / cpu_ms (thread CPU süresi)
+  - mem_alloc_kb / mem_peak_kb (tracemalloc açıksa)
+  - llm_calls / llm_ms / tokens_in / tokens_out   (call_llm_text → record_llm)
+  - sql_steps (progress handler çağrısı × aralık; yaklaşık VM adımı)  (tools.db → record_sql_steps)
+  - cache_hits / cache_misses (isimli cache'ler)                       (→ record_cache)
+
+Span'ler AgentState.trace_id altında toplanır; telemetry düğümü (Tracer.finish) izi
+iki dosyaya yazar:
+  - JSONL       : iz başına tek satır (özet + span listesi)
+  - OTLP JSON   : OpenTelemetry ExportTraceServiceRequest formatında satır (otelcol
+                  file receiver / Jaeger / Tempo ile okunabilir)
+
+Ölçüm noktaları (record_*) aktif span yoksa hiçbir şey yapmaz; graf dışı kullanımda
+maliyetsizdir.
+"""
+from __future__ import annotations
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+log = logging.getLogger("trace")
+
+SERVICE_NAME = "analist-agent"
+
+# Şu an çalışan düğümün span'i (düğüm fonksiyonu ile aynı thread/context'te ayarlanır)
+_SPAN: ContextVar[Optional["Span"]] = ContextVar("analist_span", default=None)
+
+
+class Span:
+    __slots__ = (
+        "name", "trace_id", "span_id", "start_ns", "end_ns", "wall_ms", "cpu_ms", "mem_alloc_kb", "mem_peak_kb",
+        "llm_calls", "llm_ms", "tokens_in", "tokens_out", "sql_steps", "cache", "status", "error",
+    )
+
+    def __init__(self, name: str, trace_id: str = ""):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.start_ns = time.time_ns()
+        self.end_ns = self.start_ns
+        self.wall_ms = 0.0
+        self.cpu_ms = 0.0
+        self.mem_alloc_kb: Optional[float] = None
+        self.mem_peak_kb: Optional[float] = None
+        self.llm_calls = 0
+        self.llm_ms = 0.0
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.sql_steps = 0
+        self.cache: Dict[str, List[int]] = {}   # isim → [hit, miss]
+        self.status = "ok"
+        self.error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = {
+            "name": self.name,
+            "span_id": self.span_id,
+            "start_ns": self.start_ns,
+            "wall_ms": round(self.wall_ms, 3),
+            "cpu_ms": round(self.cpu_ms, 3),
+            "llm_calls": self.llm_calls,
+            "llm_ms": round(self.llm_ms, 3),
+            "tokens_in": self.tokens_in,
+            "tokens_out": self.tokens_out,
+            "sql_steps": self.sql_steps,
+            "cache": {k: {"hit": v[0], "miss": v[1]} for k, v in self.cache.items()},
+            "status": self.status,
+        }
+        if self.mem_alloc_kb is not None:
+            d["mem_alloc_kb"] = round(self.mem_alloc_kb, 1)
+            d["mem_peak_kb"] = round(self.mem_peak_kb or 0.0, 1)
+        if self.error:
+            d["error"] = self.error
+        return d
+
+
+class Trace:
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.root_id = uuid.uuid4().hex[:16]
+        self.start_ns = time.time_ns()
+        self.t0 = time.perf_counter()
+        self.spans: List[Span] = []
+        self.question: Optional[str] = None
+
+
+# --- Ölçüm noktaları (düğüm içinden çağrılır) ---------------------------------
+def current_span() -> Optional[Span]:
+    return _SPAN.get()
+
+
+def record_llm(ms: float, tokens_in: int, tokens_out: int) -> None:
+    sp = _SPAN.get()
+    if sp is not None:
+        sp.llm_calls += 1
+        sp.llm_ms += ms
+        sp.tokens_in += tokens_in
+        sp.tokens_out += tokens_out
+
+
+def record_sql_steps(n: int) -> None:
+    sp = _SPAN.get()
+    if sp is not None:
+        sp.sql_steps += n
+
+
+def record_cache(name: str, hit: bool, n: int = 1) -> None:
+    sp = _SPAN.get()
+    if sp is not None:
+        c = sp.cache.setdefault(name, [0, 0])
+        c[0 if hit else 1] += n
+
+
+# --- Tracer ------------------------------------------------------------------
+class Tracer:
+    """
+    Süreç başına tek örnek (get_tracer). Açık izleri trace_id ile tutar; telemetry
+    düğümünde (veya düğüm hatasında) izi dışa aktarıp bırakır.
+    """
+
+    def __init__(self, jsonl_path: Optional[str] = None, otel_path: Optional[str] = None, use_tracemalloc: bool = False):
+        self.jsonl_path = jsonl_path
+        self.otel_path = otel_path
+        self.use_tracemalloc = use_tracemalloc
+        self._traces: Dict[str, Trace] = {}
+        self._lock = threading.Lock()
+        # Dışa aktarım dinleyicileri (ör. metrik kaydı): fn(trace_dict)
+        self.listeners: List[Callable[[Dict[str, Any]], None]] = []
+        if use_tracemalloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _trace(self, trace_id: str) -> Trace:
+        with self._lock:
+            tr = self._traces.get(trace_id)
+            if tr is None:
+                tr = self._traces[trace_id] = Trace(trace_id)
+            return tr
+
+    def wrap(self, name: str, fn: Callable[..., Any]) -> Callable[..., Any]:
+        """Düğüm fonksiyonunu span ölçümüyle sarar. fn(state, config) imzası beklenir (LangGraph config'i geçirir)."""
+
+        def traced(state, config=None):
+            tr = self._trace(state.trace_id)
+            if tr.question is None:
+                tr.question = getattr(state, "question", None)
+            sp = Span(name, state.trace_id)
+            mem = self.use_tracemalloc and tracemalloc.is_tracing()
+            if mem:
+                cur0, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+            token = _SPAN.set(sp)
+            w0, c0 = time.perf_counter(), time.thread_time()
+            try:
+                return fn(state, config)
+            except Exception as e:
+                sp.status = "error"
+                sp.error = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                sp.wall_ms = (time.perf_counter() - w0) * 1000
+                sp.cpu_ms = (time.thread_time() - c0) * 1000
+                sp.end_ns = sp.start_ns + int(sp.wall_ms * 1e6)
+                if mem:
+                    cur1, peak = tracemalloc.get_traced_memory()
+                    sp.mem_alloc_kb = (cur1 - cur0) / 1024
+                    sp.mem_peak_kb = max(0, peak - cur0) / 1024
+                _SPAN.reset(token)
+                tr.spans.append(sp)
+                if sp.status == "error":
+                    self._export(state.trace_id, status="error")
+
+        traced.__name__ = f"traced_{name}"
+        return traced
+
+    def finish(self, state):
+        """telemetry düğümü: izi kapatır ve dışa aktarır; state'i değiştirmeden döndürür."""
+        self._export(state.trace_id, status="ok", state=state)
+        return state
+
+    def abandon(self, trace_id: str) -> None:
+        """
+        Çağıran tarafın finally'si: graf düğüm dışında kesildiyse (GraphRecursionError, akışın
+        yarıda bırakılması) hâlâ açık izi "aborted" olarak dışa aktarıp bırakır; kapanmışsa no-op.
+        """
+        self._export(trace_id, status="aborted")
+
+    # --- Dışa aktarım ---------------------------------------------------------
+    def _export(self, trace_id: str, status: str, state=None) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            tr = self._traces.pop(trace_id, None)
+        if tr is None:
+            return None
+        rec = {
+            "trace_id": tr.trace_id,
+            "start_ns": tr.start_ns,
+            "duration_ms": round((time.perf_counter() - tr.t0) * 1000, 3),
+            "status": status,
+            "question": tr.question,
+            "spans": [s.to_dict() for s in tr.spans],
+        }
+        for k in ("wall_ms", "cpu_ms", "llm_ms"):
+            rec[k.replace("_ms", "_ms_total")] = round(sum(s[k] for s in rec["spans"]), 3)
+        for k in ("llm_calls", "tokens_in", "tokens_out", "sql_steps"):
+            rec[k] = sum(s[k] for s in rec["spans"])
+        # Onarım turu: state varsa qval düğümünün sayacı; yoksa (hata/abandon) iz içindeki qval
+        # span'lerinden türetilir (her qval'den sonraki qval bir onarım turudur)
+        qvals = sum(1 for s in tr.spans if s.name == "qval")
+        rec["repair_attempts"] = max(0, qvals - 1)
+        if state is not None:
+            rec["intent"] = getattr(state, "intent", None)
+            rec["repair_attempts"] = getattr(state, "repair_attempts", None) or rec["repair_attempts"]
+            rec["summary_path"] = getattr(state, "summary_path", None)
+        self._append(self.jsonl_path, rec)
+        self._append(self.otel_path, self._otlp(tr, rec))
+        for fn in self.listeners:
+            try:
+                fn(rec)
+            except Exception as e:
+                log.warning("Trace dinleyicisi hata verdi: %s", e)
+        return rec
+
+    def _append(self, path: Optional[str], obj: Dict[str, Any]) -> None:
+        if not path:
+            return
+        line = json.dumps(obj, ensure_ascii=False, separators=(",", ":")) + "\n"
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with self._lock, open(path, "a", encoding="utf-8") as f:
+                f.write(line)
+        except OSError as e:
+            log.warning("Trace yazılamadı (%s): %s", path, e)
+
+    @staticmethod
+    def _otlp(tr: Trace, rec: Dict[str, Any]) -> Dict[str, Any]:
+        """OTLP/JSON ExportTraceServiceRequest: kök span (istek) + düğüm span'leri."""
+
+        def attrs(d: Dict[str, Any]) -> List[Dict[str, Any]]:
+            out = []
+            for k, v in d.items():
+                if v is None:
+                    continue
+                if isinstance(v, bool):
+                    val = {"boolValue": v}
+                elif isinstance(v, int):
+                    val = {"intValue": str(v)}
+                elif isinstance(v, float):
+                    val = {"doubleValue": v}
+                else:
+                    val = {"stringValue": str(v)}
+                out.append({"key": k, "value": val})
+            return out
+
+        trace_hex = tr.trace_id.rjust(32, "0")
+        end_root = tr.start_ns + int(rec["duration_ms"] * 1e6)
+        spans = [{
+            "traceId": trace_hex,
+            "spanId": tr.root_id,
+            "name": "ask",
+            "kind": 2,  # SERVER
+            "startTimeUnixNano": str(tr.start_ns),
+            "endTimeUnixNano": str(end_root),
+            "attributes": attrs({
+                "analist.question": rec.get("question"),
+                "analist.intent": rec.get("intent"),
+                "analist.repair_attempts": rec.get("repair_attempts"),
+                "llm.tokens_in": rec["tokens_in"],
+                "llm.tokens_out": rec["tokens_out"],
+            }),
+            "status": {"code": 1 if rec["status"] == "ok" else 2},
+        }]
+        for s in rec["spans"]:
+            a = {
+                "node.cpu_ms": s["cpu_ms"],
+                "llm.calls": s["llm_calls"],
+                "llm.ms": s["llm_ms"],
+                "llm.tokens_in": s["tokens_in"],
+                "llm.tokens_out": s["tokens_out"],
+                "db.sqlite.vm_steps": s["sql_steps"],
+                "mem.alloc_kb": s.get("mem_alloc_kb"),
+                "mem.peak_kb": s.get("mem_peak_kb"),
+            }
+            for cname, c in s["cache"].items():
+                a[f"cache.{cname}.hit"] = c["hit"]
+                a[f"cache.{cname}.miss"] = c["miss"]
+            span = {
+                "traceId": trace_hex,
+                "spanId": s["span_id"],
+                "parentSpanId": tr.root_id,
+                "name": s["name"],
+                "kind": 1,  # INTERNAL
+                "startTimeUnixNano": str(s["start_ns"]),
+                "endTimeUnixNano": str(s["start_ns"] + int(s["wall_ms"] * 1e6)),
+                "attributes": attrs(a),
+                "status": {"code": 1} if s["status"] == "ok" else {"code": 2, "message": s.get("error", "")},
+            }
+            spans.append(span)
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": attrs({"service.name": SERVICE_NAME})},
+                "scopeSpans": [{"scope": {"name": "analist_agent.tracing"}, "spans": spans}],
+            }]
+        }
+
+
+# (jsonl, otel, tracemalloc) → Tracer; graf her soru için yeniden kurulsa da dosyalar/izler ortak
+_TRACERS: Dict[tuple, Tracer] = {}
+
+
+def get_tracer(cfg: Dict[str, Any]) -> Optional[Tracer]:
+    """config.yaml 'tracing' bölümünden süreç genelinde tek Tracer; kapalıysa None."""
+    tc = cfg.get("tracing", {}) or {}
+    if not tc.get("enabled", False):
+        return None
+    key = (tc.get("jsonl_path"), tc.get("otel_path"), bool(tc.get("tracemalloc", False)))
+    tracer = _TRACERS.get(key)
+    if tracer is None:
+        tracer = _TRACERS[key] = Tracer(*key)
+    return tracer
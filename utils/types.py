@@ -17,10 +17,18 @@ class AgentState(BaseModel):
     plan: List[str] = []
     # Planner kararı: RAG kullanılacak mı?
     use_rag: bool = False
+    # Planner kararı: LLM-critic (semantic_check) çalıştırılacak mı?
+    use_critic: bool = True
+    # Yerel intent modelinin sql_query olasılığı (model yoksa None)
+    intent_confidence: Optional[float] = None
     # Şema dökümanı (schema_retriever tarafından doldurulur)
     schema_doc: Optional[str] = None
     # RAG ipuçları/snippet listesi
     rag_snippets: List[str] = []
+    # Sorudaki değerlerin DB'deki tam karşılıkları ("unit.unit_name = 'Finance Team'")
+    value_hints: List[str] = []
+    # Şablon hızlı yolu raporu (name/confidence/used/sql); eşleşme yoksa None
+    template_match: Optional[Dict[str, Any]] = None
     # Query Generator tarafından üretilen SQL adayları
     candidate_sql: List[str] = []
     # Doğrulanmış SQL (validator sonrası)
@@ -33,6 +41,8 @@ class AgentState(BaseModel):
     rows_preview: Optional[List[Dict[str, Any]]] = None
     # Summarizer’ın nihai cevabı
     answer_text: Optional[str] = None
+    # Summarizer'ın izlediği yol: llm / singleton / table_only / bullets_only / empty / insufficient
+    summary_path: Optional[str] = None
     # Token maliyet istatistikleri
     cost: Dict[str, float] = Field(default_factory=lambda: {"input_tokens":0,"output_tokens":0,"usd":0})
     # Sorgunun başlama zamanı (telemetri için)
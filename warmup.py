@@ -0,0 +1,171 @@
+# warmup.py — Başlangıç ısınması: ilk gerçek sorunun soğuk başlangıç maliyetini önceden öder
+#
+# Adımlar (her biri ayrı ölçülür; hata süreci durdurmaz, rapora yazılır):
+#   catalog  → şema kataloğu, şema dökümanı, boyut (dimension) tanımları (süreç cache'leri)
+#   pool     → DB havuzundaki tüm bağlantıları aç, her birinde şemayı ayrıştırt
+#   pages    → DB dosyasının ilk prefetch_mb MB'ını OS sayfa önbelleğine oku; sıcak tablolarda
+#              COUNT(*) (SQLite en küçük indeksi tarar; progress handler bütçesiyle sınırlı)
+#   rag      → rag.enabled ise şema dökümanından paylaşılan RAG indeksini kur (model yüklemesi dahil)
+#   values   → values.enabled ise FTS5 değer indeksini aç; DB data_version'ı değiştiyse yeniden kur
+#   rollups  → rollups.enabled ise ön-agregat yan dosyasını doğrula; DB data_version'ı değiştiyse yeniden kur
+#   llm      → HTTP istemcisini kur, sabit prompt önekiyle max_tokens=1 istek gönder (bağlantı
+#              havuzu açılır, sunucu prefix cache'i dolar); llm_timeout_s içinde dönmezse beklenmez
+#
+# main (REPL/batch), api.py (lifespan sonrası arka planda; /readyz ısınma bitince 200) ve
+# ui_streamlit.py (paylaşılan runtime kurulurken) warm_up(rt) çağırır.
+import logging, os, threading, time
+from contextlib import ExitStack
+from typing import Any, Callable, Dict
+
+from utils.metrics import WARMUP_SECONDS
+
+log = logging.getLogger("warmup")
+
+WARMUP_DEFAULTS = {
+    "enabled": True,
+    "rag": True,
+    "touch_tables": [],
+    "prefetch_mb": 256,
+    "llm_prefill": True,
+    "llm_timeout_s": 20,
+}
+
+
+def warmup_config(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    return {**WARMUP_DEFAULTS, **(cfg.get("warmup") or {})}
+
+
+def _catalog(rt) -> str:
+    from nodes.schema_retriever import schema_doc
+    from tools.db import schema_catalog
+    from tools.dimensions import dimensions
+    with rt.connection() as conn:
+        cat = schema_catalog(conn)
+        schema_doc(conn)
+        dims = dimensions(conn)
+    return f"{len(cat)} tablo, {len(dims)} boyut"
+
+
+def _pool(rt) -> str:
+    # Tüm bağlantıları aynı anda tut: havuz her birini açar (LIFO'da hep aynısı dönmesin)
+    with ExitStack() as stack:
+        conns = [stack.enter_context(rt.pool.connection()) for _ in range(rt.pool.size)]
+        for conn in conns:
+            conn.execute("SELECT count(*) FROM sqlite_master;").fetchone()
+    return f"{len(conns)} bağlantı"
+
+
+def _pages(rt, wc: Dict[str, Any]) -> str:
+    from tools.db import schema_catalog
+    path = rt.pool.path
+    budget = int(float(wc["prefetch_mb"]) * 1024 * 1024)
+    read = 0
+    if budget > 0 and os.path.exists(path):
+        with open(path, "rb", buffering=0) as f:
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(f.fileno(), 0, budget, os.POSIX_FADV_WILLNEED)
+            while read < budget:
+                chunk = f.read(min(1 << 20, budget - read))
+                if not chunk:
+                    break
+                read += len(chunk)
+    touched, aborted = 0, 0
+    with rt.connection() as conn:
+        tables = wc["touch_tables"] or list(schema_catalog(conn))
+        for t in tables:
+            try:
+                conn.execute(f'SELECT count(*) FROM "{t}";').fetchone()
+                touched += 1
+            except Exception as e:
+                # Büyük tabloda instruction bütçesi aşılabilir; kalan tablolara devam
+                aborted += 1
+                log.debug("Warm-up: %s taranamadı: %s", t, e)
+    return f"{read / 1e6:.1f} MB önbelleğe alındı, {touched} tablo" + (f" ({aborted} yarıda kesildi)" if aborted else "")
+
+
+def _rag(rt) -> str:
+    from nodes.schema_retriever import schema_doc
+    from tools.rag import shared_rag
+    with rt.connection() as conn:
+        docs = schema_doc(conn).splitlines()
+    rag = shared_rag(docs, ivf=rt.cfg["rag"].get("ivf"))
+    return f"{len(docs)} belge, embedding={'var' if getattr(rag, 'embed', None) is not None else 'yok'}"
+
+
+def _values(rt) -> str:
+    from tools.values import value_config, value_index
+    with rt.connection() as conn:
+        idx = value_index(conn, value_config(rt.cfg), wait=True)
+    if idx is None:
+        return "indeks yok"
+    return f"{idx.size} değer, {len(idx.columns)} kolon"
+
+
+def _rollups(rt) -> str:
+    from tools.rollups import available, rollup_config
+    with rt.connection() as conn:
+        path, names = available(conn, rollup_config(rt.cfg), wait=True)
+    return f"{len(names)} rollup" if names else "rollup yok"
+
+
+def _llm(rt, wc: Dict[str, Any]) -> str:
+    from nodes.query_generator import prompt_prefix
+    from nodes.schema_retriever import schema_doc
+    with rt.connection() as conn:
+        system, user = prompt_prefix(schema_doc(conn), rt.cfg["security"]["max_limit"])
+    box: Dict[str, Any] = {}
+
+    def call():
+        try:
+            getattr(rt.llm, "llm", None)   # LLMService: ChatOpenAI istemcisini (ve importlarını) kur
+            if wc["llm_prefill"]:
+                box["out"] = rt.llm.get_text(system, user + "ping", max_tokens=1)
+        except Exception as e:
+            box["error"] = e
+
+    # Daemon thread: sunucu yanıt vermezse warm-up beklemeden biter, çağrı arkada sonlanır
+    th = threading.Thread(target=call, name="warmup-llm", daemon=True)
+    th.start()
+    th.join(float(wc["llm_timeout_s"]))
+    if th.is_alive():
+        raise TimeoutError(f"LLM {wc['llm_timeout_s']} s içinde yanıt vermedi")
+    if "error" in box:
+        raise box["error"]
+    return f"prefill {len(system) + len(user)} karakter" if wc["llm_prefill"] else "istemci kuruldu"
+
+
+def warm_up(rt) -> Dict[str, Dict[str, Any]]:
+    """Isınma adımlarını sırayla çalıştırır → {adım: {"ok", "ms", "detail"|"error"}}."""
+    wc = warmup_config(rt.cfg)
+    steps: Dict[str, Callable[[], str]] = {
+        "catalog": lambda: _catalog(rt),
+        "pool": lambda: _pool(rt),
+        "pages": lambda: _pages(rt, wc),
+    }
+    if wc["rag"] and rt.cfg["rag"].get("enabled"):
+        steps["rag"] = lambda: _rag(rt)
+    from tools.values import value_config
+    if value_config(rt.cfg)["enabled"]:
+        steps["values"] = lambda: _values(rt)
+    from tools.rollups import rollup_config
+    if rollup_config(rt.cfg)["enabled"]:
+        steps["rollups"] = lambda: _rollups(rt)
+    steps["llm"] = lambda: _llm(rt, wc)
+
+    report: Dict[str, Dict[str, Any]] = {}
+    t0 = time.perf_counter()
+    for name, fn in steps.items():
+        ts = time.perf_counter()
+        try:
+            report[name] = {"ok": True, "detail": fn()}
+        except Exception as e:
+            report[name] = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            log.warning("Warm-up adımı başarısız (%s): %s", name, e)
+        dt = time.perf_counter() - ts
+        report[name]["ms"] = round(dt * 1000, 1)
+        WARMUP_SECONDS.set(dt, step=name)
+    total = time.perf_counter() - t0
+    WARMUP_SECONDS.set(total, step="total")
+    log.info("Warm-up tamamlandı: %.0f ms (%s)", total * 1000,
+             ", ".join(f"{k} {v['ms']:.0f} ms{'' if v['ok'] else ' HATA'}" for k, v in report.items()))
+    return report